@@ -0,0 +1,180 @@
+"""benchmarks/detectors.py
+
+Latency benchmark of the detection side of the backend. The models are loaded by
+models.registry and batch size 1 runs the backend's own model jobs
+(services/model_jobs.py): the Detectron2 predictor, the streetseg YOLO and the
+Qwen2-VL crop captioner. Sweeps input sizes, batch sizes and CPU thread counts and
+records p50/p90/p99 latency and throughput as JSON, so runs can be compared for
+regressions. Model paths come from the settings (e.g. WST_STREET_MODEL).
+
+Usage (from App/Backend):
+    python -m benchmarks.detectors --models detectron street --sizes 1600x800 1280x640 --batch_sizes 1 4
+"""
+
+# Standard library
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+# Third-party
+import numpy as np
+import torch
+from PIL import Image
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+#pylint: disable=wrong-import-position
+from services import states
+from services.image_detection import DETECTION_IMAGE_SIZE
+from services.image_utils import ImageBuffer
+from services.model_jobs import STREET_CONFIDENCE, LocalModelJobs
+from models.registry import load_models, unload_models
+from models.settings import get_settings
+
+# Benchmarked model -> registry group loading it
+MODELS = {"detectron": "detection", "street": "street", "captioner": "captioner"}
+BACKGROUND_IMAGES_DIR = get_settings().background_images_dir
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the backend detection models")
+    parser.add_argument("--models", type=str, nargs="+", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--sizes", type=str, nargs="+", default=["{}x{}".format(*DETECTION_IMAGE_SIZE)],
+                        help="Input sizes WxH, the captioner gets a centre crop of a quarter of each side")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1])
+    parser.add_argument("--threads", type=int, nargs="+", default=[torch.get_num_threads()],
+                        help="torch intra-op thread counts to sweep")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed calls before each configuration")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed calls per configuration")
+    parser.add_argument("--output", type=str, default="detectors_benchmark.json")
+    return parser.parse_args()
+
+def parse_size(size):
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+def load_images(size, count):
+    """Background images resized like ImageBuffer.from_base64 does for /detect, as RGB arrays."""
+    names = sorted(f for f in os.listdir(BACKGROUND_IMAGES_DIR) if f.lower().endswith((".png", ".jpg", ".jpeg")))
+    return [np.array(Image.open(os.path.join(BACKGROUND_IMAGES_DIR, names[i % len(names)])).convert("RGB")
+                     .resize(size, Image.BILINEAR)) for i in range(count)]
+
+def centre_crop(image):
+    """Stand-in for a detection box: the centre quarter of the frame."""
+    height, width = image.shape[:2]
+    return image[3 * height // 8:5 * height // 8, 3 * width // 8:5 * width // 8]
+
+def synchronize():
+    if states.DEVICE.type == "cuda":
+        torch.cuda.synchronize(states.DEVICE)
+
+### Model runners, each returns a batch callable on the models loaded by the registry ###
+
+def detectron_runner(jobs):
+    """The detect job for batch size 1, its preprocessing + one model call for larger batches."""
+    predictor = states.WEIRD_DETECTION_MODEL
+
+    def run(images):
+        if len(images) == 1:
+            return [jobs.detect(images[0])]
+        inputs = []
+        for image in images:
+            image = image[:, :, ::-1] if predictor.input_format == "RGB" else image
+            resized = predictor.aug.get_transform(image).apply_image(image)
+            inputs.append({
+                "image": torch.as_tensor(resized.astype("float32").transpose(2, 0, 1)).to(states.DEVICE),
+                "height": image.shape[0],
+                "width": image.shape[1],
+            })
+        with torch.no_grad():
+            return predictor.model(inputs)
+    return run
+
+def street_runner(jobs):
+    """The segment_street job for batch size 1, one predict call on the same BGR arrays for larger batches."""
+    def run(images):
+        if len(images) == 1:
+            return [jobs.segment_street(images[0])]
+        return states.STREET_DETECTION_MODEL.predict(
+            source=[ImageBuffer(image).contiguous("BGR") for image in images],
+            task="segment", verbose=False, conf=STREET_CONFIDENCE)
+    return run
+
+def captioner_runner(jobs):
+    """Captions the centre crop of every image, one caption job per crop as detect() does."""
+    def run(images):
+        return [jobs.caption(centre_crop(image)) for image in images]
+    return run
+
+RUNNERS = {"detectron": detectron_runner, "street": street_runner, "captioner": captioner_runner}
+
+### Measurement ###
+
+def measure(run, images, warmup, iterations):
+    """Per-call latencies in ms of `iterations` timed calls after `warmup` untimed ones."""
+    for _ in range(warmup):
+        run(images)
+    synchronize()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run(images)
+        synchronize()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def summarize(latencies, batch_size):
+    latencies = np.asarray(latencies)
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p90_ms": float(np.percentile(latencies, 90)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "images_per_second": float(batch_size * 1000 / latencies.mean()),
+    }
+
+def main():
+    args = parse_args()
+    jobs = LocalModelJobs()
+
+    results = []
+    environment = {"device": None, "gpu": None}
+    for model_name in args.models:
+        print(f"Loading {model_name}...")
+        load_models((MODELS[model_name],))
+        environment["device"] = str(states.DEVICE)
+        run = RUNNERS[model_name](jobs)
+        for size in args.sizes:
+            for batch_size in args.batch_sizes:
+                images = load_images(parse_size(size), batch_size)
+                for threads in args.threads:
+                    torch.set_num_threads(threads)
+                    latencies = measure(run, images, args.warmup, args.iterations)
+                    result = {"model": model_name, "size": size, "batch_size": batch_size, "threads": threads,
+                              **summarize(latencies, batch_size)}
+                    results.append(result)
+                    print(result)
+        del run
+        device = states.DEVICE
+        # One model in memory at a time
+        unload_models()
+        if device.type == "cuda":
+            environment["gpu"] = torch.cuda.get_device_name(device)
+            torch.cuda.empty_cache()
+
+    environment.update({
+        "torch": torch.__version__,
+        "python": platform.python_version(),
+        "warmup": args.warmup,
+        "iterations": args.iterations,
+    })
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment, "results": results}, f, indent=2)
+    print(f"Saved benchmark to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""benchmarks/fake_models.py
+
+Deterministic stand-ins for the backend models with configurable latency. They
+implement only the interface the services call, so `/detect` and `/generate` run
+their real code paths (locking, preprocessing, region search, encoding) on a CPU
+box without detectron2, diffusers or ultralytics. Latencies block like the real
+model calls do. They live next to the load benchmark that drives them; the tests
+import them from here too.
+"""
+
+# Standard library
+import time
+from types import SimpleNamespace
+
+# Third-party
+import numpy as np
+import torch
+import transformers
+from PIL import Image
+
+# Local application
+from models.sampler_presets import SCHEDULER_FACTORIES
+from services import states
+
+# Normalized xyxy boxes returned by the fake detector
+FAKE_BOXES = ((0.40, 0.50, 0.55, 0.80), (0.60, 0.45, 0.70, 0.65))
+FAKE_OBJECTS = ("traffic cone", "panda")
+
+# Street polygon (normalized xy) covering the lower part of the frame
+FAKE_STREET_POLYGON = ((0.05, 1.0), (0.35, 0.55), (0.65, 0.55), (0.95, 1.0))
+
+class FakeInstances:
+    """The part of detectron2's Instances the detect job reads, so detectron2 is not needed."""
+
+    def __init__(self, boxes: torch.Tensor, scores: torch.Tensor, classes: torch.Tensor):
+        self.pred_boxes = SimpleNamespace(tensor=boxes, device=boxes.device)
+        self.scores = scores
+        self.pred_classes = classes
+
+    def __getitem__(self, index) -> "FakeInstances":
+        return FakeInstances(self.pred_boxes.tensor[index], self.scores[index], self.pred_classes[index])
+
+    def to(self, _device):
+        """Already on the CPU."""
+        return self
+
+    def has(self, name: str) -> bool:
+        """Whether the field is set, like Instances.has."""
+        return hasattr(self, name)
+
+class FakeDetector:
+    """DefaultPredictor stand-in returning the same boxes for every image."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, image: np.ndarray) -> dict:
+        time.sleep(self.latency)
+        self.calls += 1
+        height, width = image.shape[:2]
+        boxes = torch.tensor(FAKE_BOXES, dtype=torch.float32) * torch.tensor([width, height, width, height])
+        scores = torch.full((len(boxes),), 0.95)
+        classes = torch.zeros(len(boxes), dtype=torch.long)
+        return {"instances": FakeInstances(boxes, scores, classes)}
+
+class FakeTokenizer:
+    """Tiny vocabulary holding the list syntax and the fake object names."""
+
+    def __init__(self):
+        self.vocab = ["<pad>", "<eos>", "[", "]", "'", ", "] + list(FAKE_OBJECTS)
+        self.eos_token_id = 1
+        self.vocab_size = len(self.vocab)
+
+    def encode(self, text: str) -> list[int]:
+        """Greedy longest-match tokenization, enough for the fake answers."""
+        ids = []
+        while text:
+            token_id = max((i for i, token in enumerate(self.vocab) if token and text.startswith(token)),
+                           key=lambda i: len(self.vocab[i]))
+            ids.append(token_id)
+            text = text[len(self.vocab[token_id]):]
+        return ids
+
+    def batch_decode(self, sequences, skip_special_tokens=False, **_):
+        """Concatenated token texts per sequence, ids outside the vocabulary are dropped."""
+        special = {0, self.eos_token_id} if skip_special_tokens else set()
+        return ["".join(self.vocab[int(i)] for i in ids if int(i) not in special and int(i) < self.vocab_size)
+                for ids in sequences]
+
+class FakeProcessor:
+    """Qwen2VLProcessor stand-in: a fixed prompt of three tokens per request."""
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+
+    def apply_chat_template(self, chat, add_generation_prompt=True):
+        """The instruction text of the last message, the fake prompt does not depend on it."""
+        return str(chat[-1]["content"][-1]["text"])
+
+    def __call__(self, text, images, padding=True, return_tensors="pt"):
+        return transformers.BatchEncoding({"input_ids": torch.zeros((1, 3), dtype=torch.long)})
+
+    def batch_decode(self, sequences, **kwargs):
+        """Decodes with the fake tokenizer."""
+        return self.tokenizer.batch_decode(sequences, **kwargs)
+
+class FakeCaptioner:
+    """Qwen2VLForConditionalGeneration stand-in answering with the same object list."""
+
+    def __init__(self, tokenizer: FakeTokenizer, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.generation_config = SimpleNamespace(eos_token_id=tokenizer.eos_token_id)
+        answer = "[" + ", ".join(f"'{name}'" for name in FAKE_OBJECTS) + "]"
+        self.answer_ids = torch.tensor(tokenizer.encode(answer) + [tokenizer.eos_token_id])
+
+    def eval(self):
+        """No training mode to leave."""
+        return self
+
+    def generate(self, input_ids, **_):
+        """Appends the fixed answer to every prompt after the configured latency."""
+        time.sleep(self.latency)
+        self.calls += 1
+        return torch.cat([input_ids, self.answer_ids.repeat(input_ids.shape[0], 1)], dim=1)
+
+class FakeStreetSegmenter:
+    """YOLO segmentation stand-in returning one street polygon."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def predict(self, source, **_):
+        """One result with the fake street polygon scaled to the source image."""
+        time.sleep(self.latency)
+        self.calls += 1
+        height, width = source.shape[:2]
+        polygon = np.array(FAKE_STREET_POLYGON, dtype=np.float32) * np.array((width, height), dtype=np.float32)
+        return [SimpleNamespace(masks=SimpleNamespace(xy=[polygon]))]
+
+class FakeInpaintPipeline:
+    """SDXL inpaint stand-in, latency is per denoising step actually run (steps * strength)."""
+
+    def __init__(self, step_latency: float = 0.0):
+        self.step_latency = step_latency
+        self.calls = 0
+        self.scheduler = None
+
+    def __call__(self, image, width, height, num_inference_steps, strength=1.0, **_):
+        time.sleep(self.step_latency * max(1, int(num_inference_steps * strength)))
+        self.calls += 1
+        return SimpleNamespace(images=[image.resize((width, height), Image.BILINEAR)])
+
+    def set_adapters(self, *_):
+        """LoRA adapters are not simulated."""
+
+    def enable_lora(self):
+        """LoRA adapters are not simulated."""
+
+    def disable_lora(self):
+        """LoRA adapters are not simulated."""
+
+def create_fake_models(detect_latency=0.0, caption_latency=0.0, street_latency=0.0, inpaint_step_latency=0.0) -> dict:
+    """One fake per backend model, the call counters survive app restarts."""
+    processor = FakeProcessor()
+    return {
+        "detector": FakeDetector(detect_latency),
+        "processor": processor,
+        "captioner": FakeCaptioner(processor.tokenizer, caption_latency),
+        "street": FakeStreetSegmenter(street_latency),
+        "inpaint": FakeInpaintPipeline(inpaint_step_latency),
+    }
+
+def install_fake_models(fakes: dict):
+    """Injects the fakes into `services.states`, main.lifespan keeps models that are already set."""
+    states.DEVICE = torch.device("cpu")
+    states.WEIRD_DETECTION_MODEL = fakes["detector"]
+    states.DETECTION_DESCRIPTION_PROCESSOR = fakes["processor"]
+    states.DETECTION_DESCRIPTION_MODEL = fakes["captioner"]
+    states.STREET_DETECTION_MODEL = fakes["street"]
+    states.GENERATION_MODEL = fakes["inpaint"]
+    states.SCHEDULERS = {name: name for name in SCHEDULER_FACTORIES}
+    states.GENERATION_ADAPTERS = set()
+    states.PROMPT_EMBEDDING_CACHE = None
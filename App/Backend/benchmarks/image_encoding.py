@@ -0,0 +1,104 @@
+"""benchmarks/image_encoding.py
+
+Encode time, size and fidelity of the output codecs of /generate
+(services/image_encoding.py) on background images at the generated resolution.
+Codecs the installed Pillow cannot write are skipped. Writes a JSON report.
+
+Usage (from App/Backend):
+    python -m benchmarks.image_encoding --num_images 8 --qualities 75 90 --png_levels 1 6
+"""
+
+# Standard library
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+# Third-party
+import numpy as np
+from PIL import Image
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+#pylint: disable=wrong-import-position
+from services.image_encoding import CODECS, available_codecs, encode_image
+from services.image_utils import ImageBuffer
+from models.settings import get_settings
+
+# realvisxl_inpaint output size
+GENERATED_SIZE = (1600, 896)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the output codecs of image generation")
+    parser.add_argument("--num_images", type=int, default=8, help="Background images used (first N by name)")
+    parser.add_argument("--codecs", type=str, nargs="+", default=list(CODECS), choices=list(CODECS))
+    parser.add_argument("--qualities", type=int, nargs="+", default=[75, 90], help="jpeg/webp/avif quality")
+    parser.add_argument("--png_levels", type=int, nargs="+", default=[1, 6], help="PNG zlib compress levels")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=str, default="image_encoding_benchmark.json")
+    return parser.parse_args()
+
+def load_images(num_images: int) -> list[ImageBuffer]:
+    background_images_dir = get_settings().background_images_dir
+    names = sorted(f for f in os.listdir(background_images_dir) if f.lower().endswith((".png", ".jpg", ".jpeg")))
+    images = []
+    for name in names[:num_images]:
+        with Image.open(os.path.join(background_images_dir, name)) as image:
+            images.append(ImageBuffer.from_pil(image.convert("RGB").resize(GENERATED_SIZE, Image.LANCZOS)))
+    return images
+
+def psnr(image_a: np.ndarray, image_b: np.ndarray) -> float | None:
+    """PSNR in dB, None for identical images (infinite, e.g. every PNG)."""
+    mse = np.mean((image_a.astype(np.float64) - image_b.astype(np.float64)) ** 2)
+    return None if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+def run_benchmark(images, codecs, qualities, png_levels, repeats) -> list[dict]:
+    results = []
+    for codec in codecs:
+        settings = png_levels if CODECS[codec].lossless else qualities
+        for setting in settings:
+            quality, compress_level = (None, setting) if CODECS[codec].lossless else (setting, None)
+            seconds, sizes, fidelity = [], [], []
+            for image in images:
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    data = encode_image(image, codec, quality, compress_level)
+                    seconds.append(time.perf_counter() - start)
+                sizes.append(len(data))
+                with Image.open(io.BytesIO(data)) as decoded:
+                    fidelity.append(psnr(np.asarray(decoded.convert("RGB")), image.pixels))
+            # None when every image decoded to identical pixels
+            lossy = [value for value in fidelity if value is not None]
+            result = {
+                "codec": codec,
+                "quality": quality,
+                "compress_level": compress_level,
+                "encode_ms": float(np.mean(seconds) * 1000),
+                "bytes": float(np.mean(sizes)),
+                "psnr_db": float(np.mean(lossy)) if lossy else None,
+            }
+            results.append(result)
+            fidelity_text = "lossless" if result["psnr_db"] is None else f"{result['psnr_db']:.1f} dB"
+            print(f"{codec:5s} {setting:3d}: {result['encode_ms']:7.1f} ms  {result['bytes'] / 1024:8.1f} KiB  "
+                  f"{fidelity_text}")
+    return results
+
+def main():
+    args = parse_args()
+    codecs = [codec for codec in args.codecs if codec in available_codecs()]
+    skipped = sorted(set(args.codecs) - set(codecs))
+    if skipped:
+        print(f"Skipping codecs Pillow cannot write: {skipped}")
+
+    images = load_images(args.num_images)
+    results = run_benchmark(images, codecs, args.qualities, args.png_levels, args.repeats)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"image_size": GENERATED_SIZE, "num_images": len(images), "results": results}, f, indent=2,
+                  allow_nan=False)
+    print(f"Saved encoding benchmark to {args.output}")
+
+if __name__ == "__main__":
+    main()
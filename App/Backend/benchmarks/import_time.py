@@ -0,0 +1,94 @@
+"""benchmarks/import_time.py
+
+Import-time budget of the backend. Runs a bare `import main` in a fresh
+interpreter under `python -X importtime`, reports the total against the
+budget, the slowest imports and whether any heavy ML library
+(which must only be imported by models/registry.py at startup) was pulled in.
+tests/test_import_time.py fails when the budget is exceeded.
+
+Usage (from App/Backend):
+    python -m benchmarks.import_time --top 15
+"""
+
+# Standard library
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Seconds a bare `import main` may take, measured in a fresh interpreter
+IMPORT_BUDGET_SECONDS = 1.5
+
+# Only imported when the models are loaded
+HEAVY_MODULES = ("torch", "torchvision", "detectron2", "diffusers", "transformers", "ultralytics", "spacy")
+
+PROBE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "seconds = time.perf_counter() - start\n"
+    f"print(json.dumps({{'seconds': seconds, 'heavy_modules': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the import time of the backend")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to report")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON report")
+    return parser.parse_args()
+
+def measure_import(importtime: bool = False) -> tuple[dict, str]:
+    """Imports main in a fresh interpreter, returns the probe result and the -X importtime log."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    completed = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True, check=False)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+def parse_importtime(log: str) -> list[tuple[str, int, float]]:
+    """(module, nesting depth, cumulative seconds) of every import in a -X importtime log."""
+    modules = []
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        # Nested imports are indented by two spaces per level below their parent
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), depth, int(cumulative) / 1e6))
+    return modules
+
+def run_benchmark(top: int = 15) -> dict:
+    # Wall clock from a plain run, -X importtime itself slows imports down
+    probe, _ = measure_import()
+    _, log = measure_import(importtime=True)
+    # Everything imported by main, the slowest packages first
+    modules = sorted((m for m in parse_importtime(log) if m[0] != "main"), key=lambda item: item[2], reverse=True)
+    return {
+        "seconds": probe["seconds"],
+        "budget_seconds": IMPORT_BUDGET_SECONDS,
+        "within_budget": probe["seconds"] <= IMPORT_BUDGET_SECONDS,
+        "heavy_modules": probe["heavy_modules"],
+        "slowest_imports": [{"module": name, "depth": depth, "cumulative_seconds": seconds}
+                            for name, depth, seconds in modules[:top]],
+    }
+
+def main():
+    args = parse_args()
+    report = run_benchmark(args.top)
+    print(f"import main: {report['seconds']:.3f}s (budget {IMPORT_BUDGET_SECONDS}s)")
+    for entry in report["slowest_imports"]:
+        print(f"  {entry['cumulative_seconds']:.3f}s  {'  ' * entry['depth']}{entry['module']}")
+    if report["heavy_modules"]:
+        print(f"Heavy modules imported: {report['heavy_modules']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved import time report to {args.output}")
+    sys.exit(0 if report["within_budget"] and not report["heavy_modules"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""benchmarks/load.py
+
+End-to-end load test of the FastAPI backend. Boots `main.app` under uvicorn with
+deterministic fake models of configurable latency (benchmarks/fake_models.py) and
+drives `/detect` and `/generate` with concurrent clients. Reports throughput,
+time spent waiting for the backend lock (queueing delay), tail latency and image
+copies per request per endpoint and the peak RSS of the process as JSON, so
+scheduling, batching and transport changes can be measured on a CPU box.
+
+Usage (from App/Backend):
+    python -m benchmarks.load --concurrency 1 4 8 --requests 16 --detect_latency 0.2 --inpaint_step_latency 0.01
+"""
+
+# Standard library
+import argparse
+import asyncio
+import base64
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+
+# Third-party
+import httpx
+import numpy as np
+import uvicorn
+
+# Add the parent directory (App/Backend) to sys.path to make `main` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+#pylint: disable=wrong-import-position
+from services import states
+from services.metrics import IMAGE_COPIES, peak_rss_bytes
+from benchmarks.fake_models import create_fake_models, install_fake_models
+from models.settings import get_settings
+
+ENDPOINTS = ("detect", "generate")
+BACKGROUND_IMAGES_DIR = get_settings().background_images_dir
+PROMPT = "A panda juggles on the middle lane."
+
+# Endpoint of the request currently holding/awaiting the lock, set per request by EndpointTagMiddleware
+CURRENT_ENDPOINT = contextvars.ContextVar("current_endpoint", default=None)
+
+def parse_args():
+    """Command line of the load test."""
+    parser = argparse.ArgumentParser(description="Load test the backend with fake models")
+    parser.add_argument("--endpoints", type=str, nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Concurrent clients per endpoint, swept")
+    parser.add_argument("--requests", type=int, default=8, help="Requests sent by each client")
+    parser.add_argument("--preset", type=str, default="fast", help="Sampler preset of the /generate requests")
+    parser.add_argument("--use_cache", action="store_true",
+                        help="Let the identical /generate requests hit the generation cache instead of sending fresh")
+    parser.add_argument("--detect_latency", type=float, default=0.2, help="Seconds per detector call")
+    parser.add_argument("--caption_latency", type=float, default=0.3, help="Seconds per captioner call")
+    parser.add_argument("--street_latency", type=float, default=0.05, help="Seconds per street segmentation call")
+    parser.add_argument("--inpaint_step_latency", type=float, default=0.02, help="Seconds per denoising step")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", type=str, default="load.json")
+    return parser.parse_args()
+
+class TimedLock(asyncio.Lock):
+    """Backend lock that records how long each request waited to acquire it."""
+
+    def __init__(self):
+        super().__init__()
+        self.waits = {endpoint: [] for endpoint in ENDPOINTS}
+
+    async def acquire(self):
+        start = time.perf_counter()
+        result = await super().acquire()
+        endpoint = CURRENT_ENDPOINT.get()
+        if endpoint in self.waits:
+            self.waits[endpoint].append(time.perf_counter() - start)
+        return result
+
+class EndpointTagMiddleware:
+    """Pure ASGI middleware tagging the request context with its endpoint name."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            CURRENT_ENDPOINT.set(scope["path"].strip("/"))
+        await self.app(scope, receive, send)
+
+class BackgroundServer:
+    """uvicorn serving the app on a background thread."""
+
+    def __init__(self, app, port):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Backend failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *_):
+        self.server.should_exit = True
+        self.thread.join()
+
+def request_payloads(preset, use_cache=False):
+    """JSON bodies per endpoint: the first background JPEG for /detect, the shared prompt for /generate."""
+    image_name = sorted(f for f in os.listdir(BACKGROUND_IMAGES_DIR) if f.lower().endswith((".jpg", ".jpeg")))[0]
+    with open(os.path.join(BACKGROUND_IMAGES_DIR, image_name), "rb") as f:
+        image_base64 = base64.b64encode(f.read()).decode("utf-8")
+    return {
+        "detect": {"prompt": PROMPT, "imageBase64": image_base64},
+        # Every client sends the same prompt, fresh keeps them from measuring the generation cache
+        "generate": {"prompt": PROMPT, "preset": preset, "fresh": not use_cache},
+    }
+
+async def run_client(client, endpoint, payload, num_requests, latencies, errors):
+    """One client sending its requests back to back, appending latencies (s) and HTTP errors."""
+    for _ in range(num_requests):
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"/{endpoint}", json=payload)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+
+async def drive(base_url, endpoints, payloads, concurrency, num_requests):
+    """Runs `concurrency` clients per endpoint at the same time."""
+    latencies = {endpoint: [] for endpoint in endpoints}
+    errors = {endpoint: [] for endpoint in endpoints}
+    async with httpx.AsyncClient(base_url=base_url, timeout=None,
+                                 limits=httpx.Limits(max_connections=concurrency * len(endpoints))) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            run_client(client, endpoint, payloads[endpoint], num_requests, latencies[endpoint], errors[endpoint])
+            for endpoint in endpoints for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+def percentiles_ms(values):
+    """p50/p90/p99/max in ms of latencies in seconds, None without any."""
+    if not values:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+    values = np.asarray(values) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+def copy_totals() -> dict:
+    """(copies, requests) per endpoint recorded by the request middleware so far."""
+    with IMAGE_COPIES.lock:
+        return {endpoint: (total, count) for endpoint, (_, (total, count)) in IMAGE_COPIES.series.items()}
+
+def run_load_test(endpoints=ENDPOINTS, concurrency_levels=(1, 4), num_requests=8, preset="fast", port=8765,
+                  detect_latency=0.2, caption_latency=0.3, street_latency=0.05, inpaint_step_latency=0.02,
+                  use_cache=False) -> dict:
+    """Boots the backend with fake models and runs one load phase per concurrency level."""
+    from main import app
+
+    fakes = create_fake_models(detect_latency, caption_latency, street_latency, inpaint_step_latency)
+    payloads = request_payloads(preset, use_cache)
+
+    phases = []
+    for concurrency in concurrency_levels:
+        # Shutdown resets the states, so the fakes and a fresh lock are injected before every boot
+        install_fake_models(fakes)
+        lock = TimedLock()
+        states.BACKEND_LOCK = lock
+        copies_before = copy_totals()
+        with BackgroundServer(EndpointTagMiddleware(app), port):
+            latencies, errors, elapsed = asyncio.run(
+                drive(f"http://127.0.0.1:{port}", endpoints, payloads, concurrency, num_requests)
+            )
+
+        copies_after = copy_totals()
+        peak_rss = peak_rss_bytes()
+        phase = {"concurrency": concurrency, "seconds": elapsed,
+                 "peak_rss_mb": peak_rss / 2**20 if peak_rss is not None else None, "endpoints": {}}
+        for endpoint in endpoints:
+            copies, copy_requests = (after - before for after, before in
+                                     zip(copies_after.get(endpoint, (0, 0)), copies_before.get(endpoint, (0, 0))))
+            phase["endpoints"][endpoint] = {
+                "requests": len(latencies[endpoint]),
+                "errors": len(errors[endpoint]),
+                "throughput_rps": len(latencies[endpoint]) / elapsed,
+                "latency": percentiles_ms(latencies[endpoint]),
+                "queueing_delay": percentiles_ms(lock.waits[endpoint]),
+                "image_copies_per_request": copies / copy_requests if copy_requests else None,
+            }
+        phases.append(phase)
+        print(json.dumps(phase, indent=2))
+
+    return {
+        "fake_latencies": {"detect": detect_latency, "caption": caption_latency, "street": street_latency,
+                           "inpaint_step": inpaint_step_latency},
+        "preset": preset,
+        "use_cache": use_cache,
+        "requests_per_client": num_requests,
+        "model_calls": {name: fake.calls for name, fake in fakes.items() if hasattr(fake, "calls")},
+        "phases": phases,
+    }
+
+def main():
+    """Runs the load test and writes its JSON report."""
+    args = parse_args()
+    report = run_load_test(args.endpoints, args.concurrency, args.requests, args.preset, args.port,
+                           args.detect_latency, args.caption_latency, args.street_latency, args.inpaint_step_latency,
+                           args.use_cache)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved load test to {args.output}")
+
+if __name__ == "__main__":
+    main()
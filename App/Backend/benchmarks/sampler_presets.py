@@ -0,0 +1,147 @@
+"""benchmarks/sampler_presets.py
+
+Runs every sampler preset on a fixed set of seeds and background images and
+records wall-time and similarity to the "quality" preset as JSON.
+
+Usage (from App/Backend):
+    python -m benchmarks.sampler_presets --prompt "A panda juggles on the middle lane." --seeds 0 1 2
+"""
+
+# Standard library
+import argparse
+import json
+import os
+import sys
+import time
+
+# Third-party
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+#pylint: disable=wrong-import-position
+from models.registry import load_models
+from models.sampler_presets import SAMPLER_PRESETS, resolve_preset, apply_preset
+from models.settings import get_settings
+from services import states
+from services.image_inpainting import realvisxl_inpaint
+
+REFERENCE_PRESET = "quality"
+BACKGROUND_IMAGES_DIR = get_settings().background_images_dir
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark sampler presets for generation")
+    parser.add_argument("--prompt", type=str, default="A panda juggles on the middle lane.")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2, 3])
+    parser.add_argument("--num_images", type=int, default=2, help="Background images used (first N by name)")
+    parser.add_argument("--presets", type=str, nargs="+", default=list(SAMPLER_PRESETS))
+    parser.add_argument("--crop_to_bbox", action="store_true", help="Use cropped-window inpainting")
+    parser.add_argument("--output", type=str, default="sampler_presets_benchmark.json")
+    return parser.parse_args()
+
+def psnr(image_a: np.ndarray, image_b: np.ndarray) -> float | None:
+    """Peak signal-to-noise ratio in dB between two uint8 images, None for identical ones (infinite)."""
+    mse = np.mean((image_a.astype(np.float64) - image_b.astype(np.float64)) ** 2)
+    return None if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+def ssim(image_a: np.ndarray, image_b: np.ndarray) -> float:
+    """Mean structural similarity of the grayscale images (Gaussian window, sigma 1.5)."""
+    a = cv2.cvtColor(image_a, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    b = cv2.cvtColor(image_b, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def blur(x):
+        return cv2.GaussianBlur(x, (11, 11), 1.5)
+
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a ** 2
+    var_b = blur(b * b) - mu_b ** 2
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+def fixed_bbox(image_size):
+    """Bbox on the lower middle of the frame, where the street usually is."""
+    width, height = image_size
+    return (int(0.3 * width), int(0.45 * height), int(0.7 * width), int(0.85 * height))
+
+def synchronize():
+    if states.DEVICE.type == "cuda":
+        torch.cuda.synchronize(states.DEVICE)
+
+def main():
+    args = parse_args()
+
+    # Only the generation model, loaded exactly as the backend loads it
+    load_models(("generation",))
+
+    image_names = sorted(f for f in os.listdir(BACKGROUND_IMAGES_DIR) if f.lower().endswith((".png", ".jpg", ".jpeg")))
+    images = [Image.open(os.path.join(BACKGROUND_IMAGES_DIR, f)).convert("RGB") for f in image_names[:args.num_images]]
+
+    # Warm-up run, excluded from the timings
+    apply_preset(states.GENERATION_MODEL, resolve_preset(REFERENCE_PRESET, states.GENERATION_ADAPTERS),
+                 states.SCHEDULERS, states.GENERATION_ADAPTERS)
+    realvisxl_inpaint(images[0].copy(), fixed_bbox(images[0].size), args.prompt, 0.5, 7.0,
+                      crop_to_bbox=args.crop_to_bbox, num_inference_steps=4)
+
+    # Reference preset first so every other preset can be compared against it
+    presets = [REFERENCE_PRESET] + [p for p in args.presets if p != REFERENCE_PRESET]
+    references = {}
+    runs = []
+
+    for preset_name in presets:
+        preset = resolve_preset(preset_name, states.GENERATION_ADAPTERS)
+        apply_preset(states.GENERATION_MODEL, preset, states.SCHEDULERS, states.GENERATION_ADAPTERS)
+
+        for image_index, image in enumerate(images):
+            for seed in args.seeds:
+                generator = torch.Generator(states.DEVICE).manual_seed(seed)
+                synchronize()
+                start = time.perf_counter()
+                result = realvisxl_inpaint(
+                    image.copy(), fixed_bbox(image.size), args.prompt,
+                    preset.strengths[0], preset.guidance_scales[0],
+                    crop_to_bbox=args.crop_to_bbox,
+                    num_inference_steps=preset.num_inference_steps,
+                    generator=generator
+                )
+                synchronize()
+                seconds = time.perf_counter() - start
+
+                result_np = np.array(result)
+                key = (image_index, seed)
+                if preset_name == REFERENCE_PRESET:
+                    references[key] = result_np
+                run = {
+                    "preset": preset_name,
+                    "scheduler": preset.scheduler,
+                    "num_inference_steps": preset.num_inference_steps,
+                    "image": image_names[image_index],
+                    "seed": seed,
+                    "seconds": seconds,
+                    "psnr": psnr(result_np, references[key]),
+                    "ssim": ssim(result_np, references[key]),
+                }
+                runs.append(run)
+                print(run)
+
+    summary = {}
+    for preset_name in presets:
+        preset_runs = [r for r in runs if r["preset"] == preset_name]
+        summary[preset_name] = {
+            "mean_seconds": float(np.mean([r["seconds"] for r in preset_runs])),
+            "mean_ssim": float(np.mean([r["ssim"] for r in preset_runs])),
+        }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"prompt": args.prompt, "crop_to_bbox": args.crop_to_bbox, "summary": summary, "runs": runs}, f,
+                  indent=2, allow_nan=False)
+    print(json.dumps(summary, indent=2))
+    print(f"Saved benchmark to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,87 @@
 """main.py"""
 # General Library Imports
-import re
 import os
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
 
 # Backend Library Imports
 import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-
-# AI Related Imports
-from ultralytics import YOLO
-from diffusers import StableDiffusionXLInpaintPipeline, DPMSolverMultistepScheduler
-from detectron2.engine import DefaultPredictor
-import transformers
-import torch
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 
 # Schema Imports
 from schemas.images import DetectionRequest, DetectionResponse, ImageGenerationPrompt, GeneratedImages
 
-# Model Config Imports
-from models.configurations import detectron_cfg
+# Model Imports, the heavy ML libraries are only imported by the registry at startup
+from models.registry import load_models, unload_models
+from models.settings import BACKEND_DIR, get_settings
 
 # Function Imports
 from services import states
+from services.model_host import ModelHostClient, connect_from_settings, wait_for_model_host
 from services.image_detection import detect
 from services.image_generation import generate
+from services.metrics import (REQUEST_SECONDS, IMAGE_COPIES, start_trace, request_copies, server_timing,
+                             profiler_for_request, render_prometheus)
 
 
-# Setting Correct Paths
-current_directory = os.getcwd()
-path_to_base_directory = re.search(rf"(.*?){"Weird-Stuff-In-Traffic"}", current_directory).group(1)
-
-# Model Paths
-street_detection_model_path = "Weird-Stuff-In-Traffic/App/Backend/models"
-full_street_detection_detection_model_path = path_to_base_directory + street_detection_model_path + "/streetseg_256_auto.pt"
-
 # Context Manager
 @asynccontextmanager
 async def lifespan(_):
     """App Lifespan."""
-    print("Loading models...")
-    states.DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    states.BACKEND_LOCK = asyncio.Lock()
-    states.GENERATION_MODEL = StableDiffusionXLInpaintPipeline.from_pretrained("stabilityai/stable-diffusion-xl-base-1.0",torch_dtype=torch.float16, variant="fp16", safety_checker=None).to(states.DEVICE)
-    states.GENERATION_MODEL.scheduler = DPMSolverMultistepScheduler.from_config(states.GENERATION_MODEL.scheduler.config)
-    states.WEIRD_DETECTION_MODEL = DefaultPredictor(detectron_cfg)
-    states.STREET_DETECTION_MODEL = YOLO(full_street_detection_detection_model_path).to(states.DEVICE)
-    states.DETECTION_DESCRIPTION_PROCESSOR = transformers.Qwen2VLProcessor.from_pretrained("Qwen/Qwen2-VL-7B-Instruct", use_fast=True)
-    states.DETECTION_DESCRIPTION_MODEL = transformers.Qwen2VLForConditionalGeneration.from_pretrained("Qwen/Qwen2-VL-7B-Instruct", torch_dtype=torch.float16).to(states.DEVICE)
-    print(f"Using {states.DEVICE}.")
-    print("Models loaded.")
+    if states.BACKEND_LOCK is None:
+        states.BACKEND_LOCK = asyncio.Lock()
+    if get_settings().model_host_address:
+        # One of several workers, the models live in the model host process
+        states.MODEL_JOBS = connect_from_settings()
+        print(f"Using model host at {get_settings().model_host_address}.")
+    else:
+        print("Loading models...")
+        # Models injected before startup (e.g. the fakes of the load-test harness) are kept
+        load_models()
+        print("Models loaded.")
     yield
-    states.DEVICE = None
-    states.GENERATION_MODEL = None
-    states.WEIRD_DETECTION_MODEL = None
-    states.STREET_DETECTION_MODEL = None
-    states.DETECTION_DESCRIPTION_MODEL = None
-    states.DETECTION_DESCRIPTION_PROCESSOR = None
+    unload_models()
+    states.MODEL_JOBS = None
     states.BACKEND_LOCK = None
     print("Models shut down.")
 
 # Defining App
 app = FastAPI(lifespan=lifespan)
 
+# Middleware
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Times every request and counts its image copies, optionally profiles it and returns its stage timings as Server-Timing header."""
+    endpoint = request.url.path.strip("/")
+    if endpoint == "metrics":
+        return await call_next(request)
+
+    trace = start_trace()
+    start = time.perf_counter()
+    with profiler_for_request(endpoint):
+        response = await call_next(request)
+    duration = time.perf_counter() - start
+    REQUEST_SECONDS.observe(endpoint, duration)
+    copies, copied_bytes = request_copies()
+    IMAGE_COPIES.observe(endpoint, copies)
+
+    if states.TRACE_HEADERS or request.headers.get("x-trace") == "1":
+        response.headers["Server-Timing"] = server_timing(trace + [("total", duration)])
+        response.headers["X-Image-Copies"] = f"{copies}; bytes={copied_bytes}"
+    return response
+
 # Routes
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Endpoint exposing stage and request latency histograms in the Prometheus text format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/detect", response_model=DetectionResponse)
 async def detect_endpoint(req: DetectionRequest):
     """Endpoint for detecting weird objects in an image."""
@@ -74,7 +92,31 @@ async def generate_endpoint(req: ImageGenerationPrompt):
     """Endpoint for detecting weird objects in an image."""
     return await generate(req)
 
+def serve():
+    """Single reloading worker, or WST_WORKERS HTTP workers sharing one model host process."""
+    import uvicorn  #pylint: disable=import-outside-toplevel
+
+    settings = get_settings()
+    if settings.workers <= 1:
+        uvicorn.run("main:app", host=settings.host, port=settings.port, reload=True)
+        return
+
+    # Socket in a private directory (mode 0700) and a key per launch, jobs are pickled messages
+    socket_dir = tempfile.mkdtemp(prefix="wst_model_host_")
+    address = settings.model_host_address or os.path.join(socket_dir, "model_host.sock")
+    authkey = secrets.token_hex(32)
+    # Inherited by the model host and the workers
+    os.environ["WST_MODEL_HOST_ADDRESS"] = address
+    os.environ["WST_MODEL_HOST_AUTHKEY"] = authkey
+    model_host = subprocess.Popen([sys.executable, "-m", "services.model_host"], cwd=BACKEND_DIR)
+    try:
+        wait_for_model_host(ModelHostClient(address, authkey.encode()), model_host)
+        uvicorn.run("main:app", host=settings.host, port=settings.port, workers=settings.workers)
+    finally:
+        model_host.terminate()
+        model_host.wait()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
 # Main Running Area
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    serve()
@@ -1,33 +1,47 @@
 """models/configurations.py"""
 
 # Imports
-import torch
-import os
-import re
-from detectron2.config import get_cfg
-from detectron2 import model_zoo
-from detectron2.data import MetadataCatalog
-
-# Current Directory Setup
-current_directory = os.getcwd()
-path_to_base_directory = re.search(rf"(.*?){"Weird-Stuff-In-Traffic"}", current_directory).group(1)
-
-test_metadata = MetadataCatalog.get("my_dataset_test")
-test_metadata.thing_classes = [""] 
-
-# Configuration for Detectron2 Model
-detectron_cfg = get_cfg()
-detectron_cfg.merge_from_file(model_zoo.get_config_file("COCO-Detection/faster_rcnn_X_101_32x8d_FPN_3x.yaml"))
-detectron_cfg.MODEL.WEIGHTS = path_to_base_directory+"Weird-Stuff-In-Traffic/App/Backend/models/detectron2_best.pth"
-detectron_cfg.MODEL.DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-detectron_cfg.DATASETS.TEST = ("my_dataset_test", )
-
-detectron_cfg.MODEL.ANCHOR_GENERATOR.SIZES = [[8, 16, 32, 64, 128, 256, 512, 1024]]
-detectron_cfg.MODEL.ANCHOR_GENERATOR.ASPECT_RATIOS = [[0.25, 0.5, 1.0, 2.0, 4.0]]  
-detectron_cfg.MODEL.RPN.IN_FEATURES = ["p2", "p3", "p4", "p5", "p6"]  
-
-detectron_cfg.MODEL.RPN.PRE_NMS_TOPK_TRAIN = 12000
-detectron_cfg.MODEL.RPN.POST_NMS_TOPK_TRAIN = 2500
-detectron_cfg.MODEL.ROI_HEADS.BATCH_SIZE_PER_IMAGE = 96
-detectron_cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.8
-detectron_cfg.MODEL.ROI_HEADS.NUM_CLASSES = 1
+from functools import lru_cache
+from models.settings import get_settings
+
+TEST_DATASET = "my_dataset_test"
+
+def resolve_device(device: str) -> str:
+    """"auto" becomes cuda when available, explicit devices are kept."""
+    if device != "auto":
+        return device
+    import torch  #pylint: disable=import-outside-toplevel
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+@lru_cache(maxsize=None)
+def get_test_metadata():
+    """Metadata of the detector's test dataset, only needs .thing_classes for drawing."""
+    from detectron2.data import MetadataCatalog  #pylint: disable=import-outside-toplevel
+    test_metadata = MetadataCatalog.get(TEST_DATASET)
+    test_metadata.thing_classes = [""]
+    return test_metadata
+
+@lru_cache(maxsize=None)
+def get_detectron_cfg():
+    """Configuration for the Detectron2 model, built on first use so imports stay cheap."""
+    #pylint: disable=import-outside-toplevel
+    from detectron2.config import get_cfg
+    from detectron2 import model_zoo
+
+    settings = get_settings()
+    detectron_cfg = get_cfg()
+    detectron_cfg.merge_from_file(model_zoo.get_config_file("COCO-Detection/faster_rcnn_X_101_32x8d_FPN_3x.yaml"))
+    detectron_cfg.MODEL.WEIGHTS = settings.detectron_weights
+    detectron_cfg.MODEL.DEVICE = resolve_device(settings.device)
+    detectron_cfg.DATASETS.TEST = (TEST_DATASET, )
+
+    detectron_cfg.MODEL.ANCHOR_GENERATOR.SIZES = [[8, 16, 32, 64, 128, 256, 512, 1024]]
+    detectron_cfg.MODEL.ANCHOR_GENERATOR.ASPECT_RATIOS = [[0.25, 0.5, 1.0, 2.0, 4.0]]
+    detectron_cfg.MODEL.RPN.IN_FEATURES = ["p2", "p3", "p4", "p5", "p6"]
+
+    detectron_cfg.MODEL.RPN.PRE_NMS_TOPK_TRAIN = 12000
+    detectron_cfg.MODEL.RPN.POST_NMS_TOPK_TRAIN = 2500
+    detectron_cfg.MODEL.ROI_HEADS.BATCH_SIZE_PER_IMAGE = 96
+    detectron_cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = settings.detection_score_threshold
+    detectron_cfg.MODEL.ROI_HEADS.NUM_CLASSES = 1
+    return detectron_cfg
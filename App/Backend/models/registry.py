@@ -0,0 +1,83 @@
+"""models/registry.py"""
+
+# Standard library
+import os
+
+# Local application
+from models.settings import get_settings
+from services import states
+
+# Heavy ML libraries (torch, diffusers, detectron2, transformers, ultralytics, spaCy) are only
+# imported in here, at model-load time, so `import main`, tests and CLI tools start fast.
+#pylint: disable=import-outside-toplevel
+
+# Model groups load_models can be restricted to, tools only load what they run
+MODEL_GROUPS = ("generation", "detection", "street", "captioner")
+
+def load_models(groups=MODEL_GROUPS):
+    """
+    Loads the backend models of the given groups into `services.states` (every model by
+    default). Models injected before (e.g. fakes) are kept.
+    """
+    import torch
+    from models.configurations import resolve_device
+
+    settings = get_settings()
+    states.PROFILE_DIR = settings.profile_dir
+    if states.DEVICE is None:
+        states.DEVICE = torch.device(resolve_device(settings.device))
+
+    if "generation" in groups and states.GENERATION_MODEL is None:
+        from diffusers import StableDiffusionXLInpaintPipeline
+        from models.sampler_presets import build_schedulers, load_adapters
+        from services.prompt_embeddings import PromptEmbeddingCache
+        from services.image_inpainting import NEGATIVE_PROMPT
+
+        states.GENERATION_MODEL = StableDiffusionXLInpaintPipeline.from_pretrained(settings.generation_model,torch_dtype=torch.float16, variant="fp16", safety_checker=None).to(states.DEVICE)
+        states.SCHEDULERS = build_schedulers(states.GENERATION_MODEL)
+        states.GENERATION_ADAPTERS = load_adapters(states.GENERATION_MODEL)
+        states.PROMPT_EMBEDDING_CACHE = PromptEmbeddingCache(states.GENERATION_MODEL, NEGATIVE_PROMPT, states.DEVICE)
+    if "detection" in groups and states.WEIRD_DETECTION_MODEL is None:
+        from detectron2.engine import DefaultPredictor
+        from models.configurations import get_detectron_cfg
+
+        states.WEIRD_DETECTION_MODEL = DefaultPredictor(get_detectron_cfg())
+    if "street" in groups and states.STREET_DETECTION_MODEL is None:
+        from ultralytics import YOLO
+
+        states.STREET_DETECTION_MODEL = YOLO(settings.street_model).to(states.DEVICE)
+    if "captioner" in groups and states.DETECTION_DESCRIPTION_MODEL is None:
+        import transformers
+
+        states.DETECTION_DESCRIPTION_PROCESSOR = transformers.Qwen2VLProcessor.from_pretrained(settings.captioner_model, use_fast=True)
+        states.DETECTION_DESCRIPTION_MODEL = transformers.Qwen2VLForConditionalGeneration.from_pretrained(settings.captioner_model, torch_dtype=torch.float16).to(states.DEVICE)
+    if "captioner" in groups:
+        # Token index of the constrained object list decoding, decoding the vocabulary would stall the first /detect
+        from services.image_summary import get_object_list_token_index
+
+        get_object_list_token_index(states.DETECTION_DESCRIPTION_PROCESSOR.tokenizer, states.DEVICE)
+    if "detection" in groups and states.ROI_VOCABULARY_HEAD is None and os.path.exists(settings.roi_vocabulary_head):
+        # Optional: pre-label boxes from the detector's ROI features and only caption uncertain ones
+        from services.roi_captioning import RoiVocabularyHead
+
+        states.ROI_VOCABULARY_HEAD = RoiVocabularyHead.load(settings.roi_vocabulary_head, states.DEVICE)
+        print(f"ROI vocabulary head loaded with {len(states.ROI_VOCABULARY_HEAD.vocabulary)} labels.")
+
+    if "generation" in groups:
+        # spaCy pipeline of the prompt summary, loaded now instead of on the first request
+        from services.prompt_summary import get_nlp
+        get_nlp()
+    print(f"Using {states.DEVICE}.")
+
+def unload_models():
+    """Drops every model reference held in `services.states`."""
+    states.DEVICE = None
+    states.GENERATION_MODEL = None
+    states.PROMPT_EMBEDDING_CACHE = None
+    states.SCHEDULERS = None
+    states.GENERATION_ADAPTERS = set()
+    states.WEIRD_DETECTION_MODEL = None
+    states.STREET_DETECTION_MODEL = None
+    states.DETECTION_DESCRIPTION_MODEL = None
+    states.DETECTION_DESCRIPTION_PROCESSOR = None
+    states.ROI_VOCABULARY_HEAD = None
@@ -0,0 +1,96 @@
+"""models/settings.py"""
+
+# Standard library
+import dataclasses
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+# App/Backend, relative paths in the settings are resolved against it
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+ENV_PREFIX = "WST_"
+SETTINGS_FILE_ENV = ENV_PREFIX + "SETTINGS_FILE"
+# Placeholder key: fine for a local socket, refused for TCP (see services.model_host.check_address)
+DEFAULT_MODEL_HOST_AUTHKEY = "weird-stuff-in-traffic"
+PATH_FIELDS = ("detectron_weights", "street_model", "roi_vocabulary_head",
+               "background_images_dir", "failed_images_dir", "profile_dir", "generation_cache_dir")
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Backend paths and model names. Defaults are overridden by a JSON file named in
+    WST_SETTINGS_FILE, which is overridden by WST_<FIELD> environment variables
+    (e.g. WST_DETECTRON_WEIGHTS=/weights/detectron2_best.pth).
+    """
+
+    # Model weights
+    detectron_weights: str = "models/detectron2_best.pth"
+    street_model: str = "models/streetseg_256_auto.pt"
+    roi_vocabulary_head: str = "models/roi_vocabulary_head.pth"
+
+    # Hub models
+    generation_model: str = "stabilityai/stable-diffusion-xl-base-1.0"
+    captioner_model: str = "Qwen/Qwen2-VL-7B-Instruct"
+
+    # Images and outputs
+    background_images_dir: str = "images/background_images"
+    failed_images_dir: str = "images/failed_images"
+    profile_dir: str = "profiles"
+    generation_cache_dir: str = "cache/generations"
+
+    # "auto" picks cuda when available
+    device: str = "auto"
+    detection_score_threshold: float = 0.8
+
+    # Serving: with more than one HTTP worker the models live in a single model host process
+    host: str = "127.0.0.1"
+    port: int = 8000
+    workers: int = 1
+    model_host_address: str = ""  # unix socket path or host:port, empty: models are loaded in-process
+    model_host_authkey: str = DEFAULT_MODEL_HOST_AUTHKEY  # main.py generates one per launch
+    # Threads encoding generated images while the next variant is diffused
+    encode_workers: int = 2
+
+    # /generate results per worker in memory, shared on disk by all workers (0 disables either store)
+    generation_cache_entries: int = 16
+    generation_cache_disk_bytes: int = 2 * 2**30
+    generation_cache_ttl_seconds: float = 24 * 3600
+
+def _coerce(value: str, field_type):
+    if field_type in (bool, "bool"):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if field_type in (float, "float"):
+        return float(value)
+    if field_type in (int, "int"):
+        return int(value)
+    return value
+
+def load_settings(environ=None) -> Settings:
+    """Builds the settings from the defaults, the optional settings file and the environment."""
+    environ = os.environ if environ is None else environ
+    values = {}
+
+    settings_file = environ.get(SETTINGS_FILE_ENV)
+    if settings_file:
+        with open(settings_file, "r") as f:
+            values.update(json.load(f))
+
+    fields = {field.name: field for field in dataclasses.fields(Settings)}
+    unknown = set(values) - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown settings in {settings_file}: {sorted(unknown)}")
+    for name, field in fields.items():
+        env_value = environ.get(ENV_PREFIX + name.upper())
+        if env_value is not None:
+            values[name] = _coerce(env_value, field.type)
+
+    settings = Settings(**values)
+    resolved = {name: os.path.normpath(os.path.join(BACKEND_DIR, getattr(settings, name))) for name in PATH_FIELDS}
+    return dataclasses.replace(settings, **resolved)
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Settings of this process, resolved once."""
+    return load_settings()
@@ -1,5 +1,6 @@
 """ App/Backend/schemas/images.py"""
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
 
 ########################
 ###### Generation ######
@@ -8,11 +9,20 @@ from pydantic import BaseModel
 class ImageGenerationPrompt(BaseModel):
     """Request body for image generation request."""
     prompt: str
+    preset: Literal["fast", "balanced", "quality"] = "quality"
+    # Output encoding: lossless PNG by default, quality applies to jpeg/webp/avif, compressLevel to png
+    codec: Literal["png", "jpeg", "webp", "avif"] = "png"
+    quality: int | None = Field(default=None, ge=1, le=100)
+    compressLevel: int | None = Field(default=None, ge=0, le=9)
+    # Identical requests share cached results: a seed makes them reproducible, fresh skips the cache
+    seed: int | None = Field(default=None, ge=0)
+    fresh: bool = False
 
 class GeneratedImage(BaseModel):
     """Single image prompted for image generation."""
     prompt: str
     imageBase64: str
+    mimeType: str = "image/png"
 
 class GeneratedImages(BaseModel):
     """Response body for image generation."""
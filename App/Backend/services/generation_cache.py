@@ -0,0 +1,177 @@
+"""services/generation_cache.py
+
+Result cache of /generate. Responses are keyed by the normalized prompt, the
+preset, the seed policy and the output encoding, kept in a small in-memory LRU
+and in a size-bounded directory shared by all workers, and expire after a TTL.
+Identical requests arriving while one is being generated wait for it instead
+of running the four inpaints again. Requests with `fresh` bypass the cache.
+"""
+
+# Standard library
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+# Local application
+from models.settings import get_settings
+from schemas.images import ImageGenerationPrompt, GeneratedImages
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, single spaces, no trailing punctuation: "A panda  juggles." == "a panda juggles"."""
+    return re.sub(r"\s+", " ", prompt).strip().rstrip(".!?").strip().lower()
+
+def generation_key(req: ImageGenerationPrompt) -> str:
+    """Cache key of a request. Without a seed any earlier result of the prompt is reused."""
+    seed_policy = "any" if req.seed is None else f"seed={req.seed}"
+    return json.dumps([normalize_prompt(req.prompt), req.preset, seed_policy, req.codec, req.quality, req.compressLevel])
+
+class GenerationCache:
+    """Memory LRU in front of a disk store, both bounded and expiring after `ttl_seconds`."""
+
+    def __init__(self, cache_dir: str, max_entries: int = 16, max_disk_bytes: int = 2 * 2**30,
+                 ttl_seconds: float = 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (created, GeneratedImages)
+        self.in_flight = {}  # key -> Future of the generation running for it
+
+        # Counters, read through stats()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> GeneratedImages | None:
+        """Cached response of the key, from memory or else from disk."""
+        if key in self.entries:
+            created, response = self.entries[key]
+            if not self._expired(created):
+                self.entries.move_to_end(key)
+                return response
+            del self.entries[key]
+
+        if self.max_disk_bytes <= 0:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("key") != key:
+            return None
+        if self._expired(record["created"]):
+            _remove(path)
+            return None
+        response = GeneratedImages.model_validate(record["response"])
+        self._remember(key, record["created"], response)
+        return response
+
+    def put(self, key: str, response: GeneratedImages):
+        created = time.time()
+        self._remember(key, created, response)
+        if self.max_disk_bytes <= 0:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # Written under a temporary name and renamed, other workers never read half a file
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump({"key": key, "created": created, "response": response.model_dump()}, f)
+        os.replace(temporary_path, path)
+        self._evict_disk()
+
+    def _remember(self, key: str, created: float, response: GeneratedImages):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (created, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _evict_disk(self):
+        """Removes expired files, then the oldest ones until the directory fits into max_disk_bytes."""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            stat = entry.stat()
+            if self._expired(stat.st_mtime):
+                _remove(entry.path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            _remove(path)
+            total -= size
+
+    async def get_or_generate(self, key: str, generate):
+        """Cached response, the response of the identical request in flight, or `await generate()`."""
+        while True:
+            response = self.get(key)
+            if response is not None:
+                self.hits += 1
+                return response
+
+            future = self.in_flight.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Only the request generating it was cancelled, so this one takes over
+                if not future.cancelled():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            response = await generate()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it, the future itself must not warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+        self.put(key, response)
+        future.set_result(response)
+        return response
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+@lru_cache(maxsize=None)
+def get_generation_cache() -> GenerationCache:
+    """Cache of this worker, the disk store is shared with the other workers."""
+    settings = get_settings()
+    return GenerationCache(settings.generation_cache_dir, settings.generation_cache_entries,
+                           settings.generation_cache_disk_bytes, settings.generation_cache_ttl_seconds)
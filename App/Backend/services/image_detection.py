@@ -3,58 +3,98 @@
 # Standard library
 import asyncio
 import base64
-import re
 import os
 import datetime
 import uuid
-import ast
 import difflib
 
 # Third-party
 import cv2
-from detectron2.utils.visualizer import Visualizer, ColorMode
+import numpy as np
 
 # Local application
 from schemas.images import DetectionRequest, DetectionResponse
-from models.configurations import test_metadata
+from models.configurations import get_test_metadata
+from models.settings import get_settings
 from services import states
-from services.image_summary import preprocess, generate_response, is_partial_match
-from services.image_utils import base64_to_image
+from services.image_utils import ImageBuffer
+from services.metrics import span, record_copy
+from services.model_jobs import get_model_jobs
+
+# (width, height) uploads are resized to before detection
+DETECTION_IMAGE_SIZE = (1600, 800)
+
+### Annotation ###
+
+def annotate_detections(image: ImageBuffer, detections: dict) -> ImageBuffer:
+    """
+    Draws the detections with detectron2's Visualizer, or as plain boxes where detectron2
+    is not installed (e.g. the CPU load test with fake models). Returns a BGR buffer.
+    """
+    #pylint: disable=import-outside-toplevel
+    try:
+        import torch
+        from detectron2.structures import Boxes, Instances
+        from detectron2.utils.visualizer import Visualizer, ColorMode
+    except ImportError:
+        # The canvas is a copy, the upload itself stays untouched
+        canvas = np.array(image.view("BGR"))
+        record_copy(canvas.nbytes)
+        for x1, y1, x2, y2 in detections["boxes"].astype(int):
+            cv2.rectangle(canvas, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+        return ImageBuffer(canvas, layout="BGR")
+
+    instances = Instances(image.pixels.shape[:2])
+    instances.pred_boxes = Boxes(torch.from_numpy(detections["boxes"]))
+    instances.scores = torch.from_numpy(detections["scores"])
+    instances.pred_classes = torch.from_numpy(detections["classes"])
+    v = Visualizer(
+        image.view("BGR"),  # Detectron2 draws on the BGR order
+        metadata=get_test_metadata(),   # should contain .thing_classes
+        scale=1.0,
+        instance_mode=ColorMode.IMAGE
+    )
+    # The Visualizer copies the image into its canvas
+    record_copy(image.pixels.nbytes)
+    out = v.draw_instance_predictions(instances)
+    # Canvas of the BGR input, so it is encoded without converting back
+    return ImageBuffer(out.get_image(), layout="BGR")
 
 ### Full Image Detection Pipeline ###
 
 async def detect(req: DetectionRequest) -> DetectionResponse:
     """Function used for detecting weird objects."""
+    # Already imported by models.registry at startup
+    from services.image_summary import is_partial_match  #pylint: disable=import-outside-toplevel
+
     # Set lock if not already set
     if states.BACKEND_LOCK is None:
         states.BACKEND_LOCK = asyncio.Lock()
 
-    async with states.BACKEND_LOCK:
-        # Decode base64 input to NumPy image array
-        detect_image = base64_to_image(req.imageBase64)
+    # In-process models, or the model host when served by several workers
+    jobs = get_model_jobs()
 
-        # Run Detectron2 Prediction
-        print("Running Prediction")
-        outputs = states.WEIRD_DETECTION_MODEL(detect_image)
+    async with states.BACKEND_LOCK:
+        # Decode base64 input to an RGB image buffer, the stages below take views of it
+        with span("decode"):
+            detect_image = ImageBuffer.from_base64(req.imageBase64, size=DETECTION_IMAGE_SIZE)
 
-        print("Prediction Outputs:", outputs)
+        # Run Detectron2 Prediction, boxes are pre-labelled by the ROI head when it is loaded
+        with span("detect", synchronize=True):
+            detections = await jobs.run("detect", detect_image.pixels)
+        states.CAPTION_STATS["filtered"] += detections["filtered"]
+        boxes, roi_labels = detections["boxes"], detections["roi_labels"]
 
-        instances = outputs["instances"].to("cpu")
-        boxes = instances.pred_boxes if instances.has("pred_boxes") else None
+        print("Prediction Outputs:", detections)
 
-        if boxes is None or len(boxes) == 0:
+        if len(boxes) == 0:
             print("No objects detected. Saving image.")
-            image_bgr = cv2.cvtColor(detect_image, cv2.COLOR_RGB2BGR)
-
-            current_directory = os.getcwd()
-            match = re.search(rf"(.*?){'Weird-Stuff-In-Traffic'}", current_directory)
-            path_to_base_directory = match.group(1) if match else current_directory
-
             filename = f"no_detection_{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jpeg"
-            save_path = os.path.join(path_to_base_directory, "Weird-Stuff-In-Traffic/App/Backend/images/failed_images", filename)
+            save_path = os.path.join(get_settings().failed_images_dir, filename)
 
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            cv2.imwrite(save_path, image_bgr)
+            with open(save_path, "wb") as f:
+                f.write(detect_image.encode(".jpeg"))
 
             return DetectionResponse(
                 prompt=req.prompt,
@@ -63,88 +103,77 @@ async def detect(req: DetectionRequest) -> DetectionResponse:
             )
 
         # Annotate image
-        v = Visualizer(
-            detect_image[:, :, ::-1],  # Convert RGB to BGR for Detectron2
-            metadata=test_metadata,   # should contain .thing_classes
-            scale=1.0,
-            instance_mode=ColorMode.IMAGE
-        )
-        out = v.draw_instance_predictions(outputs["instances"].to("cpu"))
-        annotated_image = out.get_image()[:, :, ::-1]  # Convert back to RGB
-
-        # Extract boxes
-        boxes = outputs["instances"].pred_boxes if outputs["instances"].has("pred_boxes") else []
+        with span("annotate"):
+            annotated_image = annotate_detections(detect_image, detections)
 
         # Detection summaries
         detection_summaries = []
 
-        # Crop the first detected object
-        cropped_image = detect_image
+        vlm_calls = 0
 
         for i, box in enumerate(boxes):
-            x1, y1, x2, y2 = map(int, box.tolist())
-            cropped_image = detect_image[y1:y2, x1:x2]
-
-            # Prompt preprocessing and generation (unchanged)
-            processed_prompt = preprocess(
-                instruction="Please create a list of objects in this image.",
-                image_np=cropped_image,
-                processor=states.DETECTION_DESCRIPTION_PROCESSOR
-            )
+            states.CAPTION_STATS["boxes"] += 1
+
+            # Confidently pre-labelled boxes skip the VLM
+            if roi_labels is not None and roi_labels[i][1] >= states.ROI_CONFIDENCE_THRESHOLD:
+                states.CAPTION_STATS["prelabelled"] += 1
+                detection_summary = [roi_labels[i][0]]
+            else:
+                # View of the box, only copied when it reaches the captioner
+                cropped_image = detect_image.crop(*map(int, box.tolist()))
+
+                # Summary of detection, decoding is constrained to a list of strings
+                with span("crop_caption", synchronize=True):
+                    detection_summary = await jobs.run("caption", cropped_image.pixels)
+                states.CAPTION_STATS["vlm_calls"] += 1
+                vlm_calls += 1
 
-            # Summary of detection
-            detection_summary = generate_response(
-                processed_prompt,
-                states.DETECTION_DESCRIPTION_MODEL,
-                states.DETECTION_DESCRIPTION_PROCESSOR,
-                device=states.DEVICE
-            )
             # Detections
             print("Single Detection Summary:", detection_summary)
 
-            try:
-                for detection in ast.literal_eval(detection_summary):
-                    if detection not in detection_summaries  and type(detection) is str:
-                        detection_summaries.append(str(detection).strip())
-            except Exception as e:
-                print("Error processing detection summary:", e)
+            for detection in detection_summary:
+                if detection not in detection_summaries:
+                    detection_summaries.append(detection)
+
+        print(f"VLM calls: {vlm_calls}/{len(boxes)} boxes, cumulative caption stats: {states.CAPTION_STATS}")
 
         # Encode annotated image to base64 JPEG
-        annotated_image_bgr = cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR)
-        success, buffer = cv2.imencode('.jpeg', annotated_image_bgr)
-        if not success:
-            raise ValueError("Failed to encode image.")
-        encoded_image = base64.b64encode(buffer).decode('utf-8')
+        with span("encode"):
+            encoded_image = base64.b64encode(annotated_image.encode(".jpeg")).decode('utf-8')
         image_base64_with_header = f"data:image/jpeg;base64,{encoded_image}"
 
         # Printing Raw detection summaries
         print("Raw Detection Summaries:", detection_summaries)
-        
-        # Recall Calculations and handling
-        try:
-            user_requested_set = set(item.lower() for item in states.USER_PROMPT_SUMMARY)
-            predicted_set = set(item.lower() for item in detection_summaries)
-
-            matches = {
-                user_item for user_item in user_requested_set
-                if user_item in predicted_set or is_partial_match(user_item, predicted_set)
-            }
-
-            recall = len(matches) / len(user_requested_set) if user_requested_set else 0.0
-
-        except Exception as e:
-            print("Error in recall calculation:", e)
-            recall = 0.0
-            predicted_set = []
-
-        # Scoring
-        if boxes:
-            score = 50.0 + round(50 * recall, 2) if recall != 0.0 else 50.0
-        else:
-            score = 0.0
+
+        # Nouns of the last generation prompt, kept by the model host when there are several workers
+        user_prompt_summary = await jobs.run("prompt_summary")
+
+        with span("score"):
+            # Recall Calculations and handling
+            try:
+                user_requested_set = set(item.lower() for item in user_prompt_summary)
+                predicted_set = set(item.lower() for item in detection_summaries)
+
+                matches = {
+                    user_item for user_item in user_requested_set
+                    if user_item in predicted_set or is_partial_match(user_item, predicted_set)
+                }
+
+                recall = len(matches) / len(user_requested_set) if user_requested_set else 0.0
+
+            except Exception as e:
+                print("Error in recall calculation:", e)
+                recall = 0.0
+                predicted_set = []
+
+            # Scoring
+            if len(boxes) > 0:
+                score = 50.0 + round(50 * recall, 2) if recall != 0.0 else 50.0
+            else:
+                score = 0.0
 
         # General Prints
-        print("User Requested Set:", states.USER_PROMPT_SUMMARY)
+        print("User Requested Set:", user_prompt_summary)
         print("Predicted Set:", predicted_set)
         print("Score:", score)
         print("Recall:", recall)
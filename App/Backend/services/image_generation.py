@@ -2,56 +2,69 @@
 
 # Standard library
 import asyncio
-from io import BytesIO
-import base64
 import os
 import random
 
-# Third-party
-from PIL import Image
-
 # Local application
 from schemas.images import ImageGenerationPrompt, GeneratedImage, GeneratedImages
 from services import states
 from services.prompt_summary import extract_nouns_with_counts
-from services.image_inpainting import get_suitable_region, get_random_bbox_within_bbox, realvisxl_inpaint
+from services.image_inpainting import get_suitable_region, get_random_bbox_within_bbox
+from services.image_utils import ImageBuffer
+from services.image_encoding import CODECS, resolve_codec, submit_encode
+from services.generation_cache import generation_key, get_generation_cache
+from services.metrics import span
+from services.model_jobs import get_model_jobs
+from models.settings import get_settings
 
 async def generate(req: ImageGenerationPrompt) -> GeneratedImages:
-    """Function used for generating weird images."""
+    """Function used for generating weird images, identical requests share cached results."""
     # Set lock if not already set
     if states.BACKEND_LOCK is None:
         states.BACKEND_LOCK = asyncio.Lock()
 
-    async with states.BACKEND_LOCK:
-        # Extracting the main nouns from the user's prompt
-        states.USER_PROMPT_SUMMARY = extract_nouns_with_counts(req.prompt)
+    # In-process models, or the model host when served by several workers
+    jobs = get_model_jobs()
+
+    # Extracting the main nouns from the user's prompt, scored by the next detection (cached or not)
+    await jobs.run("set_prompt_summary", extract_nouns_with_counts(req.prompt))
+
+    if req.fresh:
+        return await _generate(req, jobs)
+
+    response = await get_generation_cache().get_or_generate(generation_key(req), lambda: _generate(req, jobs))
+    # Cached images carry the prompt of the request that generated them
+    return GeneratedImages(images=[image.model_copy(update={"prompt": req.prompt}) for image in response.images])
+
+async def _generate(req: ImageGenerationPrompt, jobs) -> GeneratedImages:
+    """Runs the generation pipeline, reproducible when the request has a seed."""
+    rng = random.Random(req.seed) if req.seed is not None else random
 
+    async with states.BACKEND_LOCK:
         # Randomly select street image from dataset
-        street_image_folder_path = "/home/ai-team2/Weird-Stuff-In-Traffic/App/Backend/images/background_images"
-        all_street_image_paths = [
-            os.path.join(street_image_folder_path, f)
-            for f in os.listdir(street_image_folder_path)
+        background_images_dir = get_settings().background_images_dir
+        all_street_image_paths = sorted(
+            os.path.join(background_images_dir, f)
+            for f in os.listdir(background_images_dir)
             if f.lower().endswith((".png", ".jpg", ".jpeg"))
-        ]
-        image_path = random.choice(all_street_image_paths)
-        street_image = Image.open(image_path).convert("RGB")
-
-        # Gathering Suitable Region for Inpainting
-        polygons_results = states.STREET_DETECTION_MODEL.predict(
-            source=street_image,
-            task='segment',
-            verbose=False,
-            conf=0.25
         )
-        street_image, suitable_inpaint_region_bbox, height_diff = get_suitable_region(polygons_results, street_image)
+        image_path = rng.choice(all_street_image_paths)
+        # Decoded once, every stage and variant reads the same RGB buffer
+        street_image = ImageBuffer.from_file(image_path)
 
-        # Generation of images
+        # Gathering Suitable Region for Inpainting
+        with span("segment", synchronize=True):
+            polygons = await jobs.run("segment_street", street_image.pixels)
+        with span("region_search"):
+            street_image, suitable_inpaint_region_bbox, height_diff = get_suitable_region(polygons, street_image)
 
-        generated_images = []
+        # Generation of images, each one is encoded in the background while the next is diffused
 
-        strengths = [0.5,  0.55,  0.55,  0.6]
-        g_scales =  [11.0,  11,  6,  4]
+        codec = resolve_codec(req.codec)
+        encodings = []
 
+        # Text encoder counters before this request
+        embedding_stats = await jobs.run("prompt_embedding_stats")
 
         for i in range(4):
             # get random fitting bbox for inpainting
@@ -62,20 +75,31 @@ async def generate(req: ImageGenerationPrompt) -> GeneratedImages:
                         min_height=street_image.height*0.5,
                         max_height=street_image.height*0.9,
                         height_diff=height_diff,
-                        image_size=street_image.size
+                        image_size=street_image.size,
+                        rng=rng
                 )
 
-            # Inpainting the image
-            print("Attempting Inpainting")
-            inpainted_image = realvisxl_inpaint(street_image.copy(), inpaint_bbox, req.prompt, strengths[i], g_scales[i])
-            buffered = BytesIO()
-            inpainted_image.save(buffered, format="PNG")
+            # Inpainting the image with the scheduler, steps, strength and guidance scale of the requested preset
+            with span("inpaint", synchronize=True):
+                inpainted_image = ImageBuffer(
+                    await jobs.run("inpaint", street_image.pixels, inpaint_bbox, req.prompt, req.preset, i, req.seed))
 
-            # Encoding and Creating GeneratedImage object
-            inpainted_image_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-            generated_images.append(GeneratedImage(prompt=req.prompt,imageBase64=inpainted_image_base64))
+            encodings.append(submit_encode(inpainted_image, codec, req.quality, req.compressLevel))
 
+        # Creating GeneratedImage objects, only the last encoding is still running
+        with span("encode_wait"):
+            encoded_images = await asyncio.gather(*encodings)
+        generated_images = [GeneratedImage(prompt=req.prompt, imageBase64=encoded, mimeType=CODECS[codec].mime_type)
+                            for encoded in encoded_images]
 
         print(f"\nAll {len(generated_images)} pictures successfully processed ")
 
+        # Per-request text encoder time and cache hit rate
+        if embedding_stats is not None:
+            current_stats = await jobs.run("prompt_embedding_stats")
+            hits = current_stats["hits"] - embedding_stats["hits"]
+            lookups = hits + current_stats["misses"] - embedding_stats["misses"]
+            encode_seconds = current_stats["encode_seconds"] - embedding_stats["encode_seconds"]
+            print(f"Prompt encoding: {encode_seconds:.3f}s, cache hit rate {hits}/{lookups}")
+
         return GeneratedImages(images=generated_images)
@@ -1,14 +1,35 @@
 """services/image_inpainting.py"""
 
 # Imports
+import math
 import numpy as np
 import cv2
 import random
-from diffusers import DPMSolverMultistepScheduler
-import torch
 from PIL import Image, ImageDraw, ImageFilter
 from services import states
 
+# Prompt parts shared by every inpainting call
+STYLING_PROMPT = (
+    ", central position, size proportional to the surrounding, ultra-realistic photo, integration with natural shadows, "
+    "realistic reflections, consistent ambient lighting, matching camera angle and focal depth. "
+    "Preserve street texture and geometric alignment. crisp detail, "
+    "subtle gradients, consistent color tones, background integrety."
+)
+NEGATIVE_PROMPT = (
+    "big, huge, oversized objects, blurry, low resolution, poor detail, artifacts, double edges, distorted anatomy, extra limbs, "
+    "unrealistic lighting, harsh shadows, incorrect perspective, CGI, animation, "
+    "exaggerated pose, fake texture, logo, watermark, text, grainy, tiling, "
+    "disconnected background, disjointed integration, bad shadow, plastic look, out of place, half generated, missing limbs"
+)
+
+# Cropped inpainting: the window is padded past the mask blur and diffused near SDXL's native size
+CROP_PADDING = 160
+CROP_MULTIPLE = 64
+SDXL_NATIVE_AREA = 1024 * 1024
+MIN_DIFFUSION_AREA = 768 * 768
+# Windows covering more of the frame are diffused full-frame, cropping would only downscale them
+MAX_CROP_AREA_FRACTION = 0.6
+
 def _parse_polygon_string(polygon_data_string, image_width, image_height):
     '''
     Parses the polygon coordinates from a string, converts them and returns them
@@ -189,16 +210,15 @@ def get_suitable_inpaint_area(polygon_data_string, image_width, image_height):
         return None # no rectangle found
 
 
-def get_suitable_region(polygons_results, street_image):
+def get_suitable_region(polygons, street_image):
 
-    # extract polygon out of yolo output
-    for result in polygons_results:
-        for polygon in result.masks.xy:
-            scaled_polygon = []
-            for point in polygon:
-                normalized_point = (point[0] / street_image.width, point[1] / street_image.height)
-                scaled_polygon.append(f"{normalized_point[0]} {normalized_point[1]}")          
-            final_polygon = " ".join(scaled_polygon)
+    # normalize the street polygon (pixel xy), the last one is used
+    for polygon in polygons:
+        scaled_polygon = []
+        for point in polygon:
+            normalized_point = (point[0] / street_image.width, point[1] / street_image.height)
+            scaled_polygon.append(f"{normalized_point[0]} {normalized_point[1]}")
+        final_polygon = " ".join(scaled_polygon)
 
     # and get biggest bounding box inside polygon
     suitable_inpaint_region_bbox = get_suitable_inpaint_area(final_polygon, street_image.width, street_image.height)
@@ -216,17 +236,17 @@ def get_height_diff(polygon, bbox, image_height):
     min_y = int(min_y_normalized * image_height)
     return bbox[1] - min_y
 
-def get_random_bbox_within_bbox(bbox, min_width, max_width, min_height, max_height, height_diff, image_size):
+def get_random_bbox_within_bbox(bbox, min_width, max_width, min_height, max_height, height_diff, image_size, rng=random):
 
     x1, y1, x2, y2 = bbox
 
     # random center point inside bbox
-    xc = random.uniform(x1+0.2*(x2-x1), x2-0.2*(x2-x1))
-    yc = random.uniform(y1, y2)
+    xc = rng.uniform(x1+0.2*(x2-x1), x2-0.2*(x2-x1))
+    yc = rng.uniform(y1, y2)
 
     # random with and height
-    width = random.uniform(min_width, max_width)
-    height = random.uniform(min_height, max_height)
+    width = rng.uniform(min_width, max_width)
+    height = rng.uniform(min_height, max_height)
 
     # clip bbox size to image size to prevent a bigger bbox than image
     new_x1 = int(max(xc - width / 2, 0))
@@ -246,47 +266,110 @@ def create_mask_image(img_w, img_h, x1, y1, x2, y2):
     return mask
 
 
-def realvisxl_inpaint(image, bbox, user_prompt, strength, g_scale):
-
+def get_inpaint_window(bbox, image_size, padding=CROP_PADDING, multiple=CROP_MULTIPLE):
+    """Padded window around the bbox, snapped outwards to multiples of `multiple` and clipped to the image."""
     x1, y1, x2, y2 = bbox
+    image_width, image_height = image_size
 
-    styling_prompt = (
-        ", central position, size proportional to the surrounding, ultra-realistic photo, integration with natural shadows, "
-        "realistic reflections, consistent ambient lighting, matching camera angle and focal depth. "
-        "Preserve street texture and geometric alignment. crisp detail, "
-        "subtle gradients, consistent color tones, background integrety."
-    )
-    negative_prompt = (
-        "big, huge, oversized objects, blurry, low resolution, poor detail, artifacts, double edges, distorted anatomy, extra limbs, "
-        "unrealistic lighting, harsh shadows, incorrect perspective, CGI, animation, "
-        "exaggerated pose, fake texture, logo, watermark, text, grainy, tiling, "
-        "disconnected background, disjointed integration, bad shadow, plastic look, out of place, half generated, missing limbs"
-    )
+    window_x1 = max(0, (x1 - padding) // multiple * multiple)
+    window_y1 = max(0, (y1 - padding) // multiple * multiple)
+    window_x2 = min(image_width, math.ceil((x2 + padding) / multiple) * multiple)
+    window_y2 = min(image_height, math.ceil((y2 + padding) / multiple) * multiple)
 
-    mask_image = create_mask_image(image.size[0], image.size[1], x1, y1, x2, y2)
+    return (int(window_x1), int(window_y1), int(window_x2), int(window_y2))
 
-    # visualize mask for inpainting
-    # draw = ImageDraw.Draw(mask_image)
-    # draw.rectangle((x1, y1, x2, y2), outline='green', width=5)
-    # mask_image.save("G:/weirdstuffintraffic/mask_image.png")
 
-    torch.cuda.empty_cache()
-    torch.cuda.ipc_collect()
+def is_crop_worthwhile(window, image_size, max_area_fraction=MAX_CROP_AREA_FRACTION):
+    """Whether the padded window is clearly smaller than the frame."""
+    window_area = (window[2] - window[0]) * (window[3] - window[1])
+    return window_area < max_area_fraction * image_size[0] * image_size[1]
+
+
+def get_diffusion_size(width, height, multiple=CROP_MULTIPLE):
+    """
+    Resolution a window is diffused at: its own size scaled into the band between
+    MIN_DIFFUSION_AREA and SDXL_NATIVE_AREA, keeping the aspect ratio, snapped to `multiple`.
+    """
+    area = width * height
+    scale = 1.0
+    if area > SDXL_NATIVE_AREA:
+        scale = math.sqrt(SDXL_NATIVE_AREA / area)
+    elif area < MIN_DIFFUSION_AREA:
+        scale = math.sqrt(MIN_DIFFUSION_AREA / area)
+
+    diffusion_width = max(multiple, round(width * scale / multiple) * multiple)
+    diffusion_height = max(multiple, round(height * scale / multiple) * multiple)
+    return diffusion_width, diffusion_height
+
+
+def _run_inpainting_pipeline(image, mask_image, user_prompt, strength, g_scale, width, height,
+                             num_inference_steps, generator):
+    """Calls the SDXL inpainting pipeline on an image of the given size."""
+    import torch  #pylint: disable=import-outside-toplevel
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+        torch.cuda.ipc_collect()
+
+    # Use cached text encoder outputs when the embedding cache is available
+    if states.PROMPT_EMBEDDING_CACHE is not None:
+        prompt_kwargs = states.PROMPT_EMBEDDING_CACHE.get(user_prompt + STYLING_PROMPT)
+    else:
+        prompt_kwargs = {"prompt": user_prompt + STYLING_PROMPT, "negative_prompt": NEGATIVE_PROMPT}
 
     #pylint: disable=not-callable
     result = states.GENERATION_MODEL(
-        prompt=user_prompt + styling_prompt,
-        negative_prompt=negative_prompt,
+        **prompt_kwargs,
         image=image,
         mask_image=mask_image,
         strength=strength,
-        num_inference_steps=40,
+        num_inference_steps=num_inference_steps,
         guidance_scale=g_scale,
-        height=896,
-        width=1600,
-        inpaint_full_res=True,
-        inpaint_full_res_padding=32,
-        # generator=torch.Generator("cuda").manual_seed(42)
+        height=height,
+        width=width,
+        generator=generator,
     )
 
     return result.images[0]
+
+
+def realvisxl_inpaint(image, bbox, user_prompt, strength, g_scale, crop_to_bbox=False,
+                      num_inference_steps=40, generator=None):
+    """
+    Inpaints the prompt into the bbox region. With `crop_to_bbox` only a padded window
+    around the bbox is diffused and blended back through the feathered mask, so the
+    cost follows the bbox area instead of the full frame. Windows of more than
+    MAX_CROP_AREA_FRACTION of the frame fall back to full-frame diffusion.
+    """
+    x1, y1, x2, y2 = bbox
+
+    mask_image = create_mask_image(image.size[0], image.size[1], x1, y1, x2, y2)
+
+    # visualize mask for inpainting
+    # draw = ImageDraw.Draw(mask_image)
+    # draw.rectangle((x1, y1, x2, y2), outline='green', width=5)
+    # mask_image.save("G:/weirdstuffintraffic/mask_image.png")
+
+    # Diffuse only the window around the bbox, unless it covers most of the frame anyway
+    window = get_inpaint_window(bbox, image.size)
+    if not crop_to_bbox or not is_crop_worthwhile(window, image.size):
+        return _run_inpainting_pipeline(image, mask_image, user_prompt, strength, g_scale, width=1600, height=896,
+                                        num_inference_steps=num_inference_steps, generator=generator)
+
+    window_width, window_height = window[2] - window[0], window[3] - window[1]
+    diffusion_width, diffusion_height = get_diffusion_size(window_width, window_height)
+
+    window_image = image.crop(window)
+    window_mask = mask_image.crop(window)
+    inpainted_window = _run_inpainting_pipeline(
+        window_image.resize((diffusion_width, diffusion_height), Image.LANCZOS),
+        window_mask.resize((diffusion_width, diffusion_height), Image.BILINEAR),
+        user_prompt, strength, g_scale,
+        width=diffusion_width, height=diffusion_height,
+        num_inference_steps=num_inference_steps, generator=generator
+    )
+
+    # Blend the window back, the feathered mask keeps the untouched pixels and hides the seam
+    inpainted_window = inpainted_window.resize((window_width, window_height), Image.LANCZOS)
+    image.paste(inpainted_window, window[:2], window_mask)
+
+    return image
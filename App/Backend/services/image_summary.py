@@ -1,19 +1,29 @@
 """ services/image_summary """
 
 # Imports
-from PIL import Image
 import torch
 import numpy as np
 import transformers
 
+from services.image_utils import ImageBuffer
+
 MIN_SIZE = 28  # From the error
 
+# Structured decoding limits for the object-list captioner
+MAX_OBJECT_LIST_TOKENS = 64
+MAX_OBJECT_LIST_ITEMS = 10
+MAX_OBJECT_NAME_CHARS = 40
+
+# Characters that build the list syntax and characters never allowed inside an object name
+STRUCTURAL_CHARS = set("[]'\", ")
+FORBIDDEN_NAME_CHARS = set("[]'\",\\\n\r\t")
+
 def preprocess(instruction: str, image_np: np.ndarray,
                processor: transformers.AutoProcessor) -> transformers.BatchEncoding:
     """Preprocesses the image and prompt into the correct format for the VLM."""
 
     # Opening Image
-    image = Image.fromarray(image_np)
+    image = ImageBuffer(image_np).to_pil()
 
     # --- Resize if too small ---
     if image.height < MIN_SIZE or image.width < MIN_SIZE:
@@ -49,17 +59,200 @@ def preprocess(instruction: str, image_np: np.ndarray,
 
     return model_inputs
 
-def generate_response(model_inputs, base_model: transformers.Qwen2VLForConditionalGeneration,
-                      processor: transformers.AutoProcessor, device:torch.device,
-                      max_new_tokens=1024):
-    """ Generates the desired text from the given image and prompt."""
+### Structured Object-List Decoding ###
+
+class ObjectListGrammar:
+    """Character level state machine for a Python list of strings, e.g. ['car', 'tree']."""
+    START, OPEN, STRING, AFTER_ITEM, AFTER_COMMA, DONE, INVALID = range(7)
+
+    def __init__(self, max_items=MAX_OBJECT_LIST_ITEMS, max_name_chars=MAX_OBJECT_NAME_CHARS):
+        self.max_items = max_items
+        self.max_name_chars = max_name_chars
+        self.state = self.START
+        self.quote = None
+        self.current = []
+        self.items = []
+
+    def copy(self):
+        """Returns an independent copy of the grammar state."""
+        clone = ObjectListGrammar(self.max_items, self.max_name_chars)
+        clone.state = self.state
+        clone.quote = self.quote
+        clone.current = list(self.current)
+        clone.items = list(self.items)
+        return clone
+
+    def feed_char(self, char):
+        """Advances the state by one character. Returns False if the character breaks the grammar."""
+        if self.state == self.STRING:
+            if char == self.quote:
+                self.items.append("".join(self.current).strip())
+                self.current = []
+                self.state = self.AFTER_ITEM
+            elif char in FORBIDDEN_NAME_CHARS or len(self.current) >= self.max_name_chars:
+                self.state = self.INVALID
+            else:
+                self.current.append(char)
+        elif char == " " and self.state not in (self.DONE, self.INVALID):
+            pass
+        elif self.state == self.START and char == "[":
+            self.state = self.OPEN
+        elif self.state in (self.OPEN, self.AFTER_COMMA) and char in "'\"":
+            self.quote = char
+            self.state = self.STRING
+        elif self.state in (self.OPEN, self.AFTER_COMMA, self.AFTER_ITEM) and char == "]":
+            self.state = self.DONE
+        elif self.state == self.AFTER_ITEM and char == "," and len(self.items) < self.max_items:
+            self.state = self.AFTER_COMMA
+        else:
+            self.state = self.INVALID
+        return self.state != self.INVALID
+
+    def feed(self, text):
+        """Advances the state by a piece of text. Returns False if the text breaks the grammar."""
+        for char in text:
+            if not self.feed_char(char):
+                return False
+        return True
+
+    @property
+    def done(self):
+        """Whether the closing bracket has been generated."""
+        return self.state == self.DONE
+
+    @property
+    def accepts_name_tokens(self):
+        """Whether arbitrary object name tokens may follow."""
+        return self.state == self.STRING and len(self.current) < self.max_name_chars
+
+    @classmethod
+    def parse(cls, text):
+        """Parses generated text into object names, keeping every item completed before the budget ran out."""
+        grammar = cls(max_items=len(text), max_name_chars=len(text))
+        grammar.feed(text.strip())
+        return [item for item in grammar.items if item]
+
+
+class ObjectListTokenIndex:
+    """
+    Per-tokenizer split of the vocabulary into object name tokens and list syntax tokens.
+    The name token ids live on the generation device, the mask is built there every step.
+    """
+
+    def __init__(self, tokenizer, device=None):
+        vocab_size = tokenizer.vocab_size
+        texts = tokenizer.batch_decode([[token_id] for token_id in range(vocab_size)])
+
+        name_ids = []
+        self.structural_tokens = []
+        for token_id, text in enumerate(texts):
+            if not text:
+                continue
+            if set(text) <= STRUCTURAL_CHARS:
+                self.structural_tokens.append((token_id, text))
+            elif not set(text) & FORBIDDEN_NAME_CHARS:
+                name_ids.append(token_id)
+
+        self.texts = texts
+        self.name_ids = torch.tensor(name_ids, dtype=torch.long, device=device)
+
+    def text(self, token_id):
+        """Decoded text of a single token, empty for special tokens."""
+        return self.texts[token_id] if token_id < len(self.texts) else ""
+
+    def allowed_structural_ids(self, grammar):
+        """Syntax tokens that keep the grammar valid from its current state."""
+        return [token_id for token_id, text in self.structural_tokens if grammar.copy().feed(text)]
+
+
+_TOKEN_INDEX_CACHE = {}
+
+def get_object_list_token_index(tokenizer, device=None) -> ObjectListTokenIndex:
+    """
+    Builds the token index once per tokenizer and device. Decoding the vocabulary is too slow for
+    the request path, models.registry builds it when the captioner is loaded.
+    """
+    key = (id(tokenizer), str(torch.device(device)) if device is not None else None)
+    if key not in _TOKEN_INDEX_CACHE:
+        _TOKEN_INDEX_CACHE[key] = ObjectListTokenIndex(tokenizer, device)
+    return _TOKEN_INDEX_CACHE[key]
+
+
+class ObjectListLogitsProcessor(transformers.LogitsProcessor):
+    """Masks every token that would leave the list-of-strings grammar, forcing EOS once the list is closed."""
+
+    def __init__(self, token_index: ObjectListTokenIndex, eos_token_ids):
+        self.token_index = token_index
+        self.eos_token_ids = list(eos_token_ids)
+        self.prompt_length = None
+        self.consumed = None
+        self.grammars = []
+
+    def sync(self, input_ids: torch.LongTensor):
+        """Feeds all tokens generated since the last call into the per-row grammars."""
+        if self.prompt_length is None:
+            self.prompt_length = self.consumed = input_ids.shape[1]
+            self.grammars = [ObjectListGrammar() for _ in range(input_ids.shape[0])]
+            return
+
+        for position in range(self.consumed, input_ids.shape[1]):
+            for grammar, token_id in zip(self.grammars, input_ids[:, position].tolist()):
+                if not grammar.done and token_id not in self.eos_token_ids:
+                    grammar.feed(self.token_index.text(token_id))
+        self.consumed = input_ids.shape[1]
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        self.sync(input_ids)
+
+        mask = torch.full_like(scores, float("-inf"))
+        for row, grammar in enumerate(self.grammars):
+            if grammar.done or grammar.state == ObjectListGrammar.INVALID:
+                mask[row, self.eos_token_ids] = 0
+                continue
+            if grammar.accepts_name_tokens:
+                mask[row, self.token_index.name_ids] = 0
+            mask[row, self.token_index.allowed_structural_ids(grammar)] = 0
+
+        return scores + mask
+
+
+class ObjectListStoppingCriteria(transformers.StoppingCriteria):
+    """Stops each sequence as soon as its closing bracket has been generated."""
+
+    def __init__(self, logits_processor: ObjectListLogitsProcessor):
+        self.logits_processor = logits_processor
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        self.logits_processor.sync(input_ids)
+        return torch.tensor([grammar.done for grammar in self.logits_processor.grammars],
+                            dtype=torch.bool, device=input_ids.device)
+
+
+def generate_object_list(model_inputs, base_model: transformers.Qwen2VLForConditionalGeneration,
+                         processor: transformers.AutoProcessor, device: torch.device,
+                         max_new_tokens=MAX_OBJECT_LIST_TOKENS) -> list[str]:
+    """Generates the list of objects in the image with decoding constrained to a list of strings."""
     # Preparing device and setting inputs
     base_model.eval()
     model_inputs = model_inputs.to(device)
 
+    # Grammar constraint and early stop on the closing bracket
+    eos_token_ids = base_model.generation_config.eos_token_id
+    if isinstance(eos_token_ids, int):
+        eos_token_ids = [eos_token_ids]
+    logits_processor = ObjectListLogitsProcessor(get_object_list_token_index(processor.tokenizer, device),
+                                                 eos_token_ids)
+    stopping_criteria = ObjectListStoppingCriteria(logits_processor)
+
     # Performing generation and clipping
     with torch.no_grad():
-        generated_ids = base_model.generate(**model_inputs, max_new_tokens=max_new_tokens)
+        generated_ids = base_model.generate(
+            **model_inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            logits_processor=transformers.LogitsProcessorList([logits_processor]),
+            stopping_criteria=transformers.StoppingCriteriaList([stopping_criteria]),
+        )
         generated_ids_trimmed = [
             out_ids[len(in_ids) :] for in_ids, out_ids in zip(model_inputs.input_ids, generated_ids)
         ]
@@ -67,7 +260,7 @@ def generate_response(model_inputs, base_model: transformers.Qwen2VLForCondition
             generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
         )
 
-    return output_texts[0]
+    return ObjectListGrammar.parse(output_texts[0])
 
 def is_partial_match(user_item, predicted_set):
     return any(user_item in pred_item or pred_item in user_item for pred_item in predicted_set)
@@ -1,20 +1,96 @@
 """services/image_utils.py"""
 import base64
 import io
+from dataclasses import dataclass
 from PIL import Image
 import numpy as np
+import cv2
 
-def base64_to_image(base64_str, size=(1600, 800)):
-    """Decode base64 string to resized NumPy array image (RGB)."""
-    # Strip data URL scheme if present
-    if base64_str.startswith("data:image"):
-        base64_str = base64_str.split(",", 1)[1]
+from services.metrics import record_copy
 
-    image_data = base64.b64decode(base64_str)
-    image = Image.open(io.BytesIO(image_data)).convert("RGB")
+LAYOUTS = ("RGB", "BGR")
 
-    if size:
-        image = image.resize(size, Image.BILINEAR)
+@dataclass(frozen=True)
+class ImageBuffer:
+    """
+    One uint8 HxWx3 image and its channel order, handed between the pipeline stages of a request.
+    Crops and channel flips are views; every pixel copy goes through `_copy` and is counted per request.
+    """
+    pixels: np.ndarray
+    layout: str = "RGB"
 
-    return np.array(image) 
+    def __post_init__(self):
+        if self.layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout {self.layout}, expected one of {LAYOUTS}")
+        if self.pixels.dtype != np.uint8 or self.pixels.ndim != 3 or self.pixels.shape[2] != 3:
+            raise ValueError(f"Expected a uint8 HxWx3 array, got {self.pixels.dtype} {self.pixels.shape}")
 
+    @classmethod
+    def from_pil(cls, image: Image.Image) -> "ImageBuffer":
+        # convert() copies even when the mode already matches
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return cls(_copy(image), "RGB")
+
+    @classmethod
+    def from_file(cls, path: str) -> "ImageBuffer":
+        with Image.open(path) as image:
+            return cls.from_pil(image)
+
+    @classmethod
+    def from_base64(cls, base64_str: str, size=None) -> "ImageBuffer":
+        """Decodes a base64 (data URL) image, optionally resized to `size` (width, height)."""
+        # Strip data URL scheme if present
+        if base64_str.startswith("data:image"):
+            base64_str = base64_str.split(",", 1)[1]
+
+        image = Image.open(io.BytesIO(base64.b64decode(base64_str)))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if size and image.size != tuple(size):
+            image = image.resize(size, Image.BILINEAR)
+        return cls.from_pil(image)
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """(width, height) like PIL."""
+        return self.width, self.height
+
+    def view(self, layout: str = "RGB") -> np.ndarray:
+        """The pixels in `layout`, a channel-reversed view when it differs (no copy)."""
+        return self.pixels if layout == self.layout else self.pixels[:, :, ::-1]
+
+    def contiguous(self, layout: str = "RGB") -> np.ndarray:
+        """The pixels in `layout` as a C-contiguous array, copied only when they are not already."""
+        pixels = self.view(layout)
+        return pixels if pixels.flags.c_contiguous else _copy(pixels)
+
+    def crop(self, x1: int, y1: int, x2: int, y2: int) -> "ImageBuffer":
+        """View of the box (pixel xyxy)."""
+        return ImageBuffer(self.pixels[y1:y2, x1:x2], self.layout)
+
+    def to_pil(self) -> Image.Image:
+        # PIL keeps its own pixel storage for RGB, so this is always a copy
+        record_copy(self.pixels.nbytes)
+        return Image.fromarray(self.view("RGB"))
+
+    def encode(self, extension: str = ".jpeg") -> bytes:
+        """Encoded image bytes, e.g. ".jpeg" or ".png"."""
+        success, buffer = cv2.imencode(extension, self.contiguous("BGR"))
+        if not success:
+            raise ValueError("Failed to encode image.")
+        return buffer.tobytes()
+
+def _copy(pixels) -> np.ndarray:
+    """C-contiguous copy of an array or PIL image, counted for the current request."""
+    array = np.array(pixels, dtype=np.uint8, order="C")
+    record_copy(array.nbytes)
+    return array
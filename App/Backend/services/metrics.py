@@ -0,0 +1,166 @@
+"""services/metrics.py"""
+
+# Standard library
+import bisect
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Local application
+from services import states
+from services.generation_cache import get_generation_cache
+
+# Latency buckets in seconds, from encode/score stages up to full generation requests
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0)
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label value."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        with self.lock:
+            counts, totals = self.series.setdefault(label_value, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_value, (counts, (total, count)) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{le}"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {total}')
+                lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {count}')
+        return lines
+
+# Image buffer copies per request
+COPY_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+# Encoded image sizes in bytes, 64 KiB to 16 MiB
+BYTE_BUCKETS = tuple(2 ** exponent for exponent in range(16, 25))
+
+STAGE_SECONDS = Histogram("backend_stage_seconds", "Duration of one pipeline stage.", "stage")
+REQUEST_SECONDS = Histogram("backend_request_seconds", "Duration of one request, including lock waits.", "endpoint")
+IMAGE_COPIES = Histogram("backend_image_copies", "Image pixel buffers copied while handling one request.", "endpoint",
+                         buckets=COPY_BUCKETS)
+ENCODED_BYTES = Histogram("backend_encoded_bytes", "Size of one encoded output image.", "codec", buckets=BYTE_BUCKETS)
+
+# Stage durations of the request being handled, set by start_trace()
+_TRACE = contextvars.ContextVar("trace", default=None)
+
+# [copies, bytes] of image pixel buffers copied by the request being handled, set by start_trace()
+_COPIES = contextvars.ContextVar("copies", default=None)
+
+def _synchronize():
+    if states.DEVICE is not None and states.DEVICE.type == "cuda":
+        import torch  #pylint: disable=import-outside-toplevel
+        torch.cuda.synchronize(states.DEVICE)
+
+@contextmanager
+def span(stage: str, synchronize: bool = False):
+    """
+    Times a pipeline stage into the stage histogram and the current request trace.
+    With `synchronize` pending CUDA work is waited for, so GPU stages are timed fully.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if synchronize:
+            _synchronize()
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(stage, duration)
+        trace = _TRACE.get()
+        if trace is not None:
+            trace.append((stage, duration))
+
+def start_trace() -> list:
+    """Starts collecting the stage durations of the current request."""
+    trace = []
+    _TRACE.set(trace)
+    _COPIES.set([0, 0])
+    return trace
+
+def record_copy(nbytes: int):
+    """Counts one image pixel buffer copy for the current request (see services.image_utils.ImageBuffer)."""
+    copies = _COPIES.get()
+    if copies is not None:
+        copies[0] += 1
+        copies[1] += nbytes
+
+def request_copies() -> tuple[int, int]:
+    """(copies, bytes) of image pixel buffers copied by the current request so far."""
+    copies = _COPIES.get()
+    return (copies[0], copies[1]) if copies is not None else (0, 0)
+
+def peak_rss_bytes():
+    """High-water mark of the resident set size of this process, None where getrusage is unavailable."""
+    try:
+        import resource  #pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def server_timing(trace: list) -> str:
+    """Server-Timing header value of a trace, repeated stages are summed."""
+    totals = {}
+    for stage, duration in trace:
+        totals[stage] = totals.get(stage, 0.0) + duration
+    return ", ".join(f'{stage};dur={duration * 1000:.1f}' for stage, duration in totals.items())
+
+def profiler_for_request(endpoint: str):
+    """torch.profiler context for a sampled request when profiling is enabled, a no-op context otherwise."""
+    if states.PROFILE_SAMPLE_RATE <= 0 or random.random() >= states.PROFILE_SAMPLE_RATE:
+        return nullcontext()
+
+    import torch  #pylint: disable=import-outside-toplevel
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    os.makedirs(states.PROFILE_DIR, exist_ok=True)
+    trace_path = os.path.join(states.PROFILE_DIR, f"{endpoint}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.json")
+
+    def export(profiler):
+        profiler.export_chrome_trace(trace_path)
+        print(f"Profile of /{endpoint} written to {trace_path}")
+
+    return torch.profiler.profile(activities=activities, record_shapes=True, on_trace_ready=export)
+
+def _counter_lines(name: str, help_text: str, label: str, values: dict) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines.extend(f'{name}{{{label}="{key}"}} {value}' for key, value in values.items())
+    return lines
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render() + IMAGE_COPIES.render() + ENCODED_BYTES.render()
+    peak_rss = peak_rss_bytes()
+    if peak_rss is not None:
+        lines += ["# HELP backend_peak_rss_bytes Peak resident set size of this worker.",
+                  "# TYPE backend_peak_rss_bytes gauge", f"backend_peak_rss_bytes {peak_rss}"]
+    lines += _counter_lines("backend_caption_boxes_total", "Detected boxes by how they were captioned.", "kind",
+                            states.CAPTION_STATS)
+    lines += _counter_lines("backend_generation_cache_total", "Generation requests served from the cache, "
+                            "coalesced with an identical request in flight, or generated.", "kind",
+                            get_generation_cache().stats())
+    if states.PROMPT_EMBEDDING_CACHE is not None:
+        lines += _counter_lines("backend_prompt_embedding_cache_total", "Prompt embedding cache lookups and encode time.",
+                                "kind", states.PROMPT_EMBEDDING_CACHE.stats())
+    return "\n".join(lines) + "\n"
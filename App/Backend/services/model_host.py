@@ -0,0 +1,231 @@
+"""services/model_host.py
+
+Model host for multi-worker serving. One process owns the weights (SDXL,
+Qwen2-VL, Detectron2, streetseg) and runs the model jobs of
+services/model_jobs.py for any number of lightweight HTTP workers, which only
+decode, validate, encode and score. Jobs travel over a local
+multiprocessing.connection channel; image arrays are passed through shared
+memory instead of being pickled into the socket.
+
+    python -m services.model_host                                    # loads the models and serves jobs
+    WST_MODEL_HOST_ADDRESS=/tmp/wst_model_host.sock uvicorn main:app --workers 4
+or, starting both with a fresh key and a private socket:
+    WST_WORKERS=4 python main.py
+
+Messages are pickled, so whoever holds the key can run code in the host. A
+host:port address therefore needs its own WST_MODEL_HOST_AUTHKEY.
+"""
+
+# Standard library
+import os
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+# Third-party
+import numpy as np
+
+# Local application
+from models.settings import DEFAULT_MODEL_HOST_AUTHKEY, get_settings
+
+# Arrays below this size are pickled with the message, larger ones go through shared memory
+SHARED_MEMORY_MIN_BYTES = 64 * 1024
+
+class ModelHostError(RuntimeError):
+    """A job failed inside the model host."""
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Reference to an array in a shared memory segment."""
+    name: str
+    shape: tuple
+    dtype: str
+
+def parse_address(address: str):
+    """"host:port" for TCP, anything else is a unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+def check_address(address, authkey: bytes):
+    """Refuses a TCP address with the public default key, anyone reaching the port could run code."""
+    if isinstance(address, tuple) and authkey == DEFAULT_MODEL_HOST_AUTHKEY.encode():
+        raise ValueError(f"Model host on {address[0]}:{address[1]} needs WST_MODEL_HOST_AUTHKEY, "
+                         "the default key is public")
+
+def _untrack(segment):
+    """Stops this process' resource tracker from unlinking a segment another process owns."""
+    resource_tracker.unregister(segment._name, "shared_memory")  #pylint: disable=protected-access
+
+def _share(array: np.ndarray, segments: list, untrack: bool) -> SharedArray:
+    segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+    segments.append(segment)
+    if untrack:
+        # The receiving process unlinks the segment
+        _untrack(segment)
+    return SharedArray(segment.name, array.shape, array.dtype.str)
+
+def pack(value, segments: list, untrack: bool = False):
+    """Replaces large arrays in (nested) tuples, lists and dicts by shared memory references."""
+    if isinstance(value, np.ndarray) and value.nbytes >= SHARED_MEMORY_MIN_BYTES:
+        # Strided views (crops) are written into the segment directly, without a contiguous copy first
+        return _share(value, segments, untrack)
+    if isinstance(value, (list, tuple)):
+        return type(value)(pack(item, segments, untrack) for item in value)
+    if isinstance(value, dict):
+        return {key: pack(item, segments, untrack) for key, item in value.items()}
+    return value
+
+def unpack(value, unlink: bool = False):
+    """Copies shared memory references back into arrays, `unlink` frees segments owned by the receiver."""
+    if isinstance(value, SharedArray):
+        segment = shared_memory.SharedMemory(name=value.name)
+        try:
+            array = np.ndarray(value.shape, dtype=np.dtype(value.dtype), buffer=segment.buf).copy()
+        finally:
+            segment.close()
+            if unlink:
+                segment.unlink()
+            else:
+                # Attaching registers the segment too, its creator unlinks it
+                _untrack(segment)
+        return array
+    if isinstance(value, (list, tuple)):
+        return type(value)(unpack(item, unlink) for item in value)
+    if isinstance(value, dict):
+        return {key: unpack(item, unlink) for key, item in value.items()}
+    return value
+
+def _release(segments: list):
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+
+### Host ###
+
+class ModelHost:
+    """Serves the public methods of `jobs`, one job at a time since they share the GPU."""
+
+    def __init__(self, jobs, address: str, authkey: bytes):
+        self.jobs = jobs
+        address = parse_address(address)
+        check_address(address, authkey)
+        if isinstance(address, str) and os.path.exists(address):
+            # Socket file left behind by a previous host
+            os.remove(address)
+        self.listener = Listener(address, authkey=authkey)
+        self.job_lock = threading.Lock()
+
+    def serve_forever(self):
+        """Accepts worker connections until close() is called, one thread per connection."""
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def close(self):
+        self.listener.close()
+
+    def _serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    job, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                segments = []
+                try:
+                    if job.startswith("_") or not callable(getattr(self.jobs, job, None)):
+                        raise ValueError(f"Unknown job {job}")
+                    args = unpack(args)
+                    with self.job_lock:
+                        result = getattr(self.jobs, job)(*args)
+                    message = ("ok", pack(result, segments, untrack=True))
+                except Exception as e:  # reported to the worker, the host keeps serving
+                    traceback.print_exc()
+                    message = ("error", f"{type(e).__name__}: {e}")
+                finally:
+                    for segment in segments:
+                        segment.close()
+                connection.send(message)
+
+### Worker side ###
+
+class ModelHostClient:
+    """Blocking job calls to the model host over a small pool of connections."""
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = parse_address(address)
+        check_address(self.address, authkey)
+        self.authkey = authkey
+        self.connections = queue.LifoQueue()
+
+    def call(self, job: str, *args):
+        try:
+            connection = self.connections.get_nowait()
+        except queue.Empty:
+            connection = Client(self.address, authkey=self.authkey)
+
+        segments = []
+        try:
+            connection.send((job, pack(args, segments)))
+            status, result = connection.recv()
+        except BaseException:
+            connection.close()
+            raise
+        finally:
+            _release(segments)
+        self.connections.put(connection)
+
+        if status == "error":
+            raise ModelHostError(f"{job}: {result}")
+        return unpack(result, unlink=True)
+
+def wait_for_model_host(client: ModelHostClient, process=None, timeout: float = 900.0, interval: float = 1.0):
+    """Blocks until the host answers a ping, loading the models can take minutes."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if process is not None and process.poll() is not None:
+            raise ModelHostError(f"Model host exited with code {process.returncode}")
+        try:
+            client.call("ping")
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(interval)
+
+def connect_from_settings():
+    """RemoteModelJobs for the model host configured in the settings."""
+    from services.model_jobs import RemoteModelJobs  #pylint: disable=import-outside-toplevel
+    settings = get_settings()
+    return RemoteModelJobs(ModelHostClient(settings.model_host_address, settings.model_host_authkey.encode()))
+
+def main():
+    #pylint: disable=import-outside-toplevel
+    from models.registry import load_models
+    from services.model_jobs import LocalModelJobs
+
+    settings = get_settings()
+    if not settings.model_host_address:
+        raise SystemExit("Set WST_MODEL_HOST_ADDRESS (unix socket path or host:port) to run the model host")
+    print("Loading models...")
+    load_models()
+    host = ModelHost(LocalModelJobs(), settings.model_host_address, settings.model_host_authkey.encode())
+    print(f"Model host serving on {settings.model_host_address}")
+    try:
+        host.serve_forever()
+    finally:
+        host.close()
+
+if __name__ == "__main__":
+    main()
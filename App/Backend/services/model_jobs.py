@@ -0,0 +1,129 @@
+"""services/model_jobs.py
+
+Every model call of the request handlers as a job on numpy arrays and builtins.
+Handlers run them through `get_model_jobs().run(...)`: in-process by default, or
+forwarded to the model host process (services/model_host.py) when the backend
+is served by several HTTP workers.
+"""
+
+# Standard library
+import asyncio
+
+# Third-party
+import numpy as np
+
+# Local application
+from services import states
+from services.image_utils import ImageBuffer
+
+STREET_CONFIDENCE = 0.25
+CAPTION_INSTRUCTION = "Please create a list of objects in this image."
+
+class LocalModelJobs:
+    """Runs the jobs on the models loaded into `services.states` of this process."""
+
+    async def run(self, job: str, *args):
+        return getattr(self, job)(*args)
+
+    def ping(self) -> bool:
+        return True
+
+    def detect(self, image: np.ndarray) -> dict:
+        """Weird-object boxes of an RGB image, pre-labelled and filtered by the ROI head when it is loaded."""
+        roi_labels, filtered = None, 0
+        if states.ROI_VOCABULARY_HEAD is not None:
+            #pylint: disable=import-outside-toplevel
+            from services.roi_captioning import predict_with_roi_features, drop_background_boxes
+
+            # Reuse the detector's ROI features to pre-label boxes and drop confident background boxes
+            outputs, roi_features = predict_with_roi_features(states.WEIRD_DETECTION_MODEL, image)
+            roi_labels = states.ROI_VOCABULARY_HEAD.classify(roi_features)
+            outputs, roi_labels, filtered = drop_background_boxes(outputs, roi_labels, states.ROI_CONFIDENCE_THRESHOLD)
+        else:
+            outputs = states.WEIRD_DETECTION_MODEL(image)
+
+        instances = outputs["instances"].to("cpu")
+        if not instances.has("pred_boxes"):
+            return {"boxes": np.zeros((0, 4), dtype=np.float32), "scores": np.zeros(0, dtype=np.float32),
+                    "classes": np.zeros(0, dtype=np.int64), "roi_labels": None, "filtered": filtered}
+        return {
+            "boxes": instances.pred_boxes.tensor.numpy(),
+            "scores": instances.scores.numpy(),
+            "classes": instances.pred_classes.numpy(),
+            "roi_labels": roi_labels,
+            "filtered": filtered,
+        }
+
+    def caption(self, crop: np.ndarray) -> list[str]:
+        """Object list of an RGB crop, decoding is constrained to a list of strings."""
+        #pylint: disable=import-outside-toplevel
+        from services.image_summary import preprocess, generate_object_list
+
+        processed_prompt = preprocess(
+            instruction=CAPTION_INSTRUCTION,
+            image_np=crop,
+            processor=states.DETECTION_DESCRIPTION_PROCESSOR
+        )
+        return generate_object_list(
+            processed_prompt,
+            states.DETECTION_DESCRIPTION_MODEL,
+            states.DETECTION_DESCRIPTION_PROCESSOR,
+            device=states.DEVICE
+        )
+
+    def segment_street(self, image: np.ndarray) -> list[np.ndarray]:
+        """Street polygons (pixel xy) of an RGB image."""
+        # Arrays are read as BGR by ultralytics, like the BGR array it converts a PIL image into
+        results = states.STREET_DETECTION_MODEL.predict(
+            source=ImageBuffer(image).contiguous("BGR"),
+            task='segment',
+            verbose=False,
+            conf=STREET_CONFIDENCE
+        )
+        return [np.asarray(polygon, dtype=np.float32)
+                for result in results if result.masks is not None for polygon in result.masks.xy]
+
+    def inpaint(self, image: np.ndarray, bbox: tuple, prompt: str, preset_name: str, variant: int,
+                seed: int | None = None) -> np.ndarray:
+        """One generated variant. The preset is applied per job, so interleaved requests cannot mix presets."""
+        #pylint: disable=import-outside-toplevel
+        import torch
+        from models.sampler_presets import resolve_preset, apply_preset
+        from services.image_inpainting import realvisxl_inpaint
+
+        # Scheduler, steps, strengths and guidance scales of the requested preset
+        preset = resolve_preset(preset_name, states.GENERATION_ADAPTERS)
+        apply_preset(states.GENERATION_MODEL, preset, states.SCHEDULERS, states.GENERATION_ADAPTERS)
+        # Seeded requests get the same noise for the same variant
+        generator = torch.Generator(device=states.DEVICE).manual_seed(seed + variant) if seed is not None else None
+        # The pipeline pastes into its input, so every variant gets its own copy
+        inpainted_image = realvisxl_inpaint(ImageBuffer(image).to_pil(), bbox, prompt, preset.strengths[variant],
+                                            preset.guidance_scales[variant], crop_to_bbox=states.INPAINT_CROP_TO_BBOX,
+                                            num_inference_steps=preset.num_inference_steps,
+                                            generator=generator)
+        return ImageBuffer.from_pil(inpainted_image).pixels
+
+    def prompt_embedding_stats(self):
+        return states.PROMPT_EMBEDDING_CACHE.stats() if states.PROMPT_EMBEDDING_CACHE is not None else None
+
+    # The last generation prompt is scored by the next detection, possibly handled by another worker
+    def set_prompt_summary(self, summary: list[str]):
+        states.USER_PROMPT_SUMMARY = summary
+
+    def prompt_summary(self):
+        return states.USER_PROMPT_SUMMARY
+
+class RemoteModelJobs:
+    """Forwards the jobs to the model host, the blocking IPC runs off the event loop."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def run(self, job: str, *args):
+        return await asyncio.to_thread(self.client.call, job, *args)
+
+_LOCAL_JOBS = LocalModelJobs()
+
+def get_model_jobs():
+    """Remote jobs in multi-worker mode, in-process jobs otherwise."""
+    return states.MODEL_JOBS if states.MODEL_JOBS is not None else _LOCAL_JOBS
@@ -0,0 +1,65 @@
+"""services/prompt_embeddings.py"""
+
+# Standard library
+from collections import OrderedDict
+import time
+
+# Third-party
+import torch
+
+class PromptEmbeddingCache:
+    """
+    LRU cache of SDXL text encoder outputs. The constant negative prompt is encoded
+    once at startup, prompts are encoded on first use and reused afterwards.
+    """
+
+    def __init__(self, pipeline, negative_prompt: str, device: torch.device, max_size: int = 64):
+        self.pipeline = pipeline
+        self.device = device
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+        # Counters, read per request through stats()
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+
+        self.negative_prompt_embeds, self.negative_pooled_prompt_embeds = self._encode(negative_prompt)
+
+    def _encode(self, prompt: str):
+        """Runs both SDXL text encoders for a single prompt."""
+        start = time.perf_counter()
+        with torch.no_grad():
+            prompt_embeds, _, pooled_prompt_embeds, _ = self.pipeline.encode_prompt(
+                prompt=prompt,
+                device=self.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=False,
+            )
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+        self.encode_seconds += time.perf_counter() - start
+        return prompt_embeds, pooled_prompt_embeds
+
+    def get(self, prompt: str) -> dict:
+        """Returns the embedding keyword arguments for the pipeline call instead of prompt strings."""
+        if prompt in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(prompt)
+        else:
+            self.misses += 1
+            self.entries[prompt] = self._encode(prompt)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        prompt_embeds, pooled_prompt_embeds = self.entries[prompt]
+        return {
+            "prompt_embeds": prompt_embeds,
+            "pooled_prompt_embeds": pooled_prompt_embeds,
+            "negative_prompt_embeds": self.negative_prompt_embeds,
+            "negative_pooled_prompt_embeds": self.negative_pooled_prompt_embeds,
+        }
+
+    def stats(self) -> dict:
+        """Snapshot of the counters, subtract two snapshots to get per-request numbers."""
+        return {"hits": self.hits, "misses": self.misses, "encode_seconds": self.encode_seconds}
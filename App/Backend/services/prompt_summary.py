@@ -1,11 +1,9 @@
 """services/prompt_summary.py"""
 
 # Imports
-import spacy
+from functools import lru_cache
 from word2number import w2n
 
-nlp = spacy.load("en_core_web_sm")
-
 # Hardcoded container for words to exclude (background elements of a traffic scene)
 EXCLUDE_WORDS = {
     "road", "street", "sidewalk", "pavement", "curb", "crosswalk", 
@@ -21,8 +19,14 @@ EXCLUDE_WORDS = {
     "dusk", "dawn", "day", "night", "morning", "afternoon", "evening", "twilight"
 }
 
+@lru_cache(maxsize=None)
+def get_nlp():
+    """spaCy pipeline, loaded on first use (models.registry loads it at startup)."""
+    import spacy  #pylint: disable=import-outside-toplevel
+    return spacy.load("en_core_web_sm")
+
 def extract_nouns_with_counts(prompt):
-    doc = nlp(prompt)
+    doc = get_nlp()(prompt)
     results = []
     for token in doc:
         lemma_lower = token.lemma_.lower()
@@ -0,0 +1,233 @@
+"""services/roi_captioning.py
+
+Pre-labelling of detected boxes from the detector's ROI features. The vocabulary
+head is trained by distilling the crop captioner into it.
+
+Usage (from App/Backend):
+    python -m services.roi_captioning fit --images_dir data/weird_images --output models/roi_vocabulary_head.pth
+"""
+
+# Standard library
+import argparse
+import os
+import sys
+from collections import Counter
+
+# Third-party
+import numpy as np
+import torch
+from PIL import Image
+from torch import nn
+
+# Label used by the vocabulary head for boxes that are not weird objects
+BACKGROUND_LABEL = "__background__"
+
+### Detector Pass With Shared Features ###
+
+def predict_with_roi_features(predictor, image_np: np.ndarray):
+    """
+    Runs the detector the same way DefaultPredictor does, but also returns the
+    ROI-pooled box head features of every predicted box, so they can be reused
+    for labelling without a second vision encoder pass.
+    """
+    from detectron2.modeling import GeneralizedRCNN  #pylint: disable=import-outside-toplevel
+
+    model = predictor.model
+
+    with torch.no_grad():
+        # Same input handling as DefaultPredictor.__call__
+        original_image = image_np
+        if predictor.input_format == "RGB":
+            original_image = original_image[:, :, ::-1]
+        height, width = original_image.shape[:2]
+        image = predictor.aug.get_transform(original_image).apply_image(original_image)
+        image = torch.as_tensor(image.astype("float32").transpose(2, 0, 1)).to(predictor.cfg.MODEL.DEVICE)
+        inputs = [{"image": image, "height": height, "width": width}]
+
+        # Same steps as GeneralizedRCNN.inference, keeping the backbone features
+        images = model.preprocess_image(inputs)
+        features = model.backbone(images.tensor)
+        proposals, _ = model.proposal_generator(images, features, None)
+        instances, _ = model.roi_heads(images, features, proposals, None)
+
+        # Pool the final boxes (still in network input coordinates) through the box head
+        roi_heads = model.roi_heads
+        box_features = roi_heads.box_pooler(
+            [features[f] for f in roi_heads.box_in_features],
+            [x.pred_boxes for x in instances]
+        )
+        box_features = roi_heads.box_head(box_features)
+
+        results = GeneralizedRCNN._postprocess(instances, inputs, images.image_sizes) #pylint: disable=protected-access
+
+    return results[0], box_features
+
+
+def drop_background_boxes(outputs, roi_labels, threshold):
+    """Removes boxes the vocabulary head confidently labels as background. Returns the filtered count too."""
+    keep = [not (label == BACKGROUND_LABEL and confidence >= threshold) for label, confidence in roi_labels]
+    instances = outputs["instances"]
+    outputs["instances"] = instances[torch.as_tensor(keep, dtype=torch.bool, device=instances.pred_boxes.device)]
+    kept_labels = [roi_label for roi_label, kept in zip(roi_labels, keep) if kept]
+    return outputs, kept_labels, keep.count(False)
+
+
+### Vocabulary Head ###
+
+class RoiVocabularyHead(nn.Module):
+    """Linear classifier over the weird-object vocabulary on top of the detector's box head features."""
+
+    def __init__(self, vocabulary: list[str], in_features: int = 1024):
+        super().__init__()
+        self.vocabulary = list(vocabulary)
+        self.in_features = in_features
+        self.classifier = nn.Linear(in_features, len(self.vocabulary))
+
+    def forward(self, features: torch.Tensor) -> torch.Tensor:
+        """Returns the vocabulary logits for a batch of box features."""
+        return self.classifier(features)
+
+    @torch.no_grad()
+    def classify(self, features: torch.Tensor) -> list[tuple[str, float]]:
+        """Returns the most likely vocabulary label and its probability for each box."""
+        if len(features) == 0:
+            return []
+        probabilities = self(features.to(self.classifier.weight.device)).softmax(dim=-1)
+        confidences, indices = probabilities.max(dim=-1)
+        return [(self.vocabulary[i], c) for i, c in zip(indices.tolist(), confidences.tolist())]
+
+    @classmethod
+    def fit(cls, features: torch.Tensor, labels: list[str], vocabulary: list[str],
+            epochs: int = 200, lr: float = 1e-2) -> "RoiVocabularyHead":
+        """Trains a head on collected box features and their labels (full batch, it is a linear probe)."""
+        head = cls(vocabulary, in_features=features.shape[1])
+        targets = torch.tensor([head.vocabulary.index(label) for label in labels], dtype=torch.long)
+        optimizer = torch.optim.AdamW(head.parameters(), lr=lr)
+
+        head.train()
+        for _ in range(epochs):
+            optimizer.zero_grad()
+            loss = nn.functional.cross_entropy(head(features), targets)
+            loss.backward()
+            optimizer.step()
+
+        return head.eval()
+
+    def save(self, path: str):
+        """Saves the head together with its vocabulary."""
+        torch.save({
+            "vocabulary": self.vocabulary,
+            "in_features": self.in_features,
+            "state_dict": self.state_dict(),
+        }, path)
+
+    @classmethod
+    def load(cls, path: str, device: torch.device) -> "RoiVocabularyHead":
+        """Loads a head saved with `save`."""
+        checkpoint = torch.load(path, map_location="cpu")
+        head = cls(checkpoint["vocabulary"], checkpoint["in_features"])
+        head.load_state_dict(checkpoint["state_dict"])
+        return head.to(device).eval()
+
+
+### Training ###
+
+def caption_label(caption: list[str]) -> str:
+    """Head label of a crop caption: its first object, or background when the captioner sees nothing."""
+    return caption[0].strip().lower() if caption else BACKGROUND_LABEL
+
+def build_vocabulary(labels: list[str], max_labels: int = 64, min_count: int = 3) -> list[str]:
+    """Background plus the most frequent labels seen at least `min_count` times."""
+    counts = Counter(label for label in labels if label != BACKGROUND_LABEL)
+    frequent = sorted((label for label, count in counts.items() if count >= min_count),
+                      key=lambda label: (-counts[label], label))
+    return [BACKGROUND_LABEL] + frequent[:max_labels]
+
+def collect_roi_samples(image_paths: list[str], predictor, caption_crop, image_size=None):
+    """
+    Runs the detector over the images and captions every predicted box with `caption_crop`
+    (RGB crop -> object list). Returns the box features (N x D, on the CPU) and their labels.
+    """
+    features, labels = [], []
+    for i, path in enumerate(image_paths):
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+            if image_size and image.size != tuple(image_size):
+                image = image.resize(image_size, Image.BILINEAR)
+            image_np = np.array(image)
+
+        outputs, box_features = predict_with_roi_features(predictor, image_np)
+        boxes = outputs["instances"].pred_boxes.tensor.cpu().numpy().astype(int)
+        for (x1, y1, x2, y2), box_feature in zip(boxes, box_features.cpu()):
+            crop = image_np[y1:y2, x1:x2]
+            if crop.size == 0:
+                continue
+            features.append(box_feature)
+            labels.append(caption_label(caption_crop(crop)))
+        print(f"[{i + 1}/{len(image_paths)}] {path}: {len(boxes)} boxes, {len(labels)} samples")
+
+    if not features:
+        return torch.zeros((0, 0)), []
+    return torch.stack(features), labels
+
+def fit_from_samples(features: torch.Tensor, labels: list[str], max_labels: int = 64, min_count: int = 3,
+                     epochs: int = 200, lr: float = 1e-2) -> RoiVocabularyHead:
+    """Trains a head over the frequent labels, samples of rare labels are left out."""
+    vocabulary = build_vocabulary(labels, max_labels, min_count)
+    keep = [label in vocabulary for label in labels]
+    kept_labels = [label for label, kept in zip(labels, keep) if kept]
+    return RoiVocabularyHead.fit(features[torch.as_tensor(keep, dtype=torch.bool)], kept_labels, vocabulary,
+                                 epochs=epochs, lr=lr)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the ROI vocabulary head on captioned detections")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    fit = subparsers.add_parser("fit", help="Collect ROI features, caption their crops and fit the head")
+    fit.add_argument("--images_dir", type=str, required=True, help="Directory of traffic images")
+    fit.add_argument("--output", type=str, default=None, help="Head checkpoint, defaults to the roi_vocabulary_head setting")
+    fit.add_argument("--samples", type=str, default=None,
+                     help="Cache of collected features and labels: reused when it exists, written otherwise")
+    fit.add_argument("--max_images", type=int, default=None)
+    fit.add_argument("--max_labels", type=int, default=64, help="Vocabulary size besides background")
+    fit.add_argument("--min_count", type=int, default=3, help="Samples a label needs to enter the vocabulary")
+    fit.add_argument("--epochs", type=int, default=200)
+    fit.add_argument("--lr", type=float, default=1e-2)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    #pylint: disable=import-outside-toplevel
+    from models.registry import load_models
+    from models.settings import get_settings
+    from services import states
+    from services.image_detection import DETECTION_IMAGE_SIZE
+    from services.model_jobs import LocalModelJobs
+
+    args = parse_args(argv)
+    output = args.output or get_settings().roi_vocabulary_head
+
+    if args.samples and os.path.exists(args.samples):
+        samples = torch.load(args.samples)
+        features, labels = samples["features"], samples["labels"]
+        print(f"Loaded {len(labels)} samples from {args.samples}")
+    else:
+        image_paths = sorted(entry.path for entry in os.scandir(args.images_dir)
+                             if entry.is_file() and entry.name.lower().endswith((".png", ".jpg", ".jpeg")))
+        image_paths = image_paths[:args.max_images]
+        if not image_paths:
+            sys.exit(f"No images in {args.images_dir}")
+
+        load_models(("detection", "captioner"))
+        features, labels = collect_roi_samples(image_paths, states.WEIRD_DETECTION_MODEL,
+                                               LocalModelJobs().caption, DETECTION_IMAGE_SIZE)
+        if args.samples:
+            torch.save({"features": features, "labels": labels}, args.samples)
+
+    if not labels:
+        sys.exit("No detections to train on")
+    head = fit_from_samples(features, labels, args.max_labels, args.min_count, args.epochs, args.lr)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    head.save(output)
+    print(f"Saved ROI vocabulary head with {len(head.vocabulary)} labels to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,36 @@ STREET_DETECTION_MODEL = None
 DETECTION_DESCRIPTION_MODEL = None
 DETECTION_DESCRIPTION_PROCESSOR = None
 
+# Sampler preset schedulers and loaded few-step adapters
+SCHEDULERS = None
+GENERATION_ADAPTERS = set()
+
+# SDXL text encoder output cache
+PROMPT_EMBEDDING_CACHE = None
+
+# Diffuse only a padded window around the inpaint bbox when it is clearly smaller than the frame
+INPAINT_CROP_TO_BBOX = True
+
+# Optional ROI feature head that pre-labels boxes before the VLM
+ROI_VOCABULARY_HEAD = None
+ROI_CONFIDENCE_THRESHOLD = 0.9
+
+# Cumulative caption counters (boxes seen, VLM calls, boxes pre-labelled or filtered by the ROI head)
+CAPTION_STATS = {"boxes": 0, "vlm_calls": 0, "prelabelled": 0, "filtered": 0}
+
+# Per-request Server-Timing headers for every request (clients can also send "X-Trace: 1")
+TRACE_HEADERS = False
+
+# Fraction of requests captured with torch.profiler (0 disables profiling) and where traces are written
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_DIR = "profiles"
+
 # Model Process Lock
 BACKEND_LOCK = None
 
+# Model jobs forwarded to the model host process when served by several workers (services.model_jobs)
+MODEL_JOBS = None
+
 # Device
 DEVICE = None
 
@@ -0,0 +1,329 @@
+"""services/video_detection.py
+
+Weird-object detection over dashcam video or frame sequences. Frames are decoded
+on a background thread (skipped frames are grabbed without decoding), the
+detector runs every `detect_every` processed frames and a Kalman/IoU tracker
+carries the boxes in between. Street polygons are only re-segmented when the
+scene changed. Every processed frame yields one record; run as a module to
+write them as JSON lines:
+
+    python -m services.video_detection --source dashcam.mp4 --detect_every 5 --frame_skip 1 --output detections.jsonl
+"""
+
+# Standard library
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+# Third-party
+import cv2
+import numpy as np
+
+# Local application
+from services import states
+from services.image_utils import ImageBuffer
+from services.metrics import span
+from services.model_jobs import LocalModelJobs
+from models.registry import load_models
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+### Frame decoding ###
+
+class FrameReader:
+    """
+    Iterates (frame index, seconds, BGR frame) of a video file/stream or an image
+    directory. Decoding runs ahead on a thread into a bounded queue; of every
+    `frame_skip + 1` frames only the first is decoded.
+    """
+
+    def __init__(self, source: str, frame_skip: int = 0, queue_size: int = 8):
+        self.source = source
+        self.step = frame_skip + 1
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.error = None
+        self.fps = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _put(self, item) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_directory(self):
+        names = sorted(f for f in os.listdir(self.source) if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.fps = self.fps or 30.0
+        for index in range(0, len(names), self.step):
+            frame = cv2.imread(os.path.join(self.source, names[index]))
+            if frame is not None and not self._put((index, index / self.fps, frame)):
+                return
+
+    def _read_video(self):
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            raise FileNotFoundError(f"Cannot open video source {self.source}")
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        index = 0
+        try:
+            while True:
+                if index % self.step:
+                    # grab() advances without decoding the frame
+                    if not capture.grab():
+                        return
+                else:
+                    ok, frame = capture.read()
+                    if not ok or not self._put((index, index / self.fps, frame)):
+                        return
+                index += 1
+        finally:
+            capture.release()
+
+    def _run(self):
+        try:
+            if os.path.isdir(self.source):
+                self._read_directory()
+            else:
+                self._read_video()
+        except Exception as e:  # re-raised in the consuming thread
+            self.error = e
+        finally:
+            self._put(None)
+
+    def __iter__(self):
+        self.thread.start()
+        try:
+            while True:
+                item = self.frames.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            self.stop_event.set()
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+### Tracking ###
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of two xyxy box arrays, shape [len(a), len(b)]."""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+class KalmanBox:
+    """Constant-velocity Kalman filter over (cx, cy, w, h), one step per processed frame."""
+
+    # Transition (position += velocity) and measurement (position only) matrices
+    F = np.eye(8) + np.eye(8, k=4)
+    H = np.eye(4, 8)
+
+    def __init__(self, box: np.ndarray):
+        self.x = np.zeros(8)
+        self.x[:4] = self._to_cxcywh(box)
+        # Unknown velocities start with a large variance
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e3, 1e3, 1e3, 1e3])
+        self.Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.01, 0.01])
+        self.R = np.diag([4.0, 4.0, 16.0, 16.0])
+
+    @staticmethod
+    def _to_cxcywh(box):
+        x1, y1, x2, y2 = box
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+    def box(self) -> np.ndarray:
+        cx, cy, w, h = self.x[:4]
+        w, h = max(w, 1.0), max(h, 1.0)
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    def predict(self):
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def update(self, box: np.ndarray):
+        residual = self._to_cxcywh(box) - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ residual
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+
+class Track:
+    def __init__(self, track_id: int, box: np.ndarray, score: float, label: int):
+        self.track_id = track_id
+        self.filter = KalmanBox(box)
+        self.score = score
+        self.label = label
+        self.missed = 0  # detection rounds without a matching detection
+
+class BoxTracker:
+    """
+    Greedy IoU association of detections to Kalman-predicted tracks. Tracks that
+    miss `max_missed` consecutive detection rounds are dropped.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 1):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self.next_id = 0
+
+    def boxes(self) -> np.ndarray:
+        return np.array([track.filter.box() for track in self.tracks]).reshape(-1, 4)
+
+    def predict(self):
+        """Advances every track by one processed frame."""
+        for track in self.tracks:
+            track.filter.predict()
+
+    def update(self, boxes: np.ndarray, scores: np.ndarray, labels: np.ndarray):
+        """Corrects the (already predicted) tracks with the detections of this frame."""
+        iou = box_iou(self.boxes(), boxes)
+        matched_tracks, matched_detections = set(), set()
+        for flat in np.argsort(-iou, axis=None):
+            t, d = np.unravel_index(flat, iou.shape)
+            if iou[t, d] < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            track = self.tracks[t]
+            track.filter.update(boxes[d])
+            track.score, track.label, track.missed = float(scores[d]), int(labels[d]), 0
+            matched_tracks.add(t)
+            matched_detections.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for d in range(len(boxes)):
+            if d not in matched_detections:
+                self.tracks.append(Track(self.next_id, boxes[d], float(scores[d]), int(labels[d])))
+                self.next_id += 1
+
+### Scene change ###
+
+class SceneChangeDetector:
+    """Compares a small HSV histogram of each frame with the one of the last segmented frame."""
+
+    def __init__(self, threshold: float = 0.7):
+        self.threshold = threshold
+        self.reference = None
+
+    @staticmethod
+    def _histogram(frame):
+        small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1, 2], None, [8, 4, 4], [0, 180, 0, 256, 0, 256])
+        return cv2.normalize(histogram, histogram).flatten()
+
+    def changed(self, frame) -> bool:
+        """True for the first frame and whenever the correlation drops below the threshold (new reference)."""
+        histogram = self._histogram(frame)
+        if self.reference is not None and cv2.compareHist(self.reference, histogram, cv2.HISTCMP_CORREL) >= self.threshold:
+            return False
+        self.reference = histogram
+        return True
+
+### Pipeline ###
+
+def detect_frame(frame):
+    """Boxes (xyxy), scores and classes of the weird-object detector on one BGR frame."""
+    with span("video_detect", synchronize=True):
+        instances = states.WEIRD_DETECTION_MODEL(frame)["instances"].to("cpu")
+    return (instances.pred_boxes.tensor.numpy(), instances.scores.numpy(),
+            instances.pred_classes.numpy())
+
+def segment_street(frame) -> list:
+    """Street polygons (pixel coordinates) of one BGR frame, segmented by the same job as /generate."""
+    # The job takes RGB and hands the model BGR again, both are views of the frame
+    with span("video_segment", synchronize=True):
+        polygons = LocalModelJobs().segment_street(ImageBuffer(frame, layout="BGR").view("RGB"))
+    return [polygon.tolist() for polygon in polygons]
+
+def detect_video(source: str, detect_every: int = 5, frame_skip: int = 0, scene_threshold: float = 0.7,
+                 segment_street_polygons: bool = True, max_frames: int = None, stats: dict = None):
+    """
+    Yields one record per processed frame: tracked boxes, whether the detector ran,
+    the street polygons whenever they were re-segmented and the running fps.
+    `stats` (optional dict) is filled with the totals of the run.
+    """
+    reader = FrameReader(source, frame_skip)
+    tracker = BoxTracker()
+    scene = SceneChangeDetector(scene_threshold)
+    stats = stats if stats is not None else {}
+    stats.update({"frames": 0, "detector_calls": 0, "segmentations": 0, "decode_wait_seconds": 0.0})
+
+    start = time.perf_counter()
+    wait_start = start
+    for processed, (index, seconds, frame) in enumerate(reader):
+        stats["decode_wait_seconds"] += time.perf_counter() - wait_start
+
+        tracker.predict()
+        detected = processed % detect_every == 0
+        if detected:
+            tracker.update(*detect_frame(frame))
+            stats["detector_calls"] += 1
+
+        record = {"frame": index, "time": round(seconds, 3), "detected": detected}
+        if segment_street_polygons and scene.changed(frame):
+            record["street_polygons"] = segment_street(frame)
+            stats["segmentations"] += 1
+
+        record["detections"] = [
+            {"track_id": track.track_id, "box": [round(v, 1) for v in track.filter.box().tolist()],
+             "score": round(track.score, 3), "class": track.label}
+            for track in tracker.tracks if track.missed == 0
+        ]
+        stats["frames"] += 1
+        record["fps"] = round(stats["frames"] / (time.perf_counter() - start), 2)
+        yield record
+
+        if max_frames is not None and stats["frames"] >= max_frames:
+            break
+        wait_start = time.perf_counter()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["fps"] = stats["frames"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["source_fps"] = reader.fps
+
+def main():
+    parser = argparse.ArgumentParser(description="Weird-object detection over a video or frame directory")
+    parser.add_argument("--source", type=str, required=True, help="Video file, stream URL or directory of frames")
+    parser.add_argument("--output", type=str, default=None, help="JSON lines file, stdout if omitted")
+    parser.add_argument("--detect_every", type=int, default=5, help="Run the detector every k processed frames")
+    parser.add_argument("--frame_skip", type=int, default=0, help="Frames skipped without decoding after each processed one")
+    parser.add_argument("--scene_threshold", type=float, default=0.7, help="Histogram correlation below which the street is re-segmented")
+    parser.add_argument("--no_street", action="store_true", help="Skip street segmentation")
+    parser.add_argument("--max_frames", type=int, default=None)
+    args = parser.parse_args()
+
+    # Detector and street segmentation with the backend configurations
+    load_models(("detection", "street"))
+    stats = {}
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for record in detect_video(args.source, args.detect_every, args.frame_skip, args.scene_threshold,
+                                   not args.no_street, args.max_frames, stats):
+            output.write(json.dumps(record) + "\n")
+    finally:
+        if args.output:
+            output.close()
+    print(json.dumps({"stats": stats}), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
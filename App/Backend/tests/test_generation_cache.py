@@ -0,0 +1,81 @@
+"""tests/test_generation_cache.py"""
+
+# Imports
+import sys
+import os
+import asyncio
+import time
+import pytest
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("pydantic")
+
+#pylint: disable=wrong-import-position
+from schemas.images import ImageGenerationPrompt, GeneratedImage, GeneratedImages
+from services.generation_cache import GenerationCache, generation_key
+
+def _response(tag: str) -> GeneratedImages:
+    return GeneratedImages(images=[GeneratedImage(prompt=tag, imageBase64=tag * 4)])
+
+def test_key_normalizes_prompt_and_separates_seed_policy():
+    key = generation_key(ImageGenerationPrompt(prompt="A panda  juggles on the middle lane."))
+    assert key == generation_key(ImageGenerationPrompt(prompt=" a panda juggles on the middle lane"))
+    assert key != generation_key(ImageGenerationPrompt(prompt="A panda juggles on the middle lane.", seed=1))
+    assert key != generation_key(ImageGenerationPrompt(prompt="A panda juggles on the middle lane.", preset="fast"))
+
+def test_concurrent_identical_requests_share_one_generation(tmp_path):
+    cache = GenerationCache(str(tmp_path))
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return _response("panda")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_generate("key", generate) for _ in range(4)))
+
+    responses = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(response == responses[0] for response in responses)
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": 3}
+
+    # Later requests are cache hits
+    assert asyncio.run(cache.get_or_generate("key", generate)) == responses[0]
+    assert cache.stats()["hits"] == 1 and len(calls) == 1
+
+def test_failures_are_shared_but_not_cached(tmp_path):
+    cache = GenerationCache(str(tmp_path))
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("out of memory")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_generate("key", fail) for _ in range(2)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+    assert cache.get("key") is None and not cache.in_flight
+
+def test_disk_store_is_shared_and_expires(tmp_path):
+    GenerationCache(str(tmp_path)).put("key", _response("panda"))
+
+    # Another worker, nothing in its memory
+    assert GenerationCache(str(tmp_path)).get("key") == _response("panda")
+
+    expired = GenerationCache(str(tmp_path), ttl_seconds=0.0)
+    time.sleep(0.01)
+    assert expired.get("key") is None
+    assert not os.listdir(tmp_path)
+
+def test_disk_store_evicts_oldest_files(tmp_path):
+    size = len(_response("a").model_dump_json()) + 100
+    cache = GenerationCache(str(tmp_path), max_entries=0, max_disk_bytes=2 * size)
+    for i, key in enumerate(("a", "b", "c")):
+        cache.put(key, _response(key))
+        os.utime(cache._path(key), (time.time() + i, time.time() + i))  #pylint: disable=protected-access
+
+    assert cache.get("a") is None
+    assert cache.get("b") == _response("b") and cache.get("c") == _response("c")
@@ -0,0 +1,50 @@
+"""tests/test_image_encoding.py"""
+
+# Imports
+import sys
+import os
+import io
+import base64
+import asyncio
+import pytest
+import numpy as np
+from PIL import Image
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("cv2")
+
+#pylint: disable=wrong-import-position
+from services import image_encoding
+from services.image_encoding import encode_image, resolve_codec, submit_encode
+from services.image_utils import ImageBuffer
+from services.metrics import ENCODED_BYTES
+
+def _image():
+    pixels = np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    return ImageBuffer(pixels)
+
+def test_png_is_lossless_at_every_level():
+    image = _image()
+    for level in (0, 1, 9):
+        decoded = np.asarray(Image.open(io.BytesIO(encode_image(image, "png", compress_level=level))))
+        np.testing.assert_array_equal(decoded, image.pixels)
+
+def test_unavailable_codecs_fall_back(monkeypatch):
+    monkeypatch.setattr(image_encoding, "available_codecs", lambda: ["png", "jpeg"])
+    assert resolve_codec("avif") == "jpeg"
+    assert resolve_codec("png") == "png"
+
+def test_submit_encode_returns_base64_and_records_size():
+    image = _image()
+
+    async def encode_all():
+        return await asyncio.gather(*(submit_encode(image, "jpeg", quality=80) for _ in range(3)))
+
+    count_before = ENCODED_BYTES.series.get("jpeg", (None, (0.0, 0)))[1][1]
+    encoded = asyncio.run(encode_all())
+    with Image.open(io.BytesIO(base64.b64decode(encoded[0]))) as decoded:
+        assert decoded.format == "JPEG" and decoded.size == (64, 48)
+    assert len(set(encoded)) == 1
+    assert ENCODED_BYTES.series["jpeg"][1][1] == count_before + 3
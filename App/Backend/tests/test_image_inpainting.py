@@ -0,0 +1,42 @@
+"""tests/test_image_inpainting.py"""
+
+# Imports
+import sys
+import os
+import pytest
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("cv2")
+
+#pylint: disable=wrong-import-position
+from services.image_inpainting import (CROP_MULTIPLE, CROP_PADDING, MIN_DIFFUSION_AREA, SDXL_NATIVE_AREA,
+                                       get_diffusion_size, get_inpaint_window, is_crop_worthwhile)
+
+IMAGE_SIZE = (1600, 896)
+
+def test_window_is_padded_and_snapped_to_multiples():
+    window = get_inpaint_window((700, 400, 900, 500), IMAGE_SIZE)
+    assert window == (512, 192, 1088, 704)
+    assert all(coordinate % CROP_MULTIPLE == 0 for coordinate in window)
+    assert window[0] <= 700 - CROP_PADDING and window[2] >= 900 + CROP_PADDING
+
+def test_window_is_clamped_at_frame_edges():
+    assert get_inpaint_window((10, 20, 200, 150), IMAGE_SIZE)[:2] == (0, 0)
+    assert get_inpaint_window((1450, 750, 1590, 890), IMAGE_SIZE)[2:] == IMAGE_SIZE
+
+@pytest.mark.parametrize("width, height", [(256, 192), (640, 512), (1088, 704), (1600, 896), (3000, 2000)])
+def test_diffusion_size_lands_in_the_area_band(width, height):
+    diffusion_width, diffusion_height = get_diffusion_size(width, height)
+    assert diffusion_width % CROP_MULTIPLE == 0 and diffusion_height % CROP_MULTIPLE == 0
+    # Snapping to 64 may move the area slightly past the band edges
+    area = diffusion_width * diffusion_height
+    assert 0.9 * MIN_DIFFUSION_AREA <= area <= 1.1 * SDXL_NATIVE_AREA
+    assert abs(diffusion_width / diffusion_height - width / height) < 0.1
+
+def test_large_windows_are_not_cropped():
+    """Bboxes of 50-90% of the frame, as generate() draws them, pad to almost the whole frame."""
+    large_window = get_inpaint_window((200, 100, 1400, 800), IMAGE_SIZE)
+    assert not is_crop_worthwhile(large_window, IMAGE_SIZE)
+    assert is_crop_worthwhile(get_inpaint_window((700, 400, 900, 500), IMAGE_SIZE), IMAGE_SIZE)
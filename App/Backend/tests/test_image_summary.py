@@ -0,0 +1,65 @@
+"""tests/test_image_summary.py"""
+
+# Imports
+import sys
+import os
+import pytest
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("transformers")
+
+#pylint: disable=wrong-import-position
+from services.image_summary import ObjectListGrammar
+
+def test_parse_complete_list():
+    """Both quote styles are parsed into object names."""
+    assert ObjectListGrammar.parse("['car', 'traffic cone', \"panda\"]") == ["car", "traffic cone", "panda"]
+
+def test_parse_truncated_list():
+    """Items cut off by the token budget are dropped, completed ones are kept."""
+    assert ObjectListGrammar.parse("['car', 'traffic co") == ["car"]
+
+def test_grammar_rejects_free_text():
+    """Anything but a list of strings breaks the grammar."""
+    assert not ObjectListGrammar().feed("There is a car")
+    assert not ObjectListGrammar().feed("['car'] and more")
+
+def test_grammar_limits_items():
+    """A further item is rejected once the item limit is reached."""
+    grammar = ObjectListGrammar(max_items=1)
+    assert grammar.feed("['car'")
+    assert not grammar.copy().feed(", 'tree'")
+    assert grammar.feed("]") and grammar.done
+
+def test_token_index_is_cached_per_tokenizer_and_device():
+    """The vocabulary is decoded once, name ids are built on the generation device."""
+    torch = pytest.importorskip("torch")
+    from services.image_summary import get_object_list_token_index  #pylint: disable=import-outside-toplevel
+    from benchmarks.fake_models import FAKE_OBJECTS, FakeTokenizer  #pylint: disable=import-outside-toplevel
+
+    tokenizer = FakeTokenizer()
+    index = get_object_list_token_index(tokenizer, torch.device("cpu"))
+    assert get_object_list_token_index(tokenizer, "cpu") is index
+    assert index.name_ids.device == torch.device("cpu")
+    names = {index.text(i) for i in index.name_ids.tolist()}
+    assert set(FAKE_OBJECTS) <= names and not names & {"[", "]", "'", ", "}
+
+def test_logits_processor_allows_names_inside_a_string():
+    """After "['" only object name tokens (and closing the string) keep the grammar valid."""
+    torch = pytest.importorskip("torch")
+    #pylint: disable=import-outside-toplevel
+    from services.image_summary import ObjectListLogitsProcessor, get_object_list_token_index
+    from benchmarks.fake_models import FakeTokenizer
+
+    tokenizer = FakeTokenizer()
+    processor = ObjectListLogitsProcessor(get_object_list_token_index(tokenizer, "cpu"), [tokenizer.eos_token_id])
+    prompt = torch.zeros((1, 3), dtype=torch.long)
+    processor(prompt, torch.zeros((1, tokenizer.vocab_size)))
+
+    input_ids = torch.cat([prompt, torch.tensor([tokenizer.encode("['")])], dim=1)
+    scores = processor(input_ids, torch.zeros((1, tokenizer.vocab_size)))[0]
+    allowed = {tokenizer.vocab[i] for i in torch.isfinite(scores).nonzero().flatten().tolist()}
+    assert {"traffic cone", "panda"} <= allowed
+    assert not allowed & {"[", "]", ", "}
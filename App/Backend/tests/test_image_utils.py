@@ -0,0 +1,59 @@
+"""tests/test_image_utils.py"""
+
+# Imports
+import sys
+import os
+import io
+import base64
+import pytest
+import numpy as np
+from PIL import Image
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("cv2")
+
+#pylint: disable=wrong-import-position
+from services.image_utils import ImageBuffer
+from services.metrics import start_trace, request_copies
+
+def _png_base64(width, height):
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(pixels).save(buffered, format="PNG")
+    return pixels, "data:image/png;base64," + base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+def test_decode_copies_once_and_views_are_free():
+    pixels, data = _png_base64(64, 32)
+    start_trace()
+
+    image = ImageBuffer.from_base64(data, size=(64, 32))
+    np.testing.assert_array_equal(image.pixels, pixels)
+    assert request_copies() == (1, pixels.nbytes)
+
+    crop = image.crop(8, 4, 24, 20)
+    assert crop.size == (16, 16)
+    assert np.shares_memory(crop.pixels, image.pixels)
+    assert image.contiguous("RGB") is image.pixels
+    np.testing.assert_array_equal(image.view("BGR"), pixels[:, :, ::-1])
+    assert request_copies()[0] == 1
+
+def test_encoding_the_other_layout_copies_once():
+    pixels, data = _png_base64(32, 32)
+    start_trace()
+    image = ImageBuffer.from_base64(data)
+
+    decoded = np.array(Image.open(io.BytesIO(image.encode(".png"))))
+    np.testing.assert_array_equal(decoded, pixels)
+    assert request_copies()[0] == 2
+
+    # A BGR buffer (e.g. the Visualizer canvas) is encoded without a conversion
+    ImageBuffer(np.ascontiguousarray(pixels[:, :, ::-1]), layout="BGR").encode(".jpeg")
+    assert request_copies()[0] == 2
+
+def test_rejects_other_arrays():
+    with pytest.raises(ValueError):
+        ImageBuffer(np.zeros((4, 4), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        ImageBuffer(np.zeros((4, 4, 3), dtype=np.uint8), layout="RGBA")
@@ -0,0 +1,25 @@
+"""tests/test_import_time.py"""
+
+# Imports
+import sys
+import os
+import pytest
+
+# Add the parent directory (App/Backend) to sys.path to make `benchmarks` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("fastapi")
+pytest.importorskip("word2number")
+
+#pylint: disable=wrong-import-position
+from benchmarks.import_time import IMPORT_BUDGET_SECONDS, measure_import
+
+def test_import_main_skips_heavy_libraries():
+    """The ML libraries are only imported by models.registry when the models are loaded."""
+    probe, _ = measure_import()
+    assert probe["heavy_modules"] == []
+
+def test_import_main_within_budget():
+    # Best of three fresh interpreters, so a cold file cache does not fail the test
+    seconds = min(measure_import()[0]["seconds"] for _ in range(3))
+    assert seconds <= IMPORT_BUDGET_SECONDS, f"import main took {seconds:.2f}s, budget {IMPORT_BUDGET_SECONDS}s"
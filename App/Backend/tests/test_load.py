@@ -0,0 +1,28 @@
+"""tests/test_load.py"""
+
+# Imports
+import sys
+import os
+import pytest
+
+# Add the parent directory (App/Backend) to sys.path to make `main` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# The fake models replace detectron2, diffusers and ultralytics
+for module in ("torch", "transformers", "spacy", "uvicorn", "httpx"):
+    pytest.importorskip(module)
+
+#pylint: disable=wrong-import-position
+from benchmarks.load import run_load_test
+
+def test_load_with_fake_models():
+    """Both endpoints answer every request under concurrency and the lock waits are recorded."""
+    report = run_load_test(concurrency_levels=(2,), num_requests=2, detect_latency=0.01, caption_latency=0.01,
+                           street_latency=0.01, inpaint_step_latency=0.0)
+
+    phase = report["phases"][0]
+    for endpoint in ("detect", "generate"):
+        assert phase["endpoints"][endpoint]["requests"] == 4
+        assert phase["endpoints"][endpoint]["errors"] == 0
+        assert phase["endpoints"][endpoint]["queueing_delay"]["p50_ms"] is not None
+    assert report["model_calls"]["detector"] == 4
@@ -0,0 +1,37 @@
+"""tests/test_metrics.py"""
+
+# Imports
+import sys
+import os
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+#pylint: disable=wrong-import-position
+from services.metrics import Histogram, span, start_trace, server_timing
+
+def test_histogram_buckets_are_cumulative():
+    """Every observation is counted in its own bucket and all larger ones."""
+    histogram = Histogram("test_seconds", "Test.", "stage", buckets=(0.1, 1.0))
+    histogram.observe("detect", 0.05)
+    histogram.observe("detect", 0.5)
+    histogram.observe("detect", 5.0)
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="detect",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="detect",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="detect",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="detect"} 3' in lines
+
+def test_spans_are_collected_into_the_request_trace():
+    """Repeated stages of one request are summed in the Server-Timing header."""
+    trace = start_trace()
+    for _ in range(2):
+        with span("crop_caption"):
+            pass
+    with span("encode"):
+        pass
+
+    assert [stage for stage, _ in trace] == ["crop_caption", "crop_caption", "encode"]
+    assert server_timing(trace).startswith("crop_caption;dur=")
+    assert ", encode;dur=" in server_timing(trace)
@@ -0,0 +1,86 @@
+"""tests/test_model_host.py"""
+
+# Imports
+import sys
+import os
+import subprocess
+import pytest
+import numpy as np
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+if sys.platform == "win32":
+    pytest.skip("The tests use a unix socket", allow_module_level=True)
+
+#pylint: disable=wrong-import-position
+from models.settings import DEFAULT_MODEL_HOST_AUTHKEY
+from services.model_host import (ModelHost, ModelHostClient, ModelHostError, SHARED_MEMORY_MIN_BYTES,
+                                wait_for_model_host)
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+AUTHKEY = b"test"
+
+# The host runs in its own process like in production, so shared memory crosses a process boundary
+HOST_SCRIPT = (
+    "import sys\n"
+    "from services.model_host import ModelHost\n"
+    "from tests.test_model_host import AUTHKEY, EchoJobs\n"
+    "ModelHost(EchoJobs(), sys.argv[1], AUTHKEY).serve_forever()\n"
+)
+
+class EchoJobs:
+    """Jobs without models, enough to exercise the transport."""
+
+    def ping(self):
+        return True
+
+    def invert(self, image):
+        return {"image": 255 - image, "shape": image.shape}
+
+    def fail(self):
+        raise ValueError("boom")
+
+    def _private(self):
+        return "secret"
+
+@pytest.fixture(name="client")
+def fixture_client(tmp_path):
+    address = str(tmp_path / "model_host.sock")
+    host = subprocess.Popen([sys.executable, "-c", HOST_SCRIPT, address], cwd=BACKEND_DIR)
+    client = ModelHostClient(address, AUTHKEY)
+    try:
+        wait_for_model_host(client, host, timeout=30.0, interval=0.05)
+        yield client
+    finally:
+        host.terminate()
+        host.wait()
+
+@pytest.mark.parametrize("size", [8, 1024])
+def test_arrays_round_trip(client, size):
+    """Small arrays are pickled with the message, large ones go through shared memory both ways."""
+    image = np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    assert (image.nbytes >= SHARED_MEMORY_MIN_BYTES) == (size == 1024)
+
+    result = client.call("invert", image)
+    assert result["shape"] == image.shape
+    np.testing.assert_array_equal(result["image"], 255 - image)
+
+def test_job_errors_reach_the_worker(client):
+    with pytest.raises(ModelHostError, match="ValueError: boom"):
+        client.call("fail")
+    # The connection is still usable
+    assert client.call("ping") is True
+
+def test_unknown_and_private_jobs_are_rejected(client):
+    for job in ("missing", "_private"):
+        with pytest.raises(ModelHostError, match="Unknown job"):
+            client.call(job)
+
+def test_tcp_address_needs_its_own_key():
+    """The default key is public, a TCP host or client using it is refused."""
+    with pytest.raises(ValueError):
+        ModelHost(EchoJobs(), "127.0.0.1:0", DEFAULT_MODEL_HOST_AUTHKEY.encode())
+    with pytest.raises(ValueError):
+        ModelHostClient("127.0.0.1:5000", DEFAULT_MODEL_HOST_AUTHKEY.encode())
+    ModelHostClient("127.0.0.1:5000", b"0123456789abcdef")
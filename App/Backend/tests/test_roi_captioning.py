@@ -0,0 +1,76 @@
+"""tests/test_roi_captioning.py"""
+
+# Imports
+import sys
+import os
+import pytest
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+#pylint: disable=wrong-import-position
+from services.roi_captioning import (BACKGROUND_LABEL, RoiVocabularyHead, build_vocabulary, caption_label,
+                                     drop_background_boxes, fit_from_samples)
+from benchmarks.fake_models import FakeInstances
+
+VOCABULARY = [BACKGROUND_LABEL, "panda", "traffic cone"]
+
+def _outputs(count: int) -> dict:
+    boxes = torch.arange(count * 4, dtype=torch.float32).reshape(count, 4)
+    return {"instances": FakeInstances(boxes, torch.linspace(0.5, 0.9, count), torch.zeros(count, dtype=torch.long))}
+
+def _clustered_features(samples_per_label: int = 20, dim: int = 16):
+    """Linearly separable features, one cluster per vocabulary label."""
+    generator = torch.Generator().manual_seed(0)
+    centers = torch.eye(dim)[:len(VOCABULARY)] * 5
+    features = torch.cat([center + 0.1 * torch.randn(samples_per_label, dim, generator=generator)
+                          for center in centers])
+    labels = [label for label in VOCABULARY for _ in range(samples_per_label)]
+    return features, labels, centers
+
+def test_only_confident_background_boxes_are_dropped():
+    roi_labels = [(BACKGROUND_LABEL, 0.95), ("panda", 0.99), (BACKGROUND_LABEL, 0.5)]
+    outputs, kept_labels, filtered = drop_background_boxes(_outputs(3), roi_labels, threshold=0.9)
+    assert filtered == 1
+    assert kept_labels == roi_labels[1:]
+    assert outputs["instances"].pred_boxes.tensor[:, 0].tolist() == [4.0, 8.0]
+
+def test_nothing_dropped_without_background():
+    roi_labels = [("panda", 0.99), ("traffic cone", 0.2)]
+    outputs, kept_labels, filtered = drop_background_boxes(_outputs(2), roi_labels, threshold=0.9)
+    assert filtered == 0 and kept_labels == roi_labels
+    assert len(outputs["instances"].scores) == 2
+
+def test_fit_classifies_training_clusters():
+    features, _, centers = _clustered_features()
+    head = RoiVocabularyHead.fit(features, [label for label in VOCABULARY for _ in range(20)], VOCABULARY)
+    labels = head.classify(centers)
+    assert [label for label, _ in labels] == VOCABULARY
+    assert all(confidence > 0.9 for _, confidence in labels)
+    assert head.classify(torch.zeros((0, 16))) == []
+
+def test_save_and_load_round_trip(tmp_path):
+    features, labels, centers = _clustered_features()
+    head = RoiVocabularyHead.fit(features, labels, VOCABULARY, epochs=50)
+    path = str(tmp_path / "head.pth")
+    head.save(path)
+
+    loaded = RoiVocabularyHead.load(path, torch.device("cpu"))
+    assert loaded.vocabulary == VOCABULARY and loaded.in_features == 16
+    assert loaded.classify(centers) == head.classify(centers)
+
+def test_vocabulary_keeps_frequent_labels_and_background():
+    labels = ["panda"] * 5 + ["traffic cone"] * 3 + ["unicycle"] * 2 + [BACKGROUND_LABEL]
+    assert build_vocabulary(labels, min_count=3) == [BACKGROUND_LABEL, "panda", "traffic cone"]
+    assert build_vocabulary(labels, max_labels=1, min_count=1) == [BACKGROUND_LABEL, "panda"]
+    assert caption_label([" Panda", "car"]) == "panda"
+    assert caption_label([]) == BACKGROUND_LABEL
+
+def test_fit_from_samples_leaves_out_rare_labels():
+    features, labels, centers = _clustered_features()
+    features = torch.cat([features, centers[1:2]])
+    head = fit_from_samples(features, labels + ["unicycle"], min_count=3, epochs=50)
+    assert head.vocabulary == [BACKGROUND_LABEL, "panda", "traffic cone"]
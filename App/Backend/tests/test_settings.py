@@ -0,0 +1,42 @@
+"""tests/test_settings.py"""
+
+# Imports
+import json
+import sys
+import os
+import pytest
+
+# Add the parent directory (App/Backend) to sys.path to make `models` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+#pylint: disable=wrong-import-position
+from models.settings import BACKEND_DIR, load_settings
+
+def test_defaults_are_resolved_against_the_backend_directory():
+    """Paths do not depend on the working directory."""
+    settings = load_settings(environ={})
+    assert settings.street_model == os.path.join(BACKEND_DIR, "models", "streetseg_256_auto.pt")
+    assert settings.failed_images_dir == os.path.join(BACKEND_DIR, "images", "failed_images")
+
+def test_environment_overrides_the_settings_file(tmp_path):
+    settings_file = tmp_path / "settings.json"
+    settings_file.write_text(json.dumps({"detectron_weights": "/weights/file.pth", "device": "cuda:1",
+                                         "detection_score_threshold": 0.5}))
+    settings = load_settings(environ={"WST_SETTINGS_FILE": str(settings_file), "WST_DEVICE": "cpu",
+                                      "WST_DETECTION_SCORE_THRESHOLD": "0.7"})
+    assert settings.detectron_weights == "/weights/file.pth"
+    assert settings.device == "cpu"
+    assert settings.detection_score_threshold == 0.7
+
+def test_unknown_settings_are_rejected(tmp_path):
+    settings_file = tmp_path / "settings.json"
+    settings_file.write_text(json.dumps({"detectron_weight": "typo.pth"}))
+    with pytest.raises(ValueError):
+        load_settings(environ={"WST_SETTINGS_FILE": str(settings_file)})
+
+def test_configurations_import_does_not_build_the_detectron_config():
+    """detectron2 is only imported once the config is requested."""
+    sys.modules.pop("models.configurations", None)
+    detectron2_loaded = "detectron2" in sys.modules
+    import models.configurations  #pylint: disable=import-outside-toplevel,unused-import
+    assert ("detectron2" in sys.modules) == detectron2_loaded
@@ -0,0 +1,54 @@
+"""tests/test_video_detection.py"""
+
+# Imports
+import sys
+import os
+import pytest
+import numpy as np
+
+# Add the parent directory (App/Backend) to sys.path to make `services` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("torch")
+cv2 = pytest.importorskip("cv2")
+
+#pylint: disable=wrong-import-position
+from services.video_detection import BoxTracker, FrameReader, SceneChangeDetector
+
+def test_tracker_keeps_ids_and_extrapolates_between_detections():
+    """A box moving 10px per frame keeps its id and is carried forward on frames without detections."""
+    tracker = BoxTracker()
+    for frame in range(0, 20, 2):
+        tracker.predict()
+        box = np.array([[100.0 + 10 * frame, 50.0, 150.0 + 10 * frame, 100.0]])
+        tracker.update(box, np.array([0.9]), np.array([0]))
+        tracker.predict()  # frame + 1, no detection
+
+    assert [track.track_id for track in tracker.tracks] == [0]
+    predicted = tracker.boxes()[0]
+    assert abs(predicted[0] - (100.0 + 10 * 19)) < 5.0
+
+def test_tracker_drops_tracks_without_detections():
+    tracker = BoxTracker(max_missed=1)
+    tracker.update(np.array([[0.0, 0.0, 10.0, 10.0]]), np.array([0.9]), np.array([0]))
+    for _ in range(2):
+        tracker.predict()
+        tracker.update(np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64))
+    assert not tracker.tracks
+
+def test_frame_reader_skips_frames_of_a_directory(tmp_path):
+    for i in range(5):
+        cv2.imwrite(str(tmp_path / f"frame_{i:03d}.png"), np.full((8, 8, 3), i * 40, dtype=np.uint8))
+
+    frames = list(FrameReader(str(tmp_path), frame_skip=1))
+    assert [index for index, _, _ in frames] == [0, 2, 4]
+    assert frames[1][2][0, 0, 0] == 80
+
+def test_scene_change_only_on_different_frames():
+    scene = SceneChangeDetector()
+    road = np.zeros((72, 128, 3), dtype=np.uint8)
+    road[36:] = (90, 90, 90)
+    road[:36] = (230, 160, 60)
+    assert scene.changed(road)
+    assert not scene.changed(road.copy())
+    assert scene.changed(np.full((72, 128, 3), (20, 180, 20), dtype=np.uint8))
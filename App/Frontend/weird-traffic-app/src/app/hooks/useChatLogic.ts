@@ -294,7 +294,7 @@ export function useChatLogic() {
       //  Setting result and extracting base64 images
       const result: GeneratedImages = await response.json();
       const imageUrls = result.images.map(
-        (img) => `data:image/png;base64,${img.imageBase64}`
+        (img) => `data:${img.mimeType ?? "image/png"};base64,${img.imageBase64}`
       );
 
       setMessages((prevMessages) =>
@@ -190,7 +190,7 @@ export const useGameStore = create<GameStore>()(
 
             const result: GeneratedImages = await response.json();
             const imageUrls = result.images.map(
-              (img) => `data:image/png;base64,${img.imageBase64}`
+              (img) => `data:${img.mimeType ?? "image/png"};base64,${img.imageBase64}`
             );
 
             get().updateMessage(loadingImageGridMessage.id, {
@@ -26,6 +26,7 @@ export interface DetectApiResponse {
 export interface GeneratedImage {
   prompt: string;
   imageBase64: string;
+  mimeType?: string; // Output codec of the backend, PNG when missing
 }
 
 // Response containing multiple generated images
@@ -0,0 +1,304 @@
+"""
+Pre-resized, sharded, memory-mappable training cache for Detectron2.
+
+Decoding full-size JPEGs every iteration only to crop and resize them to 640 dominates
+data loading. `prepare` decodes every image of a COCO split once, resizes it so its
+longest edge is `--size` (default 800 = 640 / 0.8, so the 0.8 relative crop never has to
+upsample) and writes the raw uint8 pixels into fixed-size shards. Training reads images
+as views into the memory-mapped shards instead of decoding files.
+
+Layout of a cache directory:
+    meta.json               file names, image ids, class names, scales, shard names
+    images.npy              int64 [N, 4]: shard, byte offset, height, width
+    ann_offsets.npy         int64 [N + 1], annotations of image i are rows ann_offsets[i]:ann_offsets[i+1]
+    boxes.npy               float32 [M, 4] XYXY_ABS in cached (resized) pixels
+    classes.npy             int32 [M] contiguous class ids
+    shard_00000.bin, ...    raw BGR pixels, image i is shard[offset:offset + h*w*3]
+
+    python cached_dataset.py prepare --json coco_train.json --images train --output cache/train
+    python cached_dataset.py benchmark --json coco_train.json --images train --cache cache/train
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import torch
+from pycocotools.coco import COCO
+from detectron2.config import get_cfg
+from detectron2 import model_zoo
+from detectron2.data import DatasetCatalog, MetadataCatalog, build_detection_train_loader, DatasetMapper
+from detectron2.data import detection_utils as utils
+from detectron2.data.datasets import register_coco_instances
+from detectron2.structures import BoxMode
+import detectron2.data.transforms as T
+
+DEFAULT_CACHE_SIZE = 800
+SHARD_BYTES = 1 << 30  # ~1 GB per shard
+
+# Augmentations detectron2 ignored when they were listed in cfg.AUGMENTATIONS
+DEFAULT_AUGMENTATIONS = {
+    "rotation": [-10, 10],      # degrees
+    "brightness": [0.8, 1.2],
+    "contrast": [0.8, 1.2],
+    "lighting": 0.7,            # PCA lighting noise scale
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pre-resized memory-mapped Detectron2 training cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    prepare = subparsers.add_parser('prepare', help='Write the cache of a COCO split')
+    prepare.add_argument('--json', type=str, required=True, help='COCO json of the split')
+    prepare.add_argument('--images', type=str, required=True, help='Image directory of the split')
+    prepare.add_argument('--output', type=str, required=True, help='Cache directory')
+    prepare.add_argument('--size', type=int, default=DEFAULT_CACHE_SIZE, help='Longest edge of the cached images')
+    prepare.add_argument('--workers', type=int, default=8, help='Decoding threads')
+
+    benchmark = subparsers.add_parser('benchmark', help='Data loading time per iteration, JPEG vs cache')
+    benchmark.add_argument('--json', type=str, required=True)
+    benchmark.add_argument('--images', type=str, required=True)
+    benchmark.add_argument('--cache', type=str, required=True)
+    benchmark.add_argument('--iterations', type=int, default=200)
+    benchmark.add_argument('--warmup', type=int, default=20)
+    benchmark.add_argument('--batch_size', type=int, default=4)
+    benchmark.add_argument('--workers', type=int, default=4)
+    return parser.parse_args()
+
+
+### Preparation ###
+
+def load_resized(image_path, size):
+    """Decodes one image and resizes its longest edge to `size` (never upscaling)."""
+    image = cv2.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(image_path)
+    scale = min(1.0, size / max(image.shape[:2]))
+    if scale < 1.0:
+        image = cv2.resize(image, (round(image.shape[1] * scale), round(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(image), scale
+
+
+def prepare_cache(json_file, image_root, output_dir, size=DEFAULT_CACHE_SIZE, num_workers=8):
+    """Writes the cache of one COCO split, see the module docstring for the layout."""
+    coco = COCO(json_file)
+    category_ids = sorted(coco.getCatIds())
+    contiguous = {cat_id: i for i, cat_id in enumerate(category_ids)}
+    images = coco.loadImgs(sorted(coco.getImgIds()))
+
+    os.makedirs(output_dir, exist_ok=True)
+    meta_path = os.path.join(output_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    index = np.zeros((len(images), 4), dtype=np.int64)
+    ann_offsets = np.zeros(len(images) + 1, dtype=np.int64)
+    scales, boxes, classes, shard_names = [], [], [], []
+    shard_file, shard_offset = None, SHARD_BYTES
+
+    def decode_chunks(pool, chunk_size):
+        # Executor.map submits everything at once, chunks bound the decoded images held in memory
+        for start in range(0, len(images), chunk_size):
+            yield from pool.map(lambda info: load_resized(os.path.join(image_root, info["file_name"]), size),
+                                images[start:start + chunk_size])
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(num_workers) as pool:
+        for i, (info, (image, scale)) in enumerate(zip(images, decode_chunks(pool, num_workers * 4))):
+            if shard_offset + image.nbytes > SHARD_BYTES and shard_offset > 0:
+                if shard_file is not None:
+                    shard_file.close()
+                shard_names.append(f"shard_{len(shard_names):05d}.bin")
+                shard_file = open(os.path.join(output_dir, shard_names[-1]), 'wb')
+                shard_offset = 0
+
+            shard_file.write(image.tobytes())
+            index[i] = (len(shard_names) - 1, shard_offset, image.shape[0], image.shape[1])
+            shard_offset += image.nbytes
+            scales.append(scale)
+
+            for ann in coco.loadAnns(coco.getAnnIds(imgIds=info["id"], iscrowd=False)):
+                x, y, w, h = ann["bbox"]
+                boxes.append([x * scale, y * scale, (x + w) * scale, (y + h) * scale])
+                classes.append(contiguous[ann["category_id"]])
+            ann_offsets[i + 1] = len(classes)
+    if shard_file is not None:
+        shard_file.close()
+
+    np.save(os.path.join(output_dir, "images.npy"), index)
+    np.save(os.path.join(output_dir, "ann_offsets.npy"), ann_offsets)
+    np.save(os.path.join(output_dir, "boxes.npy"), np.asarray(boxes, dtype=np.float32).reshape(-1, 4))
+    np.save(os.path.join(output_dir, "classes.npy"), np.asarray(classes, dtype=np.int32))
+
+    # Written last, an interrupted preparation is never picked up as valid
+    with open(meta_path, 'w') as f:
+        json.dump({
+            "size": size,
+            "shards": shard_names,
+            "file_names": [os.path.join(image_root, info["file_name"]) for info in images],
+            "image_ids": [info["id"] for info in images],
+            "scales": scales,
+            "thing_classes": [coco.loadCats(cat_id)[0]["name"] for cat_id in category_ids],
+        }, f)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Cached {len(images)} images ({sum(os.path.getsize(os.path.join(output_dir, s)) for s in shard_names) / 1e9:.2f} GB, "
+          f"{len(shard_names)} shards) in {elapsed:.1f}s")
+
+
+### Training ###
+
+def load_cached_dicts(cache_dir):
+    """Detectron2 dataset dicts of a cache, annotations come from the columnar arrays."""
+    with open(os.path.join(cache_dir, "meta.json"), 'r') as f:
+        meta = json.load(f)
+    index = np.load(os.path.join(cache_dir, "images.npy"))
+    ann_offsets = np.load(os.path.join(cache_dir, "ann_offsets.npy"))
+    boxes = np.load(os.path.join(cache_dir, "boxes.npy"))
+    classes = np.load(os.path.join(cache_dir, "classes.npy"))
+
+    dataset_dicts = []
+    for i, (_, _, height, width) in enumerate(index.tolist()):
+        start, end = ann_offsets[i], ann_offsets[i + 1]
+        dataset_dicts.append({
+            "cache_index": i,
+            "file_name": meta["file_names"][i],
+            "image_id": meta["image_ids"][i],
+            "height": height,
+            "width": width,
+            "annotations": [{"bbox": box, "bbox_mode": BoxMode.XYXY_ABS, "category_id": int(cls), "iscrowd": 0}
+                            for box, cls in zip(boxes[start:end].tolist(), classes[start:end])],
+        })
+    return dataset_dicts
+
+
+def register_cached_dataset(name, cache_dir, max_images=None):
+    """Registers a cache as a training dataset, `max_images` keeps the first images only (smoke runs)."""
+    with open(os.path.join(cache_dir, "meta.json"), 'r') as f:
+        meta = json.load(f)
+    DatasetCatalog.register(name, lambda: load_cached_dicts(cache_dir)[:max_images])
+    MetadataCatalog.get(name).set(thing_classes=meta["thing_classes"], cache_dir=cache_dir)
+
+
+def build_train_augmentations(cfg, augmentations=None):
+    """The crop/resize/flip of the default mapper plus rotation, brightness, contrast and lighting."""
+    augmentations = {**DEFAULT_AUGMENTATIONS, **(augmentations or {})}
+    augs = []
+    if cfg.INPUT.CROP.ENABLED:
+        augs.append(T.RandomCrop(cfg.INPUT.CROP.TYPE, cfg.INPUT.CROP.SIZE))
+    if augmentations.get("rotation"):
+        augs.append(T.RandomRotation(augmentations["rotation"], expand=False))
+    augs.append(T.ResizeShortestEdge(cfg.INPUT.MIN_SIZE_TRAIN, cfg.INPUT.MAX_SIZE_TRAIN, cfg.INPUT.MIN_SIZE_TRAIN_SAMPLING))
+    if cfg.INPUT.RANDOM_FLIP != "none":
+        augs.append(T.RandomFlip(horizontal=cfg.INPUT.RANDOM_FLIP == "horizontal",
+                                 vertical=cfg.INPUT.RANDOM_FLIP == "vertical"))
+    if augmentations.get("brightness"):
+        augs.append(T.RandomBrightness(*augmentations["brightness"]))
+    if augmentations.get("contrast"):
+        augs.append(T.RandomContrast(*augmentations["contrast"]))
+    if augmentations.get("lighting"):
+        augs.append(T.RandomLighting(augmentations["lighting"]))
+    return augs
+
+
+class CachedDatasetMapper:
+    """
+    DatasetMapper for cached datasets. Images are read as views into the memory-mapped
+    shards; the shards are opened lazily so every data loader worker maps them itself.
+    """
+
+    def __init__(self, cfg, cache_dir, is_train=True, augmentations=None):
+        with open(os.path.join(cache_dir, "meta.json"), 'r') as f:
+            self.shard_paths = [os.path.join(cache_dir, shard) for shard in json.load(f)["shards"]]
+        self.index = np.load(os.path.join(cache_dir, "images.npy"))
+        self.is_train = is_train
+        self.image_format = cfg.INPUT.FORMAT
+        self.augmentations = T.AugmentationList(
+            build_train_augmentations(cfg, augmentations) if is_train
+            else [T.ResizeShortestEdge(cfg.INPUT.MIN_SIZE_TEST, cfg.INPUT.MAX_SIZE_TEST)]
+        )
+        self._shards = {}
+
+    def read_image(self, cache_index):
+        shard, offset, height, width = self.index[cache_index].tolist()
+        if shard not in self._shards:
+            self._shards[shard] = np.memmap(self.shard_paths[shard], dtype=np.uint8, mode='r')
+        image = self._shards[shard][offset:offset + height * width * 3].reshape(height, width, 3)
+        return image[:, :, ::-1] if self.image_format == "RGB" else image
+
+    def __call__(self, dataset_dict):
+        dataset_dict = dict(dataset_dict)
+        image = self.read_image(dataset_dict["cache_index"])
+
+        aug_input = T.AugInput(image)
+        transforms = self.augmentations(aug_input)
+        image = aug_input.image
+        image_shape = image.shape[:2]
+        dataset_dict["image"] = torch.as_tensor(np.ascontiguousarray(image.transpose(2, 0, 1)))
+
+        if not self.is_train:
+            dataset_dict.pop("annotations", None)
+            return dataset_dict
+
+        annotations = [utils.transform_instance_annotations(obj, transforms, image_shape)
+                       for obj in dataset_dict.pop("annotations") if obj.get("iscrowd", 0) == 0]
+        instances = utils.annotations_to_instances(annotations, image_shape)
+        dataset_dict["instances"] = utils.filter_empty_instances(instances)
+        return dataset_dict
+
+
+### Benchmark ###
+
+def time_loader(loader, iterations, warmup):
+    """Seconds spent waiting for each batch of an (infinite) training loader."""
+    batches = iter(loader)
+    for _ in range(warmup):
+        next(batches)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        next(batches)
+        timings.append(time.perf_counter() - start)
+    return np.asarray(timings)
+
+
+def benchmark(args):
+    cfg = get_cfg()
+    cfg.merge_from_file(model_zoo.get_config_file("COCO-Detection/faster_rcnn_X_101_32x8d_FPN_3x.yaml"))
+    cfg.SOLVER.IMS_PER_BATCH = args.batch_size
+    cfg.DATALOADER.NUM_WORKERS = args.workers
+    cfg.INPUT.CROP.ENABLED = True
+    cfg.INPUT.CROP.TYPE = "relative_range"
+    cfg.INPUT.CROP.SIZE = [0.8, 0.8]
+    cfg.INPUT.MIN_SIZE_TRAIN = (640,)
+    cfg.INPUT.MAX_SIZE_TRAIN = 640
+
+    register_coco_instances("benchmark_jpeg", {}, args.json, args.images)
+    register_cached_dataset("benchmark_cached", args.cache)
+
+    loaders = {
+        "jpeg": build_detection_train_loader(cfg.clone(), dataset=DatasetCatalog.get("benchmark_jpeg"),
+                                             mapper=DatasetMapper(cfg, is_train=True, augmentations=build_train_augmentations(cfg))),
+        "cached": build_detection_train_loader(cfg.clone(), dataset=DatasetCatalog.get("benchmark_cached"),
+                                               mapper=CachedDatasetMapper(cfg, args.cache, is_train=True)),
+    }
+    results = {}
+    for name, loader in loaders.items():
+        timings = time_loader(loader, args.iterations, args.warmup) * 1000
+        results[name] = {"mean_ms": float(timings.mean()), "p50_ms": float(np.percentile(timings, 50)),
+                         "p90_ms": float(np.percentile(timings, 90)),
+                         "images_per_second": float(args.batch_size * 1000 / timings.mean())}
+        print(f"{name}: {results[name]}")
+    print(f"Speedup: {results['jpeg']['mean_ms'] / results['cached']['mean_ms']:.2f}x data time per iteration")
+    return results
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'prepare':
+        prepare_cache(args.json, args.images, args.output, args.size, args.workers)
+    else:
+        benchmark(args)
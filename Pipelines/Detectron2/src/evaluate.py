@@ -0,0 +1,258 @@
+from detectron2.utils.logger import setup_logger
+setup_logger()
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+from pycocotools.coco import COCO
+from pycocotools.cocoeval import COCOeval
+from detectron2 import model_zoo
+from detectron2.config import get_cfg
+from detectron2.modeling import build_model
+from detectron2.checkpoint import DetectionCheckpointer
+import detectron2.data.transforms as T
+
+# Add the Pipelines directory to sys.path to make the shared `common` package importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.detection_metrics import (DEFAULT_SCORE_THRESHOLDS, class_pr_curves, confusion_matrix,
+                                      mean_average_precision, write_metrics)
+
+CACHE_SCORE_THRESHOLD = 0.05  # Everything above is cached, metrics pick their own thresholds later
+COCO_STAT_NAMES = ["AP", "AP50", "AP75", "APs", "APm", "APl", "AR1", "AR10", "AR100", "ARs", "ARm", "ARl"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Evaluate a Detectron2 model on a COCO dataset with cached predictions')
+    parser.add_argument('--weights', type=str, required=True, help='Path to the trained model weights')
+    parser.add_argument('--images_dir', type=str, required=True, help='Directory containing the test images')
+    parser.add_argument('--annotations', type=str, required=True, help='COCO json of the test set')
+    parser.add_argument('--output_dir', type=str, default='results', help='Output directory for the cache, metrics and plots')
+    parser.add_argument('--config', type=str, default='COCO-Detection/faster_rcnn_X_101_32x8d_FPN_3x.yaml', help='Model zoo config')
+    parser.add_argument('--batch_size', type=int, default=4, help='Images per model call')
+    parser.add_argument('--workers', type=int, default=4, help='Data loader workers decoding and resizing images')
+    parser.add_argument('--conf', type=float, default=0.85, help='Score threshold of the confusion matrix')
+    parser.add_argument('--iou', type=float, default=0.5, help='IoU threshold of the confusion matrix and PR curves')
+    parser.add_argument('--rerun', action='store_true', help='Ignore cached predictions and run the model again')
+    return parser.parse_args()
+
+
+class CocoImageDataset(Dataset):
+    """Decodes and resizes test images exactly like DefaultPredictor, inside the loader workers."""
+
+    def __init__(self, images, images_dir, cfg):
+        self.images = images
+        self.images_dir = images_dir
+        self.input_format = cfg.INPUT.FORMAT
+        self.aug = T.ResizeShortestEdge([cfg.INPUT.MIN_SIZE_TEST, cfg.INPUT.MIN_SIZE_TEST], cfg.INPUT.MAX_SIZE_TEST)
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, i):
+        info = self.images[i]
+        path = os.path.join(self.images_dir, info["file_name"])
+        image = cv2.imread(path)
+        if image is None:
+            # Raised here, a None would fail inside the DataLoader worker without the path
+            raise FileNotFoundError(f"Image missing or unreadable: {path}")
+        if self.input_format == "RGB":
+            image = image[:, :, ::-1]
+        height, width = image.shape[:2]
+        resized = self.aug.get_transform(image).apply_image(image)
+        return {
+            "image": torch.as_tensor(resized.astype("float32").transpose(2, 0, 1)),
+            "height": height,
+            "width": width,
+            "image_id": info["id"],
+        }
+
+
+def build_cfg(args, num_classes):
+    cfg = get_cfg()
+    cfg.merge_from_file(model_zoo.get_config_file(args.config))
+    cfg.MODEL.DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+    cfg.MODEL.ROI_HEADS.NUM_CLASSES = num_classes
+    cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = CACHE_SCORE_THRESHOLD
+    cfg.MODEL.WEIGHTS = args.weights
+    return cfg
+
+
+def cache_key(args):
+    """Identifies the model and dataset a prediction cache was produced from."""
+    return json.dumps({
+        "weights": os.path.abspath(args.weights),
+        "weights_mtime": os.stat(args.weights).st_mtime_ns,
+        "annotations": os.path.abspath(args.annotations),
+        "annotations_mtime": os.stat(args.annotations).st_mtime_ns,
+        "config": args.config,
+    }, sort_keys=True)
+
+
+def run_inference(cfg, coco, images_dir, batch_size, num_workers):
+    """
+    Runs the model once over the dataset in batches, with decoding prefetched by the data loader.
+
+    Returns:
+        dict of flat arrays: image_ids, offsets (predictions of image i are offsets[i]:offsets[i+1]),
+        boxes (xyxy), scores and classes (contiguous ids)
+    """
+    model = build_model(cfg)
+    model.eval()
+    DetectionCheckpointer(model).load(cfg.MODEL.WEIGHTS)
+
+    images = coco.loadImgs(sorted(coco.getImgIds()))
+    loader = DataLoader(CocoImageDataset(images, images_dir, cfg), batch_size=batch_size, num_workers=num_workers,
+                        collate_fn=list, pin_memory=cfg.MODEL.DEVICE == "cuda",
+                        prefetch_factor=2 if num_workers else None)
+
+    image_ids, counts, boxes, scores, classes = [], [], [], [], []
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        for batch in loader:
+            for inputs, outputs in zip(batch, model(batch)):
+                instances = outputs["instances"].to("cpu")
+                image_ids.append(inputs["image_id"])
+                counts.append(len(instances))
+                boxes.append(instances.pred_boxes.tensor.numpy())
+                scores.append(instances.scores.numpy())
+                classes.append(instances.pred_classes.numpy())
+    elapsed = time.perf_counter() - start_time
+    print(f"Inference on {len(image_ids)} images took {elapsed:.1f}s ({len(image_ids) / elapsed:.1f} images/sec)")
+
+    return {
+        "image_ids": np.asarray(image_ids, dtype=np.int64),
+        "offsets": np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        "boxes": np.concatenate(boxes).astype(np.float32) if boxes else np.zeros((0, 4), dtype=np.float32),
+        "scores": np.concatenate(scores).astype(np.float32) if scores else np.zeros(0, dtype=np.float32),
+        "classes": np.concatenate(classes).astype(np.int16) if classes else np.zeros(0, dtype=np.int16),
+    }
+
+
+def load_or_predict(args, coco, num_classes):
+    """Loads the prediction cache if it belongs to the same weights and dataset, otherwise runs the model."""
+    cache_path = os.path.join(args.output_dir, "predictions.npz")
+    key = cache_key(args)
+    if not args.rerun and os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            if str(cache["key"]) == key:
+                print(f"Using cached predictions from {cache_path}")
+                return {name: cache[name] for name in cache.files if name != "key"}
+        print("Cached predictions are outdated, running inference again")
+
+    predictions = run_inference(build_cfg(args, num_classes), coco, args.images_dir, args.batch_size, args.workers)
+    np.savez_compressed(cache_path, key=np.array(key), **predictions)
+    print(f"Cached predictions to {cache_path}")
+    return predictions
+
+
+def load_ground_truth(coco, image_ids, category_ids):
+    """Per image xyxy boxes and contiguous class ids, in the order of the cached image ids."""
+    contiguous = {cat_id: i for i, cat_id in enumerate(category_ids)}
+    gts = []
+    for image_id in image_ids:
+        annotations = [a for a in coco.loadAnns(coco.getAnnIds(imgIds=int(image_id))) if not a.get("iscrowd", 0)]
+        boxes = np.array([a["bbox"] for a in annotations], dtype=np.float32).reshape(-1, 4)
+        boxes[:, 2:] += boxes[:, :2]
+        gts.append((boxes, np.array([contiguous[a["category_id"]] for a in annotations], dtype=np.int64)))
+    return gts
+
+
+def split_predictions(predictions):
+    offsets = predictions["offsets"]
+    return [(predictions["boxes"][start:end], predictions["scores"][start:end],
+             predictions["classes"][start:end].astype(np.int64))
+            for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def coco_map(coco, predictions, category_ids):
+    """COCO bbox metrics of the cached predictions."""
+    results = []
+    for image_id, (boxes, scores, classes) in zip(predictions["image_ids"], split_predictions(predictions)):
+        for (x0, y0, x1, y1), score, cls in zip(boxes.tolist(), scores.tolist(), classes.tolist()):
+            results.append({"image_id": int(image_id), "category_id": category_ids[cls],
+                            "bbox": [x0, y0, x1 - x0, y1 - y0], "score": score})
+    if not results:
+        return {name: 0.0 for name in COCO_STAT_NAMES}
+
+    coco_eval = COCOeval(coco, coco.loadRes(results), "bbox")
+    coco_eval.evaluate()
+    coco_eval.accumulate()
+    coco_eval.summarize()
+    return {name: float(value) for name, value in zip(COCO_STAT_NAMES, coco_eval.stats)}
+
+
+def save_plots(matrix, class_names, curves, output_dir):
+    """Confusion matrix and PR curve figures, skipped if matplotlib is not installed."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib not installed, skipping plots")
+        return
+
+    labels = class_names + ["background"]
+    fig, ax = plt.subplots(figsize=(4 + len(labels), 3 + len(labels)))
+    ax.imshow(matrix, cmap="Blues")
+    ax.set_xticks(range(len(labels)), labels, rotation=45, ha="right")
+    ax.set_yticks(range(len(labels)), labels)
+    ax.set_xlabel("Predicted")
+    ax.set_ylabel("Ground truth")
+    for (row, col), value in np.ndenumerate(matrix):
+        ax.text(col, row, str(value), ha="center", va="center")
+    fig.savefig(os.path.join(output_dir, "confusion_matrix.png"), bbox_inches="tight", dpi=300)
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(6, 5))
+    for name, curve in curves.items():
+        ap = "no ground truth" if curve["ap"] is None else f"AP {curve['ap']:.3f}"
+        ax.plot(curve["recall"], curve["precision"], marker="o", label=f"{name} ({ap})")
+    ax.set_xlabel("Recall")
+    ax.set_ylabel("Precision")
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1.05)
+    ax.legend()
+    fig.savefig(os.path.join(output_dir, "pr_curve.png"), bbox_inches="tight", dpi=300)
+    plt.close(fig)
+
+
+def evaluate(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    coco = COCO(args.annotations)
+    category_ids = sorted(coco.getCatIds())
+    class_names = [coco.loadCats(cat_id)[0]["name"] for cat_id in category_ids]
+
+    predictions = load_or_predict(args, coco, len(category_ids))
+    gts = load_ground_truth(coco, predictions["image_ids"], category_ids)
+    preds = split_predictions(predictions)
+
+    matrix = confusion_matrix(gts, preds, len(category_ids), score_threshold=args.conf, iou_threshold=args.iou)
+    curves = class_pr_curves(gts, preds, class_names, args.iou, DEFAULT_SCORE_THRESHOLDS)
+
+    metrics = {
+        "coco": coco_map(coco, predictions, category_ids),
+        "confusion_matrix": {"labels": class_names + ["background"], "matrix": matrix.tolist(),
+                             "score_threshold": args.conf, "iou_threshold": args.iou},
+        "pr_curves": curves,
+        "mAP": mean_average_precision(curves),  # classes without ground truth are left out
+    }
+    metrics_path = os.path.join(args.output_dir, "metrics.json")
+    write_metrics(metrics_path, metrics)
+    save_plots(matrix, class_names, curves, args.output_dir)
+
+    for name, curve in curves.items():
+        if curve["ap"] is None:
+            print(f"{name}: no ground truth")
+            continue
+        best = int(np.argmax(curve["f1"]))
+        print(f"{name}: AP@{args.iou} {curve['ap']:.3f}, best F1 {curve['f1'][best]:.3f} at score {curve['thresholds'][best]}")
+    print(f"Metrics saved to: {metrics_path}")
+
+
+if __name__ == '__main__':
+    evaluate(parse_args())
@@ -1,12 +1,99 @@
 import os
+import sys
 import shutil
 import random
-from sklearn.model_selection import train_test_split
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-def split_yolo_dataset(images_dir, labels_dir, output_dir, train_ratio=0.7, val_ratio=0.2, test_ratio=0.1, random_seed=42):
+# Add the Pipelines directory to sys.path to make the shared `common` package importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from common.dataset_index import DatasetIndex, IMAGE_EXTENSIONS
+
+SPLIT_MODES = ('copy', 'hardlink', 'symlink', 'manifest')
+SPLITS = ('train', 'val', 'test')
+
+def pair_dataset(images_dir, labels_dir, use_index=False):
+    """
+    Pairs images with their label files in a single scan of each directory.
+
+    Returns:
+        list of (image file name, label file name, has_objects) sorted by image name,
+        has_objects is False for empty label files (background images)
+    """
+    if use_index:
+        index = DatasetIndex.open(images_dir, labels_dir)
+        return unique_stems([(index.image_files[i], f"{stem}.txt", index.num_annotations(i) > 0)
+                             for i, stem in enumerate(index.stems) if index.has_label[i]])
+
+    label_sizes = {}
+    with os.scandir(labels_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.txt'):
+                label_sizes[entry.name[:-4]] = entry.stat().st_size
+
+    pairs = []
+    missing = 0
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            if not (entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)):
+                continue
+            stem = os.path.splitext(entry.name)[0]
+            if stem in label_sizes:
+                pairs.append((entry.name, f"{stem}.txt", label_sizes[stem] > 0))
+            else:
+                missing += 1
+
+    if missing:
+        print(f"Warning: {missing} images without label files - skipping")
+    return unique_stems(pairs)
+
+def unique_stems(pairs):
+    """
+    Keeps one image per label file. Images sharing a stem (a.jpg, a.png) would be placed onto
+    the same label destination, so only the first by name is kept and the others are reported.
+    """
+    unique, duplicates = {}, []
+    for pair in sorted(pairs):
+        if pair[1] in unique:
+            duplicates.append(pair[0])
+        else:
+            unique[pair[1]] = pair
+    if duplicates:
+        print(f"Warning: {len(duplicates)} images share a stem with another image - skipping: "
+              f"{', '.join(duplicates[:10])}{' ...' if len(duplicates) > 10 else ''}")
+    return list(unique.values())
+
+def split_pairs(pairs, train_ratio, val_ratio, random_seed, stratify=False):
+    """Deterministic shuffle and split. With `stratify` every label-presence group is split with the same ratios."""
+    groups = [[p for p in pairs if p[2]], [p for p in pairs if not p[2]]] if stratify else [list(pairs)]
+
+    splits = {name: [] for name in SPLITS}
+    rng = random.Random(random_seed)
+    for group in groups:
+        rng.shuffle(group)
+        n_train = round(len(group) * train_ratio)
+        n_val = round(len(group) * val_ratio)
+        splits['train'].extend(group[:n_train])
+        splits['val'].extend(group[n_train:n_train + n_val])
+        splits['test'].extend(group[n_train + n_val:])
+    return splits
+
+def place_file(source, destination, mode):
+    """Copies or links one file into the split directory."""
+    if os.path.lexists(destination):
+        os.remove(destination)
+    if mode == 'hardlink':
+        os.link(source, destination)
+    elif mode == 'symlink':
+        os.symlink(os.path.abspath(source), destination)
+    else:
+        shutil.copy2(source, destination)
+
+def split_yolo_dataset(images_dir, labels_dir, output_dir, train_ratio=0.7, val_ratio=0.2, test_ratio=0.1, random_seed=42,
+                       use_index=False, mode='copy', stratify=False, num_workers=8):
     """
     Split YOLO dataset into train, validation, and test sets.
-    
+
     Args:
         images_dir (str): Path to directory containing image files
         labels_dir (str): Path to directory containing label files
@@ -15,97 +102,82 @@ def split_yolo_dataset(images_dir, labels_dir, output_dir, train_ratio=0.7, val_
         val_ratio (float): Proportion of data for validation set
         test_ratio (float): Proportion of data for test set
         random_seed (int): Random seed for reproducibility
+        use_index (bool): Pair images and labels through the shared dataset index
+        mode (str): 'copy', 'hardlink' or 'symlink' files into train/val/test, or 'manifest' to only
+            write train.txt/val.txt/test.txt image lists (YOLO finds the labels next to images/)
+        stratify (bool): Keep the share of images with and without objects equal across the splits
+        num_workers (int): Threads used for copying/linking
     """
     # Validate ratios
     assert abs((train_ratio + val_ratio + test_ratio) - 1.0) < 0.0001, "Ratios must sum to 1"
-    
-    # Create output directories
+    assert mode in SPLIT_MODES, f"Mode must be one of {SPLIT_MODES}"
+
     os.makedirs(output_dir, exist_ok=True)
-    train_img_dir = os.path.join(output_dir, 'train', 'images')
-    train_label_dir = os.path.join(output_dir, 'train', 'labels')
-    val_img_dir = os.path.join(output_dir, 'val', 'images')
-    val_label_dir = os.path.join(output_dir, 'val', 'labels')
-    test_img_dir = os.path.join(output_dir, 'test', 'images')
-    test_label_dir = os.path.join(output_dir, 'test', 'labels')
-    
-    for dir_path in [train_img_dir, train_label_dir, val_img_dir, val_label_dir, test_img_dir, test_label_dir]:
-        os.makedirs(dir_path, exist_ok=True)
-    
-    # Get list of image files (without extension)
-    image_files = [f for f in os.listdir(images_dir) 
-                  if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-    base_names = [os.path.splitext(f)[0] for f in image_files]
-    
-    # Verify that all images have corresponding label files
-    valid_pairs = []
-    for base in base_names:
-        label_file = f"{base}.txt"
-        if os.path.exists(os.path.join(labels_dir, label_file)):
-            valid_pairs.append(base)
-        else:
-            print(f"Warning: No label file found for {base}.jpg - skipping")
-    
-    # Split the dataset
-    random.seed(random_seed)
-    random.shuffle(valid_pairs)
-    
-    # First split into train and temp (val+test)
-    train, temp = train_test_split(valid_pairs, train_size=train_ratio, random_state=random_seed)
-    
-    # Then split temp into val and test
-    val_test_ratio = val_ratio / (val_ratio + test_ratio)
-    val, test = train_test_split(temp, train_size=val_test_ratio, random_state=random_seed)
-    
-    # Function to copy files
-    def copy_files(names, img_source, label_source, img_dest, label_dest):
-        for name in names:
-            # Find the original image file (could be .jpg, .jpeg, or .png)
-            img_ext = None
-            for ext in ['.jpg', '.jpeg', '.png']:
-                if os.path.exists(os.path.join(img_source, f"{name}{ext}")):
-                    img_ext = ext
-                    break
-            
-            if img_ext:
-                # Copy image
-                shutil.copy2(
-                    os.path.join(img_source, f"{name}{img_ext}"),
-                    os.path.join(img_dest, f"{name}{img_ext}")
-                )
-                # Copy label
-                shutil.copy2(
-                    os.path.join(label_source, f"{name}.txt"),
-                    os.path.join(label_dest, f"{name}.txt")
-                )
-    
-    # Copy files to their respective directories
-    copy_files(train, images_dir, labels_dir, train_img_dir, train_label_dir)
-    copy_files(val, images_dir, labels_dir, val_img_dir, val_label_dir)
-    copy_files(test, images_dir, labels_dir, test_img_dir, test_label_dir)
-    
+
+    # Pair once and split the dataset
+    pairs = pair_dataset(images_dir, labels_dir, use_index=use_index)
+    if not pairs:
+        print("No image/label pairs found.")
+        return
+    splits = split_pairs(pairs, train_ratio, val_ratio, random_seed, stratify=stratify)
+
+    if mode == 'manifest':
+        for split, members in splits.items():
+            manifest_path = os.path.join(output_dir, f"{split}.txt")
+            with open(manifest_path, 'w') as f:
+                f.writelines(os.path.abspath(os.path.join(images_dir, image_name)) + "\n"
+                             for image_name, _, _ in members)
+            print(f"Wrote {manifest_path}")
+    else:
+        # Create output directories and place all files concurrently
+        jobs = []
+        for split, members in splits.items():
+            split_img_dir = os.path.join(output_dir, split, 'images')
+            split_label_dir = os.path.join(output_dir, split, 'labels')
+            os.makedirs(split_img_dir, exist_ok=True)
+            os.makedirs(split_label_dir, exist_ok=True)
+            for image_name, label_name, _ in members:
+                jobs.append((os.path.join(images_dir, image_name), os.path.join(split_img_dir, image_name)))
+                jobs.append((os.path.join(labels_dir, label_name), os.path.join(split_label_dir, label_name)))
+
+        with ThreadPoolExecutor(num_workers) as pool:
+            list(pool.map(lambda job: place_file(*job, mode), jobs))
+
+    total = len(pairs)
     print("\nDataset split completed successfully!")
-    print(f"Total files: {len(valid_pairs)}")
-    print(f"Train set: {len(train)} files ({len(train)/len(valid_pairs):.1%})")
-    print(f"Validation set: {len(val)} files ({len(val)/len(valid_pairs):.1%})")
-    print(f"Test set: {len(test)} files ({len(test)/len(valid_pairs):.1%})")
+    print(f"Total files: {total} ({sum(p[2] for p in pairs)} with objects)")
+    print(f"Train set: {len(splits['train'])} files ({len(splits['train'])/total:.1%})")
+    print(f"Validation set: {len(splits['val'])} files ({len(splits['val'])/total:.1%})")
+    print(f"Test set: {len(splits['test'])} files ({len(splits['test'])/total:.1%})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Split a YOLO dataset into train/val/test')
+    parser.add_argument('--images_dir', type=str, required=True, help='Directory containing images')
+    parser.add_argument('--labels_dir', type=str, required=True, help='Directory containing YOLO label files')
+    parser.add_argument('--output_dir', type=str, required=True, help='Output directory of the split')
+    parser.add_argument('--train_ratio', type=float, default=0.7)
+    parser.add_argument('--val_ratio', type=float, default=0.2)
+    parser.add_argument('--test_ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mode', type=str, default='copy', choices=SPLIT_MODES)
+    parser.add_argument('--stratify', action='store_true', help='Stratify by label presence')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--use_index', action='store_true', help='Pair images and labels through the shared dataset index')
+    return parser.parse_args()
 
 # Example usage
 if __name__ == "__main__":
-    # Set your paths here
-    images_directory = "/home/danielshaquille/Daniel/projects/datasets/weird_stuff_coco/images"
-    labels_directory = "/home/danielshaquille/Daniel/projects/datasets/weird_stuff_coco/labels"
-    output_directory = "/home/danielshaquille/Daniel/projects/datasets/weird_stuff_coco/splitted_data"
-    
-    # Set your desired ratios (must sum to 1)
-    train_ratio = 0.7  # 70% for training
-    val_ratio = 0.2    # 20% for validation
-    test_ratio = 0.1   # 10% for testing
-    
+    args = parse_args()
     split_yolo_dataset(
-        images_dir=images_directory,
-        labels_dir=labels_directory,
-        output_dir=output_directory,
-        train_ratio=train_ratio,
-        val_ratio=val_ratio,
-        test_ratio=test_ratio
-    )
\ No newline at end of file
+        images_dir=args.images_dir,
+        labels_dir=args.labels_dir,
+        output_dir=args.output_dir,
+        train_ratio=args.train_ratio,
+        val_ratio=args.val_ratio,
+        test_ratio=args.test_ratio,
+        random_seed=args.seed,
+        use_index=args.use_index,
+        mode=args.mode,
+        stratify=args.stratify,
+        num_workers=args.workers
+    )
@@ -1,37 +1,142 @@
 import os
+import sys
+import glob
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-def create_missing_label_files(images_dir, labels_dir):
+# Add the Pipelines directory to sys.path to make the shared `common` package importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from common.dataset_index import DatasetIndex, ALL_IMAGE_EXTENSIONS
+
+MANIFEST_NAME = "empty_labels_manifest.txt"
+
+def create_missing_label_files(images_dir, labels_dir, use_index=False, summary_only=False):
     """
     Find images without corresponding label files and create empty label files.
-    
+
     Args:
-        images_dir (str): Path to directory containing image files (.jpg)
+        images_dir (str): Path to directory containing image files
         labels_dir (str): Path to directory containing label files (.txt)
+        use_index (bool): Find the missing labels through the shared dataset index
+        summary_only (bool): Only print the final summary
     """
-    # Get list of image files (without extension)
-    image_files = [os.path.splitext(f)[0] for f in os.listdir(images_dir) 
-                  if f.lower().endswith('.jpg') or f.lower().endswith('.jpeg')]
-    
-    # Get list of existing label files (without extension)
-    label_files = [os.path.splitext(f)[0] for f in os.listdir(labels_dir) 
-                  if f.lower().endswith('.txt')]
-    
-    # Find images without labels
-    missing_labels = set(image_files) - set(label_files)
-    
+    if use_index:
+        # Same extensions as the scan below, so the flag never changes which images get a label
+        index = DatasetIndex.open(images_dir, labels_dir, extensions=ALL_IMAGE_EXTENSIONS)
+        missing_labels = {stem for stem, has_label in zip(index.stems, index.has_label) if not has_label}
+    else:
+        # Get list of image files (without extension)
+        image_files = [os.path.splitext(f)[0] for f in os.listdir(images_dir)
+                      if f.lower().endswith(ALL_IMAGE_EXTENSIONS)]
+
+        # Get list of existing label files (without extension)
+        label_files = [os.path.splitext(f)[0] for f in os.listdir(labels_dir)
+                      if f.lower().endswith('.txt')]
+
+        # Find images without labels
+        missing_labels = set(image_files) - set(label_files)
+
     # Create empty label files for missing ones
     for missing in missing_labels:
         label_path = os.path.join(labels_dir, f"{missing}.txt")
         with open(label_path, 'w') as f:
             pass  # Just create an empty file
-        
-        print(f"Created empty label file: {label_path}")
-    
+
+        if not summary_only:
+            print(f"Created empty label file: {label_path}")
+
     print(f"\nProcess complete. Created {len(missing_labels)} empty label files.")
+    return len(missing_labels)
+
+def iter_images(images_dir, relative_dir=""):
+    """Yields image paths relative to `images_dir`, walking nested directories with os.scandir."""
+    with os.scandir(os.path.join(images_dir, relative_dir)) as entries:
+        for entry in entries:
+            relative_path = os.path.join(relative_dir, entry.name)
+            if entry.is_dir():
+                yield from iter_images(images_dir, relative_path)
+            elif entry.is_file() and entry.name.lower().endswith(ALL_IMAGE_EXTENSIONS):
+                yield relative_path
+
+def create_missing_label_files_incremental(images_dir, labels_dir, manifest_path, summary_only=False):
+    """
+    Incremental variant for growing datasets: handles all image extensions and nested
+    directories (mirrored below `labels_dir`) and records every handled image in a
+    manifest, so a re-run only checks images added since the last run.
+
+    Returns:
+        (new images checked, empty label files created)
+    """
+    handled = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            handled = {line.rstrip("\n") for line in f}
+
+    new_images = [path for path in iter_images(images_dir) if path not in handled]
+
+    created = 0
+    with open(manifest_path, 'a') as manifest:
+        for relative_path in new_images:
+            label_path = os.path.join(labels_dir, os.path.splitext(relative_path)[0] + ".txt")
+            if not os.path.exists(label_path):
+                os.makedirs(os.path.dirname(label_path), exist_ok=True)
+                with open(label_path, 'w') as f:
+                    pass  # Just create an empty file
+                created += 1
+                if not summary_only:
+                    print(f"Created empty label file: {label_path}")
+            manifest.write(relative_path + "\n")
+
+    return len(new_images), created
+
+def process_chunks(root_dir, chunk_pattern="chunk_*", num_workers=8, summary_only=False):
+    """Runs the incremental mode over every `<chunk>/images` + `<chunk>/labels` folder in parallel."""
+    chunk_dirs = sorted(d for d in glob.glob(os.path.join(root_dir, chunk_pattern))
+                        if os.path.isdir(os.path.join(d, "images")))
+
+    def process_chunk(chunk_dir):
+        labels_dir = os.path.join(chunk_dir, "labels")
+        os.makedirs(labels_dir, exist_ok=True)
+        return create_missing_label_files_incremental(
+            os.path.join(chunk_dir, "images"), labels_dir,
+            os.path.join(chunk_dir, MANIFEST_NAME), summary_only=summary_only
+        )
+
+    with ThreadPoolExecutor(num_workers) as pool:
+        results = list(pool.map(process_chunk, chunk_dirs))
+
+    for chunk_dir, (checked, created) in zip(chunk_dirs, results):
+        if not summary_only or created:
+            print(f"{os.path.basename(chunk_dir)}: {checked} new images, {created} empty label files created")
+    print(f"\nProcess complete. {len(chunk_dirs)} chunks, {sum(r[0] for r in results)} new images, "
+          f"created {sum(r[1] for r in results)} empty label files.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Create empty YOLO label files for images without labels')
+    parser.add_argument('--images_dir', type=str, help='Directory containing images')
+    parser.add_argument('--labels_dir', type=str, help='Directory containing YOLO label files')
+    parser.add_argument('--root_dir', type=str, help='Directory containing chunk folders, each with images/ and labels/')
+    parser.add_argument('--chunk_pattern', type=str, default='chunk_*', help='Glob of the chunk folders below --root_dir')
+    parser.add_argument('--incremental', action='store_true', help='Only check images added since the last run (manifest based)')
+    parser.add_argument('--workers', type=int, default=8, help='Chunks processed in parallel')
+    parser.add_argument('--summary_only', action='store_true', help='Do not log every created file')
+    parser.add_argument('--use_index', action='store_true', help='Find the missing labels through the shared dataset index')
+    args = parser.parse_args()
+    if not args.root_dir and not (args.images_dir and args.labels_dir):
+        parser.error('--images_dir and --labels_dir are required unless --root_dir is given')
+    return args
 
 # Example usage
 if __name__ == "__main__":
-    images_directory = "/home/danielshaquille/Daniel/projects/datasets/chunk_6_shaquille/images"  # Replace with your images directory
-    labels_directory = "/home/danielshaquille/Daniel/projects/datasets/chunk_6_shaquille/labels"  # Replace with your labels directory
-    
-    create_missing_label_files(images_directory, labels_directory)
\ No newline at end of file
+    args = parse_args()
+    if args.root_dir:
+        process_chunks(args.root_dir, args.chunk_pattern, num_workers=args.workers, summary_only=args.summary_only)
+    elif args.incremental:
+        checked, created = create_missing_label_files_incremental(
+            args.images_dir, args.labels_dir, os.path.join(args.labels_dir, "..", MANIFEST_NAME),
+            summary_only=args.summary_only
+        )
+        print(f"\nProcess complete. {checked} new images, created {created} empty label files.")
+    else:
+        create_missing_label_files(args.images_dir, args.labels_dir, use_index=args.use_index,
+                                   summary_only=args.summary_only)
@@ -0,0 +1,187 @@
+"""
+Shared index of a YOLO images/labels tree.
+
+The tree is scanned once and every label file is parsed into a columnar,
+memory-mapped cache (offsets + float32 coordinates + class ids), so tools that
+walk the whole dataset do not re-open thousands of small .txt files. The cache
+is rebuilt when the directories or any label file changed (mtime based).
+
+Layout of the index directory (by default next to the labels directory, "<labels>.yolo_index"):
+    meta.json           image file names, stems and the scan signature
+    has_label.npy       bool per image
+    image_offsets.npy   int64, annotations of image i are rows image_offsets[i]:image_offsets[i+1]
+    class_ids.npy       int32 per annotation
+    coord_offsets.npy   int64, coordinates of annotation j are coords[coord_offsets[j]:coord_offsets[j+1]]
+    coords.npy          float32 normalized coordinates (4 for boxes, 2*k for polygons)
+"""
+import os
+import json
+import numpy as np
+
+# Image files every dataset tool picks up
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Every image a label file can belong to, for tools that maintain the labels themselves
+ALL_IMAGE_EXTENSIONS = IMAGE_EXTENSIONS + ('.bmp', '.webp', '.tif', '.tiff')
+INDEX_DIR_SUFFIX = ".yolo_index"
+INDEX_VERSION = 1
+
+
+def list_images(images_dir, extensions=IMAGE_EXTENSIONS):
+    """Sorted image file names of a directory, one os.scandir pass."""
+    with os.scandir(images_dir) as entries:
+        return sorted(entry.name for entry in entries
+                      if entry.is_file() and entry.name.lower().endswith(extensions))
+
+
+def scan_dataset(images_dir, labels_dir, extensions=IMAGE_EXTENSIONS):
+    """One os.scandir pass over each directory. Returns image file names, label stems and the mtime signature."""
+    image_files = {}
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(extensions):
+                stem = os.path.splitext(entry.name)[0]
+                # Same stem with several extensions: keep the first in name order
+                if stem not in image_files or entry.name < image_files[stem]:
+                    image_files[stem] = entry.name
+
+    label_stems = set()
+    label_count = 0
+    max_label_mtime = 0
+    if os.path.isdir(labels_dir):
+        with os.scandir(labels_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.txt'):
+                    label_stems.add(entry.name[:-4])
+                    label_count += 1
+                    max_label_mtime = max(max_label_mtime, entry.stat().st_mtime_ns)
+
+    signature = {
+        "images_dir_mtime": os.stat(images_dir).st_mtime_ns,
+        "labels_dir_mtime": os.stat(labels_dir).st_mtime_ns if os.path.isdir(labels_dir) else 0,
+        "label_count": label_count,
+        "max_label_mtime": max_label_mtime,
+    }
+    return image_files, label_stems, signature
+
+
+def parse_label_lines(label_path):
+    """Class ids and coordinate arrays of one YOLO label file."""
+    class_ids, coords = [], []
+    with open(label_path, 'r') as f:
+        for line in f:
+            values = line.split()
+            if len(values) < 5:
+                continue
+            class_ids.append(int(float(values[0])))
+            coords.append(np.asarray(values[1:], dtype=np.float32))
+    return class_ids, coords
+
+
+class DatasetIndex:
+    """Read-only view of an index directory, all arrays are memory-mapped."""
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, "meta.json"), 'r') as f:
+            self.meta = json.load(f)
+
+        self.index_dir = index_dir
+        self.images_dir = self.meta["images_dir"]
+        self.labels_dir = self.meta["labels_dir"]
+        self.stems = self.meta["stems"]
+        self.image_files = self.meta["image_files"]
+        self.has_label = np.load(os.path.join(index_dir, "has_label.npy"), mmap_mode='r')
+        self.image_offsets = np.load(os.path.join(index_dir, "image_offsets.npy"), mmap_mode='r')
+        self.class_ids = np.load(os.path.join(index_dir, "class_ids.npy"), mmap_mode='r')
+        self.coord_offsets = np.load(os.path.join(index_dir, "coord_offsets.npy"), mmap_mode='r')
+        self.coords = np.load(os.path.join(index_dir, "coords.npy"), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.stems)
+
+    def image_path(self, i):
+        return os.path.join(self.images_dir, self.image_files[i])
+
+    def label_path(self, i):
+        return os.path.join(self.labels_dir, f"{self.stems[i]}.txt")
+
+    def num_annotations(self, i):
+        return int(self.image_offsets[i + 1] - self.image_offsets[i])
+
+    def annotations(self, i):
+        """Class ids and normalized coordinates of image i, as views into the memory-mapped columns."""
+        start, end = int(self.image_offsets[i]), int(self.image_offsets[i + 1])
+        coords = [self.coords[self.coord_offsets[j]:self.coord_offsets[j + 1]] for j in range(start, end)]
+        return self.class_ids[start:end], coords
+
+    @staticmethod
+    def default_index_dir(labels_dir):
+        """Sibling of the labels directory, creating it inside would change the mtime being checked."""
+        return os.path.normpath(labels_dir) + INDEX_DIR_SUFFIX
+
+    @classmethod
+    def open(cls, images_dir, labels_dir, index_dir=None, rebuild=False, verbose=True, extensions=IMAGE_EXTENSIONS):
+        """
+        Opens the index of a dataset, (re)building it if it is missing or out of date. Only images
+        with one of `extensions` are indexed, an index built for other extensions is rebuilt.
+        """
+        images_dir = os.path.abspath(images_dir)
+        labels_dir = os.path.abspath(labels_dir)
+        index_dir = index_dir or cls.default_index_dir(labels_dir)
+        image_files, label_stems, signature = scan_dataset(images_dir, labels_dir, extensions)
+        signature["extensions"] = sorted(extensions)
+
+        meta_path = os.path.join(index_dir, "meta.json")
+        if not rebuild and os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if (meta.get("version") == INDEX_VERSION and meta.get("signature") == signature
+                    and meta.get("images_dir") == images_dir and meta.get("labels_dir") == labels_dir):
+                return cls(index_dir)
+
+        if verbose:
+            print(f"Building dataset index in {index_dir} ...")
+        cls.build(images_dir, labels_dir, index_dir, image_files, label_stems, signature)
+        return cls(index_dir)
+
+    @staticmethod
+    def build(images_dir, labels_dir, index_dir, image_files, label_stems, signature):
+        """Parses every label file once and writes the columnar arrays."""
+        os.makedirs(index_dir, exist_ok=True)
+        meta_path = os.path.join(index_dir, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        stems = sorted(image_files)
+
+        has_label = np.zeros(len(stems), dtype=bool)
+        image_offsets = np.zeros(len(stems) + 1, dtype=np.int64)
+        all_class_ids, all_coords, coord_lengths = [], [], []
+
+        for i, stem in enumerate(stems):
+            if stem in label_stems:
+                has_label[i] = True
+                class_ids, coords = parse_label_lines(os.path.join(labels_dir, f"{stem}.txt"))
+                all_class_ids.extend(class_ids)
+                all_coords.extend(coords)
+                coord_lengths.extend(len(c) for c in coords)
+            image_offsets[i + 1] = len(all_class_ids)
+
+        coord_offsets = np.zeros(len(coord_lengths) + 1, dtype=np.int64)
+        np.cumsum(coord_lengths, out=coord_offsets[1:])
+        coords = np.concatenate(all_coords).astype(np.float32) if all_coords else np.zeros(0, dtype=np.float32)
+
+        np.save(os.path.join(index_dir, "has_label.npy"), has_label)
+        np.save(os.path.join(index_dir, "image_offsets.npy"), image_offsets)
+        np.save(os.path.join(index_dir, "class_ids.npy"), np.asarray(all_class_ids, dtype=np.int32))
+        np.save(os.path.join(index_dir, "coord_offsets.npy"), coord_offsets)
+        np.save(os.path.join(index_dir, "coords.npy"), coords)
+
+        # Written last, an interrupted build is never picked up as valid
+        with open(meta_path, 'w') as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "images_dir": images_dir,
+                "labels_dir": labels_dir,
+                "signature": signature,
+                "stems": stems,
+                "image_files": [image_files[stem] for stem in stems],
+            }, f)
@@ -0,0 +1,172 @@
+"""
+Detection metrics computed from cached predictions (numpy only).
+
+Every function works on per-image records:
+    gt:   (boxes float[N, 4] xyxy, classes int[N])
+    pred: (boxes float[M, 4] xyxy, scores float[M], classes int[M])
+
+Matching is greedy in descending score order, so the matches of a prediction never
+depend on lower-scored predictions. Filtering matched predictions by a score threshold
+afterwards is therefore exact, and a whole PR curve needs a single matching pass.
+"""
+import json
+import numpy as np
+
+DEFAULT_SCORE_THRESHOLDS = np.round(np.linspace(0.05, 0.95, 19), 2)
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU of two xyxy box arrays, shape [len(a), len(b)]."""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def match_predictions(gt_boxes, gt_classes, pred_boxes, pred_scores, pred_classes, iou_threshold=0.5,
+                      class_aware=True):
+    """
+    Greedily matches predictions (highest score first) to unmatched ground truth boxes.
+
+    Returns:
+        matched gt index per prediction, -1 for false positives
+    """
+    matches = np.full(len(pred_boxes), -1, dtype=np.int64)
+    if len(gt_boxes) == 0 or len(pred_boxes) == 0:
+        return matches
+
+    iou = box_iou(pred_boxes, gt_boxes)
+    if class_aware:
+        iou[pred_classes[:, None] != gt_classes[None, :]] = 0
+    gt_taken = np.zeros(len(gt_boxes), dtype=bool)
+    for p in np.argsort(-pred_scores, kind="stable"):
+        candidates = np.where(gt_taken, -1, iou[p])
+        best = int(np.argmax(candidates))
+        if candidates[best] >= iou_threshold:
+            matches[p] = best
+            gt_taken[best] = True
+    return matches
+
+
+def confusion_matrix(gts, preds, num_classes, score_threshold=0.5, iou_threshold=0.5):
+    """
+    Confusion matrix of shape [num_classes + 1, num_classes + 1], rows are ground truth and
+    columns predictions, the last row/column is background (missed objects / false positives).
+    """
+    matrix = np.zeros((num_classes + 1, num_classes + 1), dtype=np.int64)
+    for (gt_boxes, gt_classes), (pred_boxes, pred_scores, pred_classes) in zip(gts, preds):
+        keep = pred_scores >= score_threshold
+        pred_boxes, pred_scores, pred_classes = pred_boxes[keep], pred_scores[keep], pred_classes[keep]
+
+        matches = match_predictions(gt_boxes, gt_classes, pred_boxes, pred_scores, pred_classes,
+                                    iou_threshold, class_aware=False)
+        for pred_class, gt_index in zip(pred_classes, matches):
+            gt_class = gt_classes[gt_index] if gt_index >= 0 else num_classes
+            matrix[gt_class, pred_class] += 1
+
+        missed = np.ones(len(gt_boxes), dtype=bool)
+        missed[matches[matches >= 0]] = False
+        np.add.at(matrix, (gt_classes[missed], num_classes), 1)
+    return matrix
+
+
+class MatchAccumulator:
+    """
+    Class-aware matching of images added one at a time, so predictions can be scored while
+    they are streamed instead of being collected for the whole dataset first.
+    """
+
+    def __init__(self, num_classes, iou_threshold=0.5):
+        self.num_classes = num_classes
+        self.iou_threshold = iou_threshold
+        self.scores = [[] for _ in range(num_classes)]
+        self.true_positives = [[] for _ in range(num_classes)]
+        self.gt_counts = np.zeros(num_classes, dtype=np.int64)
+
+    def add(self, gt, pred):
+        (gt_boxes, gt_classes), (pred_boxes, pred_scores, pred_classes) = gt, pred
+        self.gt_counts += np.bincount(gt_classes, minlength=self.num_classes)[:self.num_classes]
+        matches = match_predictions(gt_boxes, gt_classes, pred_boxes, pred_scores, pred_classes, self.iou_threshold)
+        for c in range(self.num_classes):
+            in_class = pred_classes == c
+            self.scores[c].append(pred_scores[in_class])
+            self.true_positives[c].append(matches[in_class] >= 0)
+
+    def result(self):
+        """Per class: (scores of all predictions, true positive flags, number of ground truth boxes)."""
+        return [(np.concatenate(self.scores[c]) if self.scores[c] else np.zeros(0),
+                 np.concatenate(self.true_positives[c]) if self.true_positives[c] else np.zeros(0, dtype=bool),
+                 int(self.gt_counts[c])) for c in range(self.num_classes)]
+
+
+def match_dataset(gts, preds, num_classes, iou_threshold=0.5):
+    """
+    One class-aware matching pass over the dataset.
+
+    Returns:
+        per class: (scores of all predictions, true positive flags, number of ground truth boxes)
+    """
+    accumulator = MatchAccumulator(num_classes, iou_threshold)
+    for gt, pred in zip(gts, preds):
+        accumulator.add(gt, pred)
+    return accumulator.result()
+
+
+def pr_curve(class_matches, score_thresholds=DEFAULT_SCORE_THRESHOLDS):
+    """Precision, recall and F1 of one class at every score threshold, from `match_dataset` output."""
+    scores, true_positives, num_gt = class_matches
+    order = np.argsort(-scores, kind="stable")
+    sorted_scores = -scores[order]
+    tp_cumsum = np.concatenate([[0], np.cumsum(true_positives[order])])
+
+    # Number of predictions with score >= threshold, via binary search on the sorted scores
+    counts = np.searchsorted(sorted_scores, -np.asarray(score_thresholds), side="right")
+    tp = tp_cumsum[counts]
+    precision = np.where(counts > 0, tp / np.maximum(counts, 1), 1.0)
+    recall = tp / num_gt if num_gt else np.zeros(len(counts))
+    f1 = 2 * precision * recall / np.maximum(precision + recall, 1e-9)
+    return precision, recall, f1
+
+
+def average_precision(class_matches):
+    """All-point interpolated AP of one class, from `match_dataset` output."""
+    scores, true_positives, num_gt = class_matches
+    if num_gt == 0:
+        return float("nan")
+    tp = np.cumsum(true_positives[np.argsort(-scores, kind="stable")])
+    recall = np.concatenate([[0], tp / num_gt, [1]])
+    precision = np.concatenate([[1], tp / np.arange(1, len(tp) + 1), [0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+
+
+def class_pr_curves(gts, preds, class_names, iou_threshold=0.5, score_thresholds=DEFAULT_SCORE_THRESHOLDS):
+    """
+    JSON-ready PR curve and AP per class name. AP is None for a class without ground truth,
+    where it is undefined (NaN is not valid JSON).
+    """
+    curves = {}
+    score_thresholds = np.asarray(score_thresholds)
+    for name, class_matches in zip(class_names, match_dataset(gts, preds, len(class_names), iou_threshold)):
+        precision, recall, f1 = pr_curve(class_matches, score_thresholds)
+        curves[name] = {"thresholds": score_thresholds.tolist(), "precision": precision.tolist(),
+                        "recall": recall.tolist(), "f1": f1.tolist(),
+                        "ap": average_precision(class_matches) if class_matches[2] else None}
+    return curves
+
+
+def mean_average_precision(curves):
+    """Mean AP over the classes with ground truth, None if there are none."""
+    aps = [curve["ap"] for curve in curves.values() if curve["ap"] is not None]
+    return float(np.mean(aps)) if aps else None
+
+
+def write_metrics(path, metrics):
+    """Writes metrics as strict JSON, a NaN or infinity raises instead of producing an unparsable file."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2, allow_nan=False)
@@ -0,0 +1,24 @@
+"""tests/test_data_split.py"""
+
+# Imports
+import sys
+import os
+
+# Add the Detectron2 utils directory to sys.path to make `data_split` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Detectron2", "src", "utils")))
+
+#pylint: disable=wrong-import-position
+from data_split import pair_dataset
+
+def test_images_sharing_a_stem_are_paired_once(tmp_path, capsys):
+    images_dir, labels_dir = tmp_path / "images", tmp_path / "labels"
+    images_dir.mkdir()
+    labels_dir.mkdir()
+    for name in ("a.jpg", "a.png", "b.jpg", "c.jpg"):
+        (images_dir / name).write_bytes(b"")
+    (labels_dir / "a.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+    (labels_dir / "b.txt").write_text("")
+
+    pairs = pair_dataset(str(images_dir), str(labels_dir))
+    assert pairs == [("a.jpg", "a.txt", True), ("b.jpg", "b.txt", False)]
+    assert "a.png" in capsys.readouterr().out
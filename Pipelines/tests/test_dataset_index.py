@@ -0,0 +1,69 @@
+"""tests/test_dataset_index.py"""
+
+# Imports
+import sys
+import os
+import numpy as np
+
+# Add the Pipelines directory to sys.path to make the shared `common` package importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+#pylint: disable=wrong-import-position
+from common.dataset_index import DatasetIndex, list_images
+
+def _make_dataset(root, labels):
+    images_dir, labels_dir = root / "images", root / "labels"
+    images_dir.mkdir()
+    labels_dir.mkdir()
+    for name in ("a.jpg", "b.png", "c.jpg", "d.bmp", "notes.txt"):
+        (images_dir / name).write_bytes(b"")
+    for stem, text in labels.items():
+        (labels_dir / f"{stem}.txt").write_text(text)
+    return str(images_dir), str(labels_dir)
+
+def test_build_parses_labels_into_columns(tmp_path):
+    images_dir, labels_dir = _make_dataset(tmp_path, {
+        "a": "0 0.5 0.5 0.2 0.2\n1 0.1 0.1 0.3 0.1 0.2 0.4\n",
+        "b": "",
+    })
+    index = DatasetIndex.open(images_dir, labels_dir, verbose=False)
+
+    # .bmp and non-image files are not picked up, like list_images
+    assert index.image_files == list_images(images_dir) == ["a.jpg", "b.png", "c.jpg"]
+    assert list(index.has_label) == [True, True, False]
+    assert [index.num_annotations(i) for i in range(len(index))] == [2, 0, 0]
+
+    class_ids, coords = index.annotations(0)
+    assert list(class_ids) == [0, 1]
+    np.testing.assert_allclose(coords[0], [0.5, 0.5, 0.2, 0.2])
+    assert len(coords[1]) == 6
+
+def test_index_is_reused_until_labels_change(tmp_path):
+    images_dir, labels_dir = _make_dataset(tmp_path, {"a": "0 0.5 0.5 0.2 0.2\n"})
+    DatasetIndex.open(images_dir, labels_dir, verbose=False)
+    meta_path = os.path.join(DatasetIndex.default_index_dir(labels_dir), "meta.json")
+    built = os.stat(meta_path).st_mtime_ns
+    DatasetIndex.open(images_dir, labels_dir, verbose=False)
+    assert os.stat(meta_path).st_mtime_ns == built
+
+    # Edited label file (newer mtime)
+    label_path = os.path.join(labels_dir, "a.txt")
+    with open(label_path, "w") as f:
+        f.write("0 0.5 0.5 0.2 0.2\n2 0.5 0.5 0.1 0.1\n")
+    later = os.stat(label_path).st_mtime_ns + 10**9
+    os.utime(label_path, ns=(later, later))
+    index = DatasetIndex.open(images_dir, labels_dir, verbose=False)
+    assert index.num_annotations(0) == 2
+
+    # New label file
+    with open(os.path.join(labels_dir, "c.txt"), "w") as f:
+        f.write("1 0.5 0.5 0.2 0.2\n")
+    index = DatasetIndex.open(images_dir, labels_dir, verbose=False)
+    assert list(index.has_label) == [True, False, True]
+
+def test_empty_labels_dir(tmp_path):
+    images_dir, labels_dir = _make_dataset(tmp_path, {})
+    index = DatasetIndex.open(images_dir, labels_dir, verbose=False)
+    assert len(index) == 3
+    assert not index.has_label.any()
+    assert len(index.class_ids) == 0 and len(index.coords) == 0
@@ -0,0 +1,90 @@
+"""tests/test_detection_metrics.py"""
+
+# Imports
+import sys
+import os
+import json
+import math
+import numpy as np
+
+# Add the Pipelines directory to sys.path to make the shared `common` package importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+#pylint: disable=wrong-import-position
+from common.detection_metrics import (average_precision, box_iou, class_pr_curves, confusion_matrix,
+                                      match_dataset, match_predictions, mean_average_precision, pr_curve,
+                                      write_metrics)
+
+BOX = [10.0, 10.0, 50.0, 50.0]
+FAR_BOX = [100.0, 100.0, 140.0, 140.0]
+
+def _gt(boxes, classes):
+    return np.array(boxes, dtype=np.float32).reshape(-1, 4), np.array(classes, dtype=np.int64)
+
+def _pred(boxes, scores, classes):
+    return (np.array(boxes, dtype=np.float32).reshape(-1, 4), np.array(scores, dtype=np.float32),
+            np.array(classes, dtype=np.int64))
+
+def test_box_iou():
+    iou = box_iou(np.array([[0, 0, 2, 2]], dtype=np.float32), np.array([[1, 1, 3, 3], [0, 0, 2, 2]], dtype=np.float32))
+    np.testing.assert_allclose(iou, [[1 / 7, 1.0]], rtol=1e-6)
+    assert box_iou(np.zeros((0, 4)), np.zeros((3, 4))).shape == (0, 3)
+
+def test_matching_takes_highest_score_first():
+    gt_boxes, gt_classes = _gt([BOX], [0])
+    pred_boxes, pred_scores, pred_classes = _pred([BOX, BOX], [0.6, 0.9], [0, 0])
+    assert match_predictions(gt_boxes, gt_classes, pred_boxes, pred_scores, pred_classes).tolist() == [-1, 0]
+
+def test_perfect_match():
+    matches = match_dataset([_gt([BOX], [0])], [_pred([BOX], [0.9], [0])], num_classes=1)
+    assert average_precision(matches[0]) == 1.0
+    precision, recall, _ = pr_curve(matches[0], score_thresholds=[0.5])
+    assert precision.tolist() == [1.0] and recall.tolist() == [1.0]
+
+def test_single_false_positive():
+    # The false positive outscores the true positive: precision 1/2 at full recall
+    matches = match_dataset([_gt([BOX], [0])], [_pred([FAR_BOX, BOX], [0.9, 0.8], [0, 0])], num_classes=1)
+    assert average_precision(matches[0]) == 0.5
+    precision, recall, f1 = pr_curve(matches[0], score_thresholds=[0.5, 0.85, 0.95])
+    assert precision.tolist() == [0.5, 0.0, 1.0]
+    assert recall.tolist() == [1.0, 0.0, 0.0]
+    np.testing.assert_allclose(f1, [2 / 3, 0.0, 0.0], atol=1e-6)
+
+    # Ranked below the true positive it costs no AP
+    matches = match_dataset([_gt([BOX], [0])], [_pred([FAR_BOX, BOX], [0.7, 0.8], [0, 0])], num_classes=1)
+    assert average_precision(matches[0]) == 1.0
+
+def test_empty_ground_truth():
+    matches = match_dataset([_gt([], [])], [_pred([BOX], [0.9], [0])], num_classes=1)
+    assert math.isnan(average_precision(matches[0]))
+    _, recall, _ = pr_curve(matches[0], score_thresholds=[0.5])
+    assert recall.tolist() == [0.0]
+    # The prediction is a false positive on the background row
+    assert confusion_matrix([_gt([], [])], [_pred([BOX], [0.9], [0])], num_classes=1).tolist() == [[0, 0], [1, 0]]
+
+def test_class_mismatch():
+    gts, preds = [_gt([BOX], [0])], [_pred([BOX], [0.9], [1])]
+    matches = match_dataset(gts, preds, num_classes=2)
+    assert average_precision(matches[0]) == 0.0
+    assert math.isnan(average_precision(matches[1]))
+    assert matches[1][1].tolist() == [False]
+
+    # Matching is class agnostic in the confusion matrix, so the box lands off the diagonal
+    assert confusion_matrix(gts, preds, num_classes=2).tolist() == [[0, 1, 0], [0, 0, 0], [0, 0, 0]]
+
+def _reject_constant(name):
+    raise ValueError(f"{name} is not valid JSON")
+
+def test_metrics_json_is_strict_without_ground_truth(tmp_path):
+    # Class 1 has no ground truth: its AP is None and it is left out of the mean
+    curves = class_pr_curves([_gt([BOX], [0])], [_pred([BOX, FAR_BOX], [0.9, 0.8], [0, 1])], ["cone", "panda"])
+    assert curves["cone"]["ap"] == 1.0 and curves["panda"]["ap"] is None
+    assert mean_average_precision(curves) == 1.0
+
+    path = tmp_path / "metrics.json"
+    write_metrics(str(path), {"pr_curves": curves, "mAP": mean_average_precision(curves)})
+    with open(path, encoding="utf-8") as f:
+        metrics = json.load(f, parse_constant=_reject_constant)
+    assert metrics["pr_curves"]["panda"]["ap"] is None
+
+    assert mean_average_precision(class_pr_curves([_gt([], [])], [_pred([], [], [])], ["cone"])) is None
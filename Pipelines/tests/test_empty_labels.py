@@ -0,0 +1,29 @@
+"""tests/test_empty_labels.py"""
+
+# Imports
+import sys
+import os
+
+# Add the Detectron2 utils directory to sys.path to make `empty_labels` importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Detectron2", "src", "utils")))
+
+#pylint: disable=wrong-import-position
+from empty_labels import create_missing_label_files
+
+def _make_dataset(root):
+    images_dir, labels_dir = root / "images", root / "labels"
+    images_dir.mkdir(parents=True)
+    labels_dir.mkdir()
+    for name in ("a.jpg", "b.png", "c.bmp", "d.webp", "e.tif", "f.TIFF", "notes.txt"):
+        (images_dir / name).write_bytes(b"")
+    (labels_dir / "a.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+    return str(images_dir), str(labels_dir)
+
+def test_index_and_scan_create_the_same_labels(tmp_path):
+    created = {}
+    for use_index in (False, True):
+        images_dir, labels_dir = _make_dataset(tmp_path / str(use_index))
+        assert create_missing_label_files(images_dir, labels_dir, use_index=use_index, summary_only=True) == 5
+        created[use_index] = sorted(os.listdir(labels_dir))
+
+    assert created[True] == created[False] == ["a.txt", "b.txt", "c.txt", "d.txt", "e.txt", "f.txt"]
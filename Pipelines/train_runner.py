@@ -0,0 +1,335 @@
+"""
+Config-driven, non-interactive training runner for all training pipelines.
+
+    python train_runner.py --config configs/yolo_object_detection.yaml --run_name baseline
+    python train_runner.py --config configs/detectron2.yaml --device cpu --smoke
+    python train_runner.py --config configs/yolo_street_detection.yaml --set train.epochs=50 dataloader.cache=ram
+
+The config selects the pipeline ("yolo" for object detection and street segmentation,
+"detectron2"), the device, dataloader settings and the training arguments. Relative paths
+in a config are resolved against the directory of the config file. `--smoke` merges the
+config's `smoke` section on top (CPU, a handful of images/iterations) to check a setup
+end-to-end before submitting the real job.
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+from datetime import datetime
+import yaml
+
+PIPELINES = ('yolo', 'detectron2')
+PATH_KEYS = ('data', 'model', 'project', 'output_dir', 'dataset_root', 'weights', 'train_cache')
+DETECTRON2_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Detectron2', 'src')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Config-driven training runner')
+    parser.add_argument('--config', type=str, required=True, help='Training config (yaml)')
+    parser.add_argument('--run_name', type=str, default=None, help='Overrides run_name of the config')
+    parser.add_argument('--device', type=str, default=None, help='"auto", "cpu", "0" or "0,1", overrides the config')
+    parser.add_argument('--resume', type=str, default=None, help='Run name to resume (YOLO) or "last" (Detectron2)')
+    parser.add_argument('--smoke', action='store_true', help="Merge the config's smoke section: CPU, tiny data, few steps")
+    parser.add_argument('--set', type=str, nargs='*', default=[], metavar='KEY=VALUE',
+                        help='Dotted config overrides, values are parsed as yaml (e.g. train.epochs=5)')
+    return parser.parse_args(argv)
+
+
+### Config ###
+
+def merge(base, override):
+    """Recursive dict merge, override wins."""
+    merged = copy.deepcopy(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def set_dotted(config, dotted_key, value):
+    """Sets e.g. train.epochs, keys below `cfg` are detectron2 keys and keep their dots (cfg.SOLVER.BASE_LR)."""
+    if dotted_key.startswith('cfg.'):
+        config.setdefault('cfg', {})[dotted_key[len('cfg.'):]] = value
+        return
+    node = config
+    *parents, leaf = dotted_key.split('.')
+    for key in parents:
+        node = node.setdefault(key, {})
+    node[leaf] = value
+
+
+def resolve_paths(config, base_dir):
+    """Relative paths are relative to the config file. Names without a directory (e.g. yolo11n.pt) are left alone."""
+    for key, value in config.items():
+        if isinstance(value, dict):
+            resolve_paths(value, base_dir)
+        elif key in PATH_KEYS and isinstance(value, str) and not os.path.isabs(value) and os.sep in value:
+            config[key] = os.path.normpath(os.path.join(base_dir, value))
+    return config
+
+
+def load_config(args):
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+
+    if args.smoke:
+        config = merge(config, config.get('smoke', {}))
+        config['run_name'] = f"{config.get('run_name', 'run')}_smoke"
+    config.pop('smoke', None)
+
+    for override in args.set:
+        key, _, value = override.partition('=')
+        set_dotted(config, key, yaml.safe_load(value))
+    if args.run_name:
+        config['run_name'] = args.run_name
+    if args.device:
+        config['device'] = args.device
+    if args.resume:
+        config['resume'] = args.resume
+
+    assert config.get('pipeline') in PIPELINES, f"pipeline must be one of {PIPELINES}"
+    return resolve_paths(config, os.path.dirname(os.path.abspath(args.config)))
+
+
+def select_device(requested):
+    """Explicit device choice. A GPU that was asked for but is missing is an error, not a silent CPU run."""
+    import torch
+
+    requested = str(requested or 'auto')
+    if requested == 'auto':
+        requested = '0' if torch.cuda.is_available() else 'cpu'
+    if requested != 'cpu':
+        if not torch.cuda.is_available():
+            sys.exit(f"Device '{requested}' requested but no GPU is available, use --device cpu for a CPU run.")
+        print("Current GPU:", torch.cuda.get_device_name(int(requested.split(',')[0])))
+    else:
+        print("Training on CPU.")
+    return requested
+
+
+### Throughput ###
+
+class ThroughputMeter:
+    """Step times and images/sec, printed every `log_every` steps and per epoch."""
+
+    def __init__(self, log_every=50):
+        self.log_every = log_every
+        self.reset()
+
+    def reset(self):
+        self.epoch_start = time.perf_counter()
+        self.last_step = self.epoch_start
+        self.steps = 0
+        self.images = 0
+        self.window_seconds = 0.0
+        self.window_images = 0
+
+    def step(self, batch_size, prefix=""):
+        now = time.perf_counter()
+        step_seconds = now - self.last_step
+        self.last_step = now
+        self.steps += 1
+        self.images += batch_size
+        self.window_seconds += step_seconds
+        self.window_images += batch_size
+        if self.log_every and self.steps % self.log_every == 0:
+            print(f"{prefix}step {self.steps}: {1000 * self.window_seconds / self.log_every:.1f} ms/step, "
+                  f"{self.window_images / self.window_seconds:.1f} images/sec")
+            self.window_seconds = 0.0
+            self.window_images = 0
+
+    def summary(self):
+        seconds = time.perf_counter() - self.epoch_start
+        return {"steps": self.steps, "images": self.images, "seconds": seconds,
+                "images_per_second": self.images / seconds if seconds else 0.0,
+                "ms_per_step": 1000 * seconds / self.steps if self.steps else 0.0}
+
+
+### YOLO ###
+
+def add_yolo_throughput_callbacks(model, log_every):
+    meter = ThroughputMeter(log_every)
+
+    def on_train_epoch_start(trainer):
+        meter.reset()
+
+    def on_train_batch_end(trainer):
+        meter.step(trainer.batch_size, prefix=f"epoch {trainer.epoch + 1} ")
+
+    def on_train_epoch_end(trainer):
+        summary = meter.summary()
+        print(f"epoch {trainer.epoch + 1}: {summary['images_per_second']:.1f} images/sec, "
+              f"{summary['ms_per_step']:.1f} ms/step over {summary['steps']} steps")
+
+    model.add_callback("on_train_epoch_start", on_train_epoch_start)
+    model.add_callback("on_train_batch_end", on_train_batch_end)
+    model.add_callback("on_train_epoch_end", on_train_epoch_end)
+
+
+def run_yolo(config):
+    from ultralytics import YOLO
+
+    device = select_device(config.get('device'))
+    project = config.get('project', 'runs')
+    dataloader = config.get('dataloader', {})
+
+    if config.get('resume'):
+        weights_path = os.path.join(project, config['resume'], "weights", "last.pt")
+        if not os.path.exists(weights_path):
+            sys.exit(f"Run '{config['resume']}' not found in {project}.")
+        model = YOLO(weights_path)
+        add_yolo_throughput_callbacks(model, config.get('log_every', 50))
+        return model.train(resume=True, warmup_epochs=0, data=config['data'], project=project,
+                           name=config['resume'], device=device)
+
+    if not config.get('data'):
+        sys.exit("No dataset configured, set 'data' in the config or pass --set data=<dataset yaml>.")
+
+    model_name = config['model']
+    model = YOLO(model_name)
+    add_yolo_throughput_callbacks(model, config.get('log_every', 50))
+
+    training_params = {
+        'data': config['data'],
+        'device': device,
+        'project': project,
+        'name': f'{datetime.now().strftime("%Y-%m-%d_%H-%M")}_{os.path.basename(model_name).split(".")[0]}_{config["run_name"]}',
+        # Ultralytics builds its own loaders: worker count and image caching are configurable, prefetching is not
+        'workers': dataloader.get('workers', 8),
+        'cache': dataloader.get('cache', False),
+        **config.get('train', {}),
+    }
+    return model.train(**training_params)
+
+
+### Detectron2 ###
+
+def register_detectron2_datasets(datasets, dataset_root, max_images=None):
+    """Registers the COCO splits, `max_images` keeps the first images only (smoke runs)."""
+    from detectron2.data import DatasetCatalog, MetadataCatalog
+    from detectron2.data.datasets import load_coco_json, register_coco_instances
+
+    for name, split in datasets.items():
+        if name in DatasetCatalog.list():
+            continue
+        json_file = os.path.join(dataset_root, split['json'])
+        image_root = os.path.join(dataset_root, split['images'])
+        if max_images:
+            DatasetCatalog.register(name, lambda j=json_file, i=image_root, n=name: load_coco_json(j, i, n)[:max_images])
+            MetadataCatalog.get(name).set(json_file=json_file, image_root=image_root, evaluator_type="coco")
+        else:
+            register_coco_instances(name, {}, json_file, image_root)
+
+
+def detectron2_device(device):
+    """torch device string of a runner device. This runner starts a single Detectron2 process, so one GPU."""
+    if device == 'cpu':
+        return 'cpu'
+    if ',' in device:
+        sys.exit(f"Device '{device}' lists several GPUs, but Detectron2 runs on a single GPU here. "
+                 "Pass one id, e.g. --device 0.")
+    return f"cuda:{device}"
+
+
+def build_detectron2_cfg(config, device):
+    from detectron2 import model_zoo
+    from detectron2.config import get_cfg
+
+    cfg = get_cfg()
+    cfg.merge_from_file(model_zoo.get_config_file(config['model_zoo_config']))
+    cfg.MODEL.WEIGHTS = config.get('weights') or model_zoo.get_checkpoint_url(config['model_zoo_config'])
+    cfg.MODEL.DEVICE = detectron2_device(device)
+    cfg.OUTPUT_DIR = os.path.join(config.get('output_dir', 'output'), config['run_name'])
+    cfg.DATASETS.TRAIN = (config['train_dataset'],)
+    cfg.DATASETS.TEST = (config['val_dataset'],) if config.get('val_dataset') else ()
+    cfg.DATALOADER.NUM_WORKERS = config.get('dataloader', {}).get('workers', 4)
+    # Remaining keys are plain detectron2 config entries, e.g. SOLVER.BASE_LR: 0.001
+    cfg.merge_from_list([item for key, value in config.get('cfg', {}).items() for item in (key, value)])
+    return cfg
+
+
+def run_detectron2(config):
+    import torch
+    from detectron2.data import build_detection_train_loader, DatasetMapper
+    from detectron2.engine import DefaultTrainer, HookBase
+    from detectron2.evaluation import COCOEvaluator
+    sys.path.append(DETECTRON2_SRC)
+    from cached_dataset import CachedDatasetMapper, build_train_augmentations, register_cached_dataset
+
+    device = select_device(config.get('device'))
+    train_cache = config.get('train_cache')
+    if train_cache:
+        # Registered first, so the COCO registration of the same name is skipped
+        register_cached_dataset(config['train_dataset'], train_cache, config.get('max_images'))
+    register_detectron2_datasets(config['datasets'], config['dataset_root'], config.get('max_images'))
+    cfg = build_detectron2_cfg(config, device)
+    os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
+
+    dataloader = config.get('dataloader', {})
+    loader_kwargs = {}
+    if cfg.DATALOADER.NUM_WORKERS > 0:
+        loader_kwargs = {'prefetch_factor': dataloader.get('prefetch_factor', 2),
+                         'persistent_workers': dataloader.get('persistent_workers', True)}
+    loader_kwargs['pin_memory'] = dataloader.get('pin_memory', True) and torch.cuda.is_available()
+
+    class ThroughputHook(HookBase):
+        """Logs step time and images/sec and puts them into the event storage."""
+
+        def __init__(self, ims_per_batch, log_every):
+            self.ims_per_batch = ims_per_batch
+            self.meter = ThroughputMeter(log_every)
+
+        def before_train(self):
+            self.meter.reset()
+
+        def after_step(self):
+            self.meter.step(self.ims_per_batch, prefix=f"iter {self.trainer.iter + 1} ")
+            self.trainer.storage.put_scalar("images_per_second", self.meter.summary()["images_per_second"],
+                                            smoothing_hint=False)
+
+        def after_train(self):
+            summary = self.meter.summary()
+            print(f"Training throughput: {summary['images_per_second']:.1f} images/sec, "
+                  f"{summary['ms_per_step']:.1f} ms/step over {summary['steps']} steps")
+
+    class CocoTrainer(DefaultTrainer):
+
+        @classmethod
+        def build_evaluator(cls, cfg, dataset_name, output_folder=None):
+            if output_folder is None:
+                output_folder = os.path.join(cfg.OUTPUT_DIR, "coco_eval")
+                os.makedirs(output_folder, exist_ok=True)
+            return COCOEvaluator(dataset_name, cfg, False, output_folder)
+
+        @classmethod
+        def build_train_loader(cls, cfg):
+            if train_cache:
+                mapper = CachedDatasetMapper(cfg, train_cache, is_train=True, augmentations=config.get('augmentations'))
+            else:
+                mapper = DatasetMapper(cfg, is_train=True,
+                                       augmentations=build_train_augmentations(cfg, config.get('augmentations')))
+            return build_detection_train_loader(cfg, mapper=mapper, **loader_kwargs)
+
+        def build_hooks(self):
+            hooks = super().build_hooks()
+            hooks.insert(-1, ThroughputHook(cfg.SOLVER.IMS_PER_BATCH, config.get('log_every', 20)))
+            return hooks
+
+    trainer = CocoTrainer(cfg)
+    trainer.resume_or_load(resume=bool(config.get('resume')))
+    return trainer.train()
+
+
+def main(argv=None):
+    config = load_config(parse_args(argv))
+    print(f"Pipeline {config['pipeline']}, run {config.get('run_name')}")
+    if config['pipeline'] == 'yolo':
+        return run_yolo(config)
+    return run_detectron2(config)
+
+
+if __name__ == '__main__':
+    main()
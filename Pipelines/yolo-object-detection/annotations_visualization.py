@@ -1,10 +1,20 @@
 import os
+import sys
 import cv2
-import glob
+import math
 import numpy as np
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
+# Add the Pipelines directory to sys.path to make the shared `common` package importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common.dataset_index import ALL_IMAGE_EXTENSIONS, DatasetIndex, list_images
+
+MAX_CLASSES = 256
+FILL_ALPHA = 0.3  # Transparency factor of the segmentation fill
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Visualize YOLO annotations')
     parser.add_argument('--image_dir', type=str, required=True, help='Directory containing images')
@@ -12,6 +22,10 @@ def parse_args():
     parser.add_argument('--output_dir', type=str, default='output_visualizations', help='Output directory for visualizations')
     parser.add_argument('--class_names', type=str, default=None, help='File containing class names (one per line)')
     parser.add_argument('--segmentation', action='store_true', help='Visualize segmentation masks instead of bounding boxes')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--mosaic', type=int, default=0, help='Write contact sheets with this many images each instead of one file per image')
+    parser.add_argument('--thumb_width', type=int, default=480, help='Width of each image on a contact sheet')
+    parser.add_argument('--use_index', action='store_true', help='Read annotations from the shared dataset index instead of the label files')
     return parser.parse_args()
 
 def load_class_names(class_file):
@@ -20,117 +34,176 @@ def load_class_names(class_file):
             return [line.strip() for line in f.readlines()]
     return None
 
-def draw_yolo_bbox(image, annotation, class_names=None):
-    height, width = image.shape[:2]
-    class_id, x_center, y_center, w, h = map(float, annotation.split())
-    
-    # Convert YOLO coordinates to pixel coordinates
-    x_center *= width
-    y_center *= height
-    w *= width
-    h *= height
-    
-    x_min = int(x_center - w/2)
-    y_min = int(y_center - h/2)
-    x_max = int(x_center + w/2)
-    y_max = int(y_center + h/2)
-    
-    # Generate random color based on class ID for consistency
-    np.random.seed(int(class_id))
-    color = tuple(map(int, np.random.randint(0, 255, 3)))
-    
-    # Draw rectangle
-    cv2.rectangle(image, (x_min, y_min), (x_max, y_max), color, 2)
-    
-    # Create label
-    label = f"{class_names[int(class_id)]}" if class_names else f"Class {int(class_id)}"
-    
-    # Display label
+def build_palette(num_classes=MAX_CLASSES):
+    """One color per class id, the same colors the per-annotation seeding used to produce."""
+    return [tuple(map(int, np.random.RandomState(class_id).randint(0, 255, 3))) for class_id in range(num_classes)]
+
+PALETTE = build_palette()
+
+def parse_label_file(label_path):
+    """Parses a YOLO label file once into class ids and normalized coordinate arrays (one per line)."""
+    class_ids = []
+    coords = []
+    with open(label_path, 'r') as f:
+        for line in f:
+            values = np.array(line.split(), dtype=np.float32)
+            if values.size < 5:
+                continue
+            class_ids.append(int(values[0]))
+            coords.append(values[1:])
+    return class_ids, coords
+
+def draw_label(image, label, x, y, color):
     (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-    cv2.rectangle(image, (x_min, y_min - text_height - 10), (x_min + text_width, y_min), color, -1)
-    cv2.putText(image, label, (x_min, y_min - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.rectangle(image, (x, y - text_height - 10), (x + text_width, y), color, -1)
+    cv2.putText(image, label, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+def class_label(class_id, class_names):
+    return f"{class_names[class_id]}" if class_names else f"Class {class_id}"
 
-def draw_yolo_segmentation(image, annotation, class_names=None):
+def draw_yolo_bboxes(image, class_ids, coords, class_names=None):
     height, width = image.shape[:2]
-    parts = list(map(float, annotation.split()))
-    class_id = int(parts[0])
-    points = parts[1:]
-    
-    # Reshape points and scale to image dimensions
-    points = np.array(points).reshape(-1, 2)
-    points[:, 0] *= width
-    points[:, 1] *= height
-    points = points.astype(np.int32)
-    
-    # Generate random color based on class ID
-    np.random.seed(class_id)
-    color = tuple(map(int, np.random.randint(0, 255, 3)))
-    
-    # Draw polygon
-    cv2.polylines(image, [points], isClosed=True, color=color, thickness=2)
-    
-    # Fill polygon with transparency
+    if not coords:
+        return
+
+    # Convert all YOLO boxes to pixel corners at once
+    boxes = np.stack([c[:4] for c in coords]) * np.array([width, height, width, height], dtype=np.float32)
+    corners = np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2], axis=1).astype(np.int32)
+
+    for class_id, (x_min, y_min, x_max, y_max) in zip(class_ids, corners):
+        color = PALETTE[class_id % MAX_CLASSES]
+        cv2.rectangle(image, (x_min, y_min), (x_max, y_max), color, 2)
+        draw_label(image, class_label(class_id, class_names), x_min, y_min, color)
+
+def draw_yolo_segmentations(image, class_ids, coords, class_names=None):
+    height, width = image.shape[:2]
+    if not coords:
+        return
+
+    polygons = [(c.reshape(-1, 2) * np.array([width, height], dtype=np.float32)).astype(np.int32) for c in coords]
+
+    # Fill every polygon into one overlay (one fillPoly per class) and blend once
     overlay = image.copy()
-    cv2.fillPoly(overlay, [points], color)
-    alpha = 0.3  # Transparency factor
-    cv2.addWeighted(overlay, alpha, image, 1 - alpha, 0, image)
-    
-    # Create label
-    label = f"{class_names[class_id]}" if class_names else f"Class {class_id}"
-    
-    # Display label at first point
-    (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-    label_x = points[0][0]
-    label_y = points[0][1] - 10 if points[0][1] - 10 > text_height else points[0][1] + 20
-    
-    cv2.rectangle(image, (label_x, label_y - text_height - 10), 
-                 (label_x + text_width, label_y), color, -1)
-    cv2.putText(image, label, (label_x, label_y - 5), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    for class_id in set(class_ids):
+        class_polygons = [p for p, c in zip(polygons, class_ids) if c == class_id]
+        cv2.fillPoly(overlay, class_polygons, PALETTE[class_id % MAX_CLASSES])
+    cv2.addWeighted(overlay, FILL_ALPHA, image, 1 - FILL_ALPHA, 0, image)
+
+    # Outlines and labels on top of the blend
+    for class_id, points in zip(class_ids, polygons):
+        color = PALETTE[class_id % MAX_CLASSES]
+        cv2.polylines(image, [points], isClosed=True, color=color, thickness=2)
+
+        label = class_label(class_id, class_names)
+        (_, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        label_x = points[0][0]
+        label_y = points[0][1] - 10 if points[0][1] - 10 > text_height else points[0][1] + 20
+        draw_label(image, label, label_x, label_y, color)
+
+def render_annotations(image_path, class_ids, coords, output_dir, class_names, segmentation, thumb_width=0):
+    """
+    Draws parsed annotations onto one image. Writes the visualization, or returns a
+    thumbnail of width `thumb_width` for a contact sheet.
+    """
+    # Read image
+    image = cv2.imread(image_path)
+    if image is None:
+        return None, f"Failed to read image: {image_path}"
+
+    if segmentation:
+        draw_yolo_segmentations(image, class_ids, coords, class_names)
+    else:
+        draw_yolo_bboxes(image, class_ids, coords, class_names)
+
+    if thumb_width:
+        thumb_height = round(image.shape[0] * thumb_width / image.shape[1])
+        return cv2.resize(image, (thumb_width, thumb_height), interpolation=cv2.INTER_AREA), None
+
+    # Save visualized image
+    output_path = os.path.join(output_dir, f"vis_{Path(image_path).name}")
+    cv2.imwrite(output_path, image)
+    return None, f"Saved visualization to {output_path}"
+
+def visualize_image(image_path, label_dir, output_dir, class_names, segmentation, thumb_width=0):
+    """Parses the label file of one image and draws it."""
+    # Get corresponding label file
+    label_path = os.path.join(label_dir, f"{Path(image_path).stem}.txt")
+    if not os.path.exists(label_path):
+        return None, f"No label file found for {image_path}"
+
+    class_ids, coords = parse_label_file(label_path)
+    return render_annotations(image_path, class_ids, coords, output_dir, class_names, segmentation, thumb_width)
+
+_WORKER_INDEX = {}
+
+def visualize_indexed_image(position, index_dir, output_dir, class_names, segmentation, thumb_width=0):
+    """Draws image `position` of the dataset index, each worker maps the index once."""
+    if index_dir not in _WORKER_INDEX:
+        _WORKER_INDEX[index_dir] = DatasetIndex(index_dir)
+    index = _WORKER_INDEX[index_dir]
+
+    image_path = index.image_path(position)
+    if not index.has_label[position]:
+        return None, f"No label file found for {image_path}"
+
+    class_ids, coords = index.annotations(position)
+    return render_annotations(image_path, class_ids.tolist(), coords, output_dir, class_names, segmentation, thumb_width)
+
+def write_mosaic(thumbnails, output_path):
+    """Tiles thumbnails of equal width into a grid, padding rows to the tallest thumbnail."""
+    columns = math.ceil(math.sqrt(len(thumbnails)))
+    rows = math.ceil(len(thumbnails) / columns)
+    cell_width = max(t.shape[1] for t in thumbnails)
+    cell_height = max(t.shape[0] for t in thumbnails)
+
+    sheet = np.zeros((rows * cell_height, columns * cell_width, 3), dtype=np.uint8)
+    for i, thumb in enumerate(thumbnails):
+        y, x = (i // columns) * cell_height, (i % columns) * cell_width
+        sheet[y:y + thumb.shape[0], x:x + thumb.shape[1]] = thumb
+    cv2.imwrite(output_path, sheet)
 
 def visualize_yolo_annotations(args):
     # Create output directory
     os.makedirs(args.output_dir, exist_ok=True)
-    
+
     # Load class names if provided
     class_names = load_class_names(args.class_names)
-    
-    # Get all image files
-    image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
-    image_paths = []
-    for ext in image_extensions:
-        image_paths.extend(glob.glob(os.path.join(args.image_dir, ext)))
-    
-    for image_path in image_paths:
-        # Get corresponding label file
-        label_path = os.path.join(args.label_dir, f"{Path(image_path).stem}.txt")
-        
-        if not os.path.exists(label_path):
-            print(f"No label file found for {image_path}")
-            continue
-        
-        # Read image
-        image = cv2.imread(image_path)
-        if image is None:
-            print(f"Failed to read image: {image_path}")
-            continue
-        
-        # Read annotations
-        with open(label_path, 'r') as f:
-            annotations = f.readlines()
-        
-        # Draw each annotation
-        for ann in annotations:
-            if args.segmentation:
-                draw_yolo_segmentation(image, ann, class_names)
-            else:
-                draw_yolo_bbox(image, ann, class_names)
-        
-        # Save visualized image
-        output_path = os.path.join(args.output_dir, f"vis_{Path(image_path).name}")
-        cv2.imwrite(output_path, image)
-        print(f"Saved visualization to {output_path}")
+
+    thumb_width = args.thumb_width if args.mosaic else 0
+    if args.use_index:
+        # Images and annotations come from the memory-mapped index
+        index = DatasetIndex.open(args.image_dir, args.label_dir, extensions=ALL_IMAGE_EXTENSIONS)
+        tasks = range(len(index))
+        worker = partial(visualize_indexed_image, index_dir=index.index_dir, output_dir=args.output_dir,
+                         class_names=class_names, segmentation=args.segmentation, thumb_width=thumb_width)
+    else:
+        # Get all image files, the same extensions as the index
+        tasks = [os.path.join(args.image_dir, name) for name in list_images(args.image_dir, ALL_IMAGE_EXTENSIONS)]
+        worker = partial(visualize_image, label_dir=args.label_dir, output_dir=args.output_dir,
+                         class_names=class_names, segmentation=args.segmentation, thumb_width=thumb_width)
+
+    thumbnails = []
+    sheet_index = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for thumbnail, message in pool.map(worker, tasks, chunksize=8):
+            if message:
+                print(message)
+            if thumbnail is None:
+                continue
+
+            thumbnails.append(thumbnail)
+            if len(thumbnails) == args.mosaic:
+                output_path = os.path.join(args.output_dir, f"mosaic_{sheet_index:04d}.jpg")
+                write_mosaic(thumbnails, output_path)
+                print(f"Saved contact sheet to {output_path}")
+                thumbnails = []
+                sheet_index += 1
+
+    if thumbnails:
+        output_path = os.path.join(args.output_dir, f"mosaic_{sheet_index:04d}.jpg")
+        write_mosaic(thumbnails, output_path)
+        print(f"Saved contact sheet to {output_path}")
 
 if __name__ == '__main__':
     args = parse_args()
-    visualize_yolo_annotations(args)
\ No newline at end of file
+    visualize_yolo_annotations(args)
@@ -1,48 +1,152 @@
 import os
+import sys
 import shutil
+import time
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 from pathlib import Path
 from ultralytics import YOLO
 from tqdm import tqdm
 
+# Add the Pipelines directory to sys.path to make the shared `common` package importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common.dataset_index import list_images
 
-def run_detection(model, image_paths):
-    return [model(path) for path in image_paths]
+MANIFEST_NAME = "auto_annotations_manifest.txt"
 
 
-def export_yolo_format(model, source_dir, target_dir, conf_threshold, copy_images=False):
+def parse_args():
+    parser = argparse.ArgumentParser(description='Auto-annotate images in YOLO format')
+    parser.add_argument('--model', type=str, required=True, help='Path to the YOLO model weights')
+    parser.add_argument('--source_dir', type=str, required=True, help='Directory containing images')
+    parser.add_argument('--target_dir', type=str, required=True, help='Output directory for YOLO label files')
+    parser.add_argument('--conf', type=float, default=0.5, help='Confidence threshold')
+    parser.add_argument('--batch_size', type=int, default=16, help='Images per model call')
+    parser.add_argument('--workers', type=int, default=8, help='Threads for decoding images and writing outputs')
+    parser.add_argument('--copy_images', action='store_true', help='Copy the images next to their labels')
+    return parser.parse_args()
+
+
+def run_detection(model, images, conf_threshold=0.5):
+    """Runs the model once on a whole batch of images."""
+    return model(images, conf=conf_threshold, verbose=False)
+
+
+def load_manifest(manifest_path):
+    """Names of the images already annotated by previous (possibly interrupted) runs."""
+    if not os.path.exists(manifest_path):
+        return set()
+    with open(manifest_path, 'r') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def prefetch_images(source_dir, image_names, pool, depth):
+    """Yields (name, image) in order while keeping `depth` decodes running in the thread pool."""
+    names = iter(image_names)
+    in_flight = deque()
+    for name in itertools.islice(names, depth):
+        in_flight.append((name, pool.submit(cv2.imread, os.path.join(source_dir, name))))
+
+    while in_flight:
+        name, future = in_flight.popleft()
+        next_name = next(names, None)
+        if next_name is not None:
+            in_flight.append((next_name, pool.submit(cv2.imread, os.path.join(source_dir, next_name))))
+        yield name, future.result()
+
+
+def format_yolo_labels(detection):
+    """YOLO label lines for one result."""
+    lines = []
+    if detection.boxes:
+        boxes = detection.boxes
+        for (bbox, cls_id) in zip(boxes.xywhn.cpu().numpy(), boxes.cls.cpu().numpy()):
+            xc, yc, w, h = bbox[:4]
+            lines.append(f"{int(cls_id)} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n")
+    return "".join(lines)
+
+
+def write_outputs(img_name, label_text, source_dir, target_dir, copy_images):
+    """Writes the label file (and copies the image), runs on the writer pool."""
+    label_path = os.path.join(target_dir, f"{Path(img_name).stem}.txt")
+    with open(label_path, 'w') as out_file:
+        out_file.write(label_text)
+
+    if copy_images:
+        shutil.copy(os.path.join(source_dir, img_name), os.path.join(target_dir, img_name))
+    return img_name
+
+
+def export_yolo_format(model, source_dir, target_dir, conf_threshold, copy_images=False, batch_size=16, num_workers=8):
+    """
+    Streams all images of `source_dir` through the model in batches. Decoding is prefetched on a
+    thread pool, labels are written asynchronously and every finished image is appended to a
+    manifest in `target_dir`, so an interrupted run continues where it stopped.
+    """
     os.makedirs(target_dir, exist_ok=True)
-    image_list = [img for img in os.listdir(source_dir) if img.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    manifest_path = os.path.join(target_dir, MANIFEST_NAME)
+    processed = load_manifest(manifest_path)
+
+    # The labels in target_dir are being written by this run, so only the source images are listed
+    image_list = [img for img in list_images(source_dir) if img not in processed]
 
     if not image_list:
+        print(f"Nothing to do, {len(processed)} images already annotated.")
         return
 
-    for img_name in image_list:
-        full_img_path = os.path.join(source_dir, img_name)
-        image = cv2.imread(full_img_path)
+    print(f"Annotating {len(image_list)} images ({len(processed)} already done).")
+    start_time = time.perf_counter()
+    annotated = 0
+
+    with ThreadPoolExecutor(num_workers) as decode_pool, \
+         ThreadPoolExecutor(max(1, num_workers // 2)) as write_pool, \
+         open(manifest_path, 'a') as manifest_file, \
+         tqdm(total=len(image_list), unit="img") as progress:
+
+        images = prefetch_images(source_dir, image_list, decode_pool, depth=2 * batch_size)
+        pending_writes = []
+
+        while True:
+            batch = list(itertools.islice(images, batch_size))
+            if not batch:
+                break
+
+            readable = []
+            for img_name, image in batch:
+                if image is None:
+                    print(f"Warning: could not read image: {os.path.join(source_dir, img_name)}")
+                else:
+                    readable.append((img_name, image))
+
+            detections = run_detection(model, [image for _, image in readable], conf_threshold) if readable else []
+            current_writes = [
+                write_pool.submit(write_outputs, img_name, format_yolo_labels(detection), source_dir, target_dir, copy_images)
+                for (img_name, _), detection in zip(readable, detections)
+            ]
 
-        if image is None:
-            print(f"Warning: could not read image: {full_img_path}")
-            continue
+            # Record the previous batch once its files are on disk, the current one keeps writing meanwhile
+            for future in pending_writes:
+                manifest_file.write(future.result() + "\n")
+            manifest_file.flush()
+            annotated += len(pending_writes)
+            pending_writes = current_writes
 
-        detections = model(image, conf=conf_threshold, verbose=False)
-        label_path = os.path.join(target_dir, f"{Path(img_name).stem}.txt")
+            progress.update(len(batch))
+            progress.set_postfix(img_per_s=f"{(annotated + len(pending_writes)) / (time.perf_counter() - start_time):.1f}")
 
-        with open(label_path, 'w') as out_file:
-            if detections and detections[0].boxes:
-                boxes = detections[0].boxes
-                for (bbox, cls_id) in zip(boxes.xywhn.cpu().numpy(), boxes.cls.cpu().numpy()):
-                    xc, yc, w, h = bbox[:4]
-                    out_file.write(f"{int(cls_id)} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n")
+        for future in pending_writes:
+            manifest_file.write(future.result() + "\n")
+        annotated += len(pending_writes)
 
-        if copy_images:
-            shutil.copy(full_img_path, os.path.join(target_dir, img_name))
+    elapsed = time.perf_counter() - start_time
+    print(f"Annotated {annotated} images in {elapsed:.1f}s ({annotated / elapsed:.1f} images/sec).")
 
 
-# Example usage:
-model_path = "path/to/your/model.pt"  
-model = YOLO(model_path)
-image_path = "path/to/your/images"
-output_path = "path/to/output"
-conf_threshold = 0.5
-export_yolo_format(model, source_dir=image_path, target_dir=output_path, conf_threshold=conf_threshold, copy_images=True)
+if __name__ == '__main__':
+    args = parse_args()
+    model = YOLO(args.model)
+    export_yolo_format(model, source_dir=args.source_dir, target_dir=args.target_dir, conf_threshold=args.conf,
+                       copy_images=args.copy_images, batch_size=args.batch_size, num_workers=args.workers)
@@ -1,44 +1,169 @@
-import matplotlib.pyplot as plt
-from ultralytics import YOLO
-
-def main():
-    model = YOLO("best.pt")
-
-    img_dir = "inference/input/images"
-    save_dir = "inference/results"
-    experiment = "test_" # Can be a unique identifier from the backend
-
-    model.predict(source=img_dir,
-                            device = 0, # cuda = 0, else "cpu"
-                
-                            imgsz= 640,
-                            conf=0.4, # higher conf = lower false positives
-                            iou= 0.7,
-                            half = False, # half precision = faster inference, minimal accuracy loss
-                            batch = 5, # batch size to process images, only works with csv or directories
-                            max_det=2,
-                            
-                
-                            show = False, # show results
-                            show_labels = False, # also applies to saved results
-                            show_conf = False, # also applies to saved results, only works if show_labels = True
-                            show_boxes = True, # draws bboxes on detections
-                
-                            save=True, # saves output images with bboxes
-                            save_txt=True, # saves annotations in a labels folder in the experiment dir
-                            save_conf=True, # maybe needed for scoring NOTE, if true, conf will be saved as the last value in the line
-                        
-                            project=save_dir,
-                            name=experiment,
-                )
-
-    """
-    Add logic to compare results against ground truth in input\labels
-    """
-
-
-    print(f"Results saved to {save_dir}/{experiment}")
-
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+"""
+Streaming YOLO inference over an image directory, scored against YOLO ground truth labels.
+
+Predictions come from the predict generator (stream=True), so memory stays flat over huge
+folders, and every image is matched against its label file (<labels_dir>/<stem>.txt) as
+soon as its result arrives. Nothing is written to disk except the metrics, unless --save
+or --save_txt are given.
+
+mAP50 and mAP50-95 are computed like ultralytics' val does, from predictions down to a low
+score (--map_conf, --map_max_det), so they are comparable with its numbers. --conf and
+--max_det only apply to precision/recall and to the saved predictions.
+
+    python inference.py --model best.pt --source inference/input/images --device cpu
+    python inference.py --model best.pt --source inference/input/images --device 0 --half --save
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+# Add the Pipelines directory to sys.path to make the shared `common` package importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common.dataset_index import parse_label_lines
+from common.detection_metrics import MatchAccumulator, average_precision
+
+MAP_IOU_THRESHOLDS = np.round(np.linspace(0.5, 0.95, 10), 2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Streaming YOLO inference with ground truth scoring')
+    parser.add_argument('--model', type=str, default='best.pt', help='Path to the YOLO model weights')
+    parser.add_argument('--source', type=str, default='inference/input/images', help='Directory containing images')
+    parser.add_argument('--labels_dir', type=str, default=None, help='YOLO labels of the images, default: <source>/../labels')
+    parser.add_argument('--device', type=str, default='0', help='"cpu", "0", "0,1", ...')
+    parser.add_argument('--half', action='store_true', help='Half precision inference (GPU only)')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch', type=int, default=5, help='Images per model call')
+    parser.add_argument('--conf', type=float, default=0.4, help='Score threshold, higher = fewer false positives')
+    parser.add_argument('--iou', type=float, default=0.7, help='NMS IoU threshold')
+    parser.add_argument('--match_iou', type=float, default=0.5, help='IoU for a prediction to count as a true positive')
+    parser.add_argument('--max_det', type=int, default=2)
+    parser.add_argument('--map_conf', type=float, default=0.001, help='Score threshold of the predictions scored for mAP')
+    parser.add_argument('--map_max_det', type=int, default=300, help='Detections per image scored for mAP')
+    parser.add_argument('--save', action='store_true', help='Save images with predicted boxes')
+    parser.add_argument('--save_txt', action='store_true', help='Save predictions as YOLO label files (with scores)')
+    parser.add_argument('--project', type=str, default='inference/results', help='Output directory')
+    parser.add_argument('--name', type=str, default='test_', help='Experiment name, can be a unique identifier from the backend')
+    return parser.parse_args()
+
+
+def load_ground_truth(label_path, width, height):
+    """Boxes (xyxy pixels) and classes of a YOLO label file, empty if there is none."""
+    if not os.path.exists(label_path):
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    class_ids, coords = parse_label_lines(label_path)
+    boxes = np.asarray([c[:4] for c in coords], dtype=np.float32).reshape(-1, 4)
+    cx, cy, w, h = boxes.T
+    boxes = np.stack([(cx - w / 2) * width, (cy - h / 2) * height, (cx + w / 2) * width, (cy + h / 2) * height], axis=1)
+    return boxes, np.asarray(class_ids, dtype=np.int64)
+
+
+def operating_point(scores, conf, max_det):
+    """Indices of the predictions kept at the score threshold, at most max_det of the highest scores."""
+    order = np.argsort(-scores, kind="stable")[:max_det]
+    return order[scores[order] >= conf]
+
+
+def summarize(pr_accumulator, map_accumulators, num_classes, class_names):
+    """
+    Precision/recall from the accumulator of the predictions at --conf, mAP50 and mAP50-95 from the
+    per-IoU accumulators of all predictions. Values undefined without ground truth are None.
+    """
+    pr_results = pr_accumulator.result()
+    per_iou = {iou: acc.result() for iou, acc in map_accumulators.items()}
+    results = {"classes": {}}
+    tp_total = predictions_total = gt_total = 0
+    for c in range(num_classes):
+        scores, true_positives, num_gt = pr_results[c]
+        aps = [average_precision(per_iou[iou][c]) for iou in MAP_IOU_THRESHOLDS.tolist()]
+        tp_total += int(true_positives.sum())
+        predictions_total += len(scores)
+        gt_total += num_gt
+        results["classes"][class_names[c]] = {
+            "ground_truth": num_gt,
+            "predictions": len(scores),
+            "precision": float(true_positives.sum() / len(scores)) if len(scores) else None,
+            "recall": float(true_positives.sum() / num_gt) if num_gt else None,
+            "AP50": aps[0] if num_gt else None,
+            "AP50-95": float(np.mean(aps)) if num_gt else None,
+        }
+    class_aps = [r for r in results["classes"].values() if r["ground_truth"]]
+    results["precision"] = tp_total / predictions_total if predictions_total else None
+    results["recall"] = tp_total / gt_total if gt_total else None
+    results["mAP50"] = float(np.mean([r["AP50"] for r in class_aps])) if class_aps else None
+    results["mAP50-95"] = float(np.mean([r["AP50-95"] for r in class_aps])) if class_aps else None
+    return results
+
+
+def main():
+    args = parse_args()
+    labels_dir = args.labels_dir or os.path.join(os.path.dirname(os.path.normpath(args.source)), "labels")
+    model = YOLO(args.model)
+    class_names = model.names
+    num_classes = len(class_names)
+
+    pr_accumulator = MatchAccumulator(num_classes, args.match_iou)
+    map_accumulators = {iou: MatchAccumulator(num_classes, iou) for iou in MAP_IOU_THRESHOLDS.tolist()}
+    output_dir = os.path.join(args.project, args.name)
+    if args.save_txt:
+        os.makedirs(os.path.join(output_dir, "labels"), exist_ok=True)
+    elif args.save:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results_stream = model.predict(
+        source=args.source,
+        stream=True,  # generator, results are not collected in memory
+        device=args.device,
+        half=args.half and args.device != 'cpu',  # half precision = faster inference, minimal accuracy loss
+        imgsz=args.imgsz,
+        conf=min(args.conf, args.map_conf),  # --conf is applied below, mAP needs the low scores too
+        iou=args.iou,
+        batch=args.batch,
+        max_det=max(args.max_det, args.map_max_det),
+        verbose=False,
+    )
+
+    start_time = time.perf_counter()
+    num_images = 0
+    for result in results_stream:
+        height, width = result.orig_shape
+        stem = os.path.splitext(os.path.basename(result.path))[0]
+        gt = load_ground_truth(os.path.join(labels_dir, f"{stem}.txt"), width, height)
+        boxes = result.boxes
+        pred = (boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(np.int64))
+        map_keep = operating_point(pred[1], args.map_conf, args.map_max_det)
+        for accumulator in map_accumulators.values():
+            accumulator.add(gt, tuple(p[map_keep] for p in pred))
+
+        keep = operating_point(pred[1], args.conf, args.max_det)
+        pr_accumulator.add(gt, tuple(p[keep] for p in pred))
+        if args.save or args.save_txt:
+            kept = result[torch.as_tensor(keep, dtype=torch.long)]
+            if args.save:
+                kept.save(filename=os.path.join(output_dir, os.path.basename(result.path)))
+            if args.save_txt:
+                kept.save_txt(os.path.join(output_dir, "labels", f"{stem}.txt"), save_conf=True)
+        num_images += 1
+    elapsed = time.perf_counter() - start_time
+
+    metrics = summarize(pr_accumulator, map_accumulators, num_classes, class_names)
+    metrics.update({"images": num_images, "seconds": elapsed, "images_per_second": num_images / max(elapsed, 1e-9),
+                    "conf": args.conf, "max_det": args.max_det, "match_iou": args.match_iou,
+                    "map_conf": args.map_conf, "map_max_det": args.map_max_det})
+    print(f"{num_images} images in {elapsed:.1f}s ({metrics['images_per_second']:.1f} images/sec)")
+    print(f"Precision {metrics['precision']}, recall {metrics['recall']} (conf {args.conf}, IoU {args.match_iou}), "
+          f"mAP50 {metrics['mAP50']}, mAP50-95 {metrics['mAP50-95']} (conf >= {args.map_conf})")
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "metrics.json"), 'w') as f:
+        json.dump(metrics, f, indent=2)
+    print(f"Results saved to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,113 +1,221 @@
-from ultralytics import YOLO
-import optuna
-
-# EDIT BEFORE START
-dataset_path = "data.yaml" #.yaml file path
-save_dir = "runs"
-epochs = 3
-patience = 10
-n_trials = 5
-
-def objective(trial):
-
-    # Optimization parameters
-    lr0 = trial.suggest_float('lr0', 1e-5, 1e-2, log=True)  # Initial learning rate
-    lrf = trial.suggest_float('lrf', 0.01, 1.0)  # Final learning rate factor
-    momentum = trial.suggest_float('momentum', 0.8, 0.98)  # SGD momentum or Adam beta1
-    optimizer_name = trial.suggest_categorical('optimizer', ["Adam", 'AdamW', "RMSProp"])  # Optimizer type
-    batch_size = trial.suggest_categorical('batch_size', [8, 16, 24, 32])  # Batch size
-    cos_lr = trial.suggest_categorical('cos_lr', [True, False])  # Cosine learning rate schedule
-    
-    # Regularization parameters
-    weight_decay = trial.suggest_float('weight_decay', 0.0001, 0.01)  # Weight decay
-    dropout = trial.suggest_categorical('dropout', [0.0, 0.1, 0.2, 0.3, 0.4, 0.5])  # Dropout rate
-    freeze = trial.suggest_int('freeze', 0, 8)  # Number of layers to freeze
-
-    # Warmup parameters
-    warmup_epochs = trial.suggest_float('warmup_epochs', 0.0, 5.0)  # Warmup epochs
-    warmup_momentum = trial.suggest_float('warmup_momentum', 0.0, 0.95)  # Warmup momentum
-
-    # Loss function parameters
-    box = trial.suggest_float('box', 0.02, 0.2)  # Bounding box loss weight
-    cls = trial.suggest_float('cls', 0.2, 4.0)  # Classification loss weight
-
-    # Augmentation parameters
-    hsv_h = trial.suggest_float('hsv_h', 0.0, 0.1)  # Hue augmentation
-    hsv_s = trial.suggest_float('hsv_s', 0.0, 0.9)  # Saturation augmentation
-    hsv_v = trial.suggest_float('hsv_v', 0.0, 0.9)  # Brightness augmentation
-    degrees = trial.suggest_float('degrees', 0.0, 45.0)  # Rotation degrees
-    translate = trial.suggest_float('translate', 0.0, 0.2)  # Translation
-    scale = trial.suggest_float('scale', 0.0, 0.9)  # Scale gain
-    shear = trial.suggest_float('shear', 0.0, 10.0)  # Shear degrees
-    perspective = trial.suggest_float('perspective', 0.0, 0.001)  # Perspective
-    flipud = trial.suggest_float('flipud', 0.0, 0.5)  # Flip up-down probability
-    fliplr = trial.suggest_float('fliplr', 0.0, 0.5)  # Flip left-right probability
-    mosaic = trial.suggest_float('mosaic', 0.0, 1.0)  # Mosaic probability
-    mixup = trial.suggest_float('mixup', 0.0, 0.3)  # Mixup probability
-    cutmix = trial.suggest_float('cutmix', 0.0, 1.0)  # Cutmix probability
-
-    # Initialize YOLO model
-    model = YOLO('yolo11n.pt')  
-    
-    # Train with suggested hyperparameters
-    results = model.train(
-        device=0,
-        data=dataset_path,
-        epochs=epochs,  
-        patience=patience,  
-        close_mosaic = 0,
-
-        batch=batch_size,
-        lr0=lr0,
-        lrf=lrf,  
-        weight_decay=weight_decay,
-        optimizer=optimizer_name,  # Must NOT be "auto", else it overrides lr & momentum
-        cos_lr = cos_lr,
-        
-        freeze=freeze,
-        momentum=momentum,
-        dropout=dropout,
-        warmup_epochs=warmup_epochs,  
-        warmup_momentum=warmup_momentum,  
-        box=box,  
-        cls=cls,  
-
-        verbose=False,  # Reduce output clutter
-        save=False,
-        save_period=0,
-
-        # Augmentation parameters
-        hsv_h=hsv_h,
-        hsv_s=hsv_s,
-        hsv_v=hsv_v,
-        degrees=degrees,
-        translate=translate,
-        scale=scale,
-        shear=shear,
-        perspective=perspective,
-        flipud=flipud,
-        fliplr=fliplr,
-        mosaic=mosaic,
-        mixup=mixup,
-        #cutmix=cutmix,
-    )
-    
-    # Return the metric to optimize 
-    return results.results_dict['metrics/mAP50-95(B)']
-
-# Create study and optimize
-study = optuna.create_study(
-    direction='maximize',    # We want to maximize mAP50-95
-    study_name='yolo_optimization',
-    storage='sqlite:///yolo_optuna.db',
-    load_if_exists=True,  # continue existing study if found in dir 
-)
-study.optimize(objective, n_trials=n_trials)
-
-# Print best results
-print('Best trial:')
-trial = study.best_trial
-print(f'  Value: {trial.value}')
-print('  Params: ')
-for key, value in trial.params.items():
-    print(f'    {key}: {value}')
+import os
+import copy
+import random
+import argparse
+import multiprocessing as mp
+import yaml
+import optuna
+from ultralytics import YOLO
+
+# EDIT BEFORE START
+dataset_path = "data.yaml" #.yaml file path
+save_dir = "runs"
+epochs = 3
+patience = 10
+n_trials = 5
+
+STORAGE = 'sqlite:///yolo_optuna.db'
+STUDY_NAME = 'yolo_optimization'
+METRIC = 'metrics/mAP50-95(B)'
+SUBSAMPLE_CACHE_DIR = "tune_cache"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Optuna hyperparameter tuning of the YOLO model')
+    parser.add_argument('--data', type=str, default=dataset_path, help='Dataset yaml')
+    parser.add_argument('--model', type=str, default='yolo11n.pt', help='Base weights every trial starts from')
+    parser.add_argument('--epochs', type=int, default=epochs)
+    parser.add_argument('--trials', type=int, default=n_trials, help='Trials per worker')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes sharing the study storage')
+    parser.add_argument('--devices', type=str, nargs='+', default=['0'], help='Devices assigned to the workers round-robin')
+    parser.add_argument('--pruner', type=str, default='median', choices=['median', 'hyperband', 'none'])
+    parser.add_argument('--subsample', type=float, default=1.0, help='Fraction of the train images used by every trial')
+    parser.add_argument('--val_subsample', type=float, default=1.0, help='Fraction of the val images used by every trial')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the subsample')
+    parser.add_argument('--storage', type=str, default=STORAGE)
+    parser.add_argument('--study_name', type=str, default=STUDY_NAME)
+    return parser.parse_args()
+
+def build_pruner(name, max_epochs):
+    """Pruners are not persisted in the storage, every worker builds the same one."""
+    if name == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+    if name == 'hyperband':
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=max_epochs)
+    return optuna.pruners.NopPruner()
+
+def build_storage(url):
+    """SQLite storage that waits for locks held by the other workers instead of failing."""
+    if url.startswith('sqlite'):
+        return optuna.storages.RDBStorage(url, engine_kwargs={"connect_args": {"timeout": 120}})
+    return url
+
+def list_split_images(split_entry, root):
+    """Image paths of one split entry of a dataset yaml (directory or .txt list)."""
+    split_path = split_entry if os.path.isabs(split_entry) else os.path.join(root, split_entry)
+    if split_path.endswith('.txt'):
+        with open(split_path, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    with os.scandir(split_path) as entries:
+        return sorted(os.path.abspath(entry.path) for entry in entries
+                      if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS))
+
+def subsampled_dataset(data_path, train_fraction, val_fraction, seed, cache_dir=SUBSAMPLE_CACHE_DIR):
+    """
+    Dataset yaml whose train/val splits are image lists holding a fixed random fraction of the
+    original splits (YOLO finds the labels next to the images). Cached on disk, so the sampling is
+    done once and every trial and worker trains on the same subset.
+    """
+    if train_fraction >= 1.0 and val_fraction >= 1.0:
+        return data_path
+
+    subset_dir = os.path.abspath(os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(data_path))[0]}"
+                                                         f"_train{train_fraction}_val{val_fraction}_seed{seed}"))
+    subset_yaml = os.path.join(subset_dir, "data.yaml")
+    if os.path.exists(subset_yaml):
+        return subset_yaml
+
+    with open(data_path, 'r') as f:
+        data = yaml.safe_load(f)
+    root = data.get('path') or os.path.dirname(os.path.abspath(data_path))
+
+    os.makedirs(subset_dir, exist_ok=True)
+    rng = random.Random(seed)
+    for split, fraction in (('train', train_fraction), ('val', val_fraction)):
+        images = list_split_images(data[split], root)
+        if fraction < 1.0:
+            images = sorted(rng.sample(images, max(1, round(len(images) * fraction))))
+        list_path = os.path.join(subset_dir, f"{split}.txt")
+        with open(list_path, 'w') as f:
+            f.writelines(image + "\n" for image in images)
+        data[split] = list_path
+        print(f"{split}: {len(images)} images in the tuning subset")
+
+    data.pop('path', None)
+    data.pop('test', None)
+    # Written last, an interrupted sampling is never picked up as cached
+    with open(subset_yaml, 'w') as f:
+        yaml.safe_dump(data, f)
+    return subset_yaml
+
+def suggest_params(trial):
+    return dict(
+        # Optimization parameters
+        lr0=trial.suggest_float('lr0', 1e-5, 1e-2, log=True),  # Initial learning rate
+        lrf=trial.suggest_float('lrf', 0.01, 1.0),  # Final learning rate factor
+        momentum=trial.suggest_float('momentum', 0.8, 0.98),  # SGD momentum or Adam beta1
+        optimizer=trial.suggest_categorical('optimizer', ["Adam", 'AdamW', "RMSProp"]),  # Optimizer type, must NOT be "auto", else it overrides lr & momentum
+        batch=trial.suggest_categorical('batch_size', [8, 16, 24, 32]),  # Batch size
+        cos_lr=trial.suggest_categorical('cos_lr', [True, False]),  # Cosine learning rate schedule
+
+        # Regularization parameters
+        weight_decay=trial.suggest_float('weight_decay', 0.0001, 0.01),  # Weight decay
+        dropout=trial.suggest_categorical('dropout', [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]),  # Dropout rate
+        freeze=trial.suggest_int('freeze', 0, 8),  # Number of layers to freeze
+
+        # Warmup parameters
+        warmup_epochs=trial.suggest_float('warmup_epochs', 0.0, 5.0),  # Warmup epochs
+        warmup_momentum=trial.suggest_float('warmup_momentum', 0.0, 0.95),  # Warmup momentum
+
+        # Loss function parameters
+        box=trial.suggest_float('box', 0.02, 0.2),  # Bounding box loss weight
+        cls=trial.suggest_float('cls', 0.2, 4.0),  # Classification loss weight
+
+        # Augmentation parameters
+        hsv_h=trial.suggest_float('hsv_h', 0.0, 0.1),  # Hue augmentation
+        hsv_s=trial.suggest_float('hsv_s', 0.0, 0.9),  # Saturation augmentation
+        hsv_v=trial.suggest_float('hsv_v', 0.0, 0.9),  # Brightness augmentation
+        degrees=trial.suggest_float('degrees', 0.0, 45.0),  # Rotation degrees
+        translate=trial.suggest_float('translate', 0.0, 0.2),  # Translation
+        scale=trial.suggest_float('scale', 0.0, 0.9),  # Scale gain
+        shear=trial.suggest_float('shear', 0.0, 10.0),  # Shear degrees
+        perspective=trial.suggest_float('perspective', 0.0, 0.001),  # Perspective
+        flipud=trial.suggest_float('flipud', 0.0, 0.5),  # Flip up-down probability
+        fliplr=trial.suggest_float('fliplr', 0.0, 0.5),  # Flip left-right probability
+        mosaic=trial.suggest_float('mosaic', 0.0, 1.0),  # Mosaic probability
+        mixup=trial.suggest_float('mixup', 0.0, 0.3),  # Mixup probability
+        #cutmix=trial.suggest_float('cutmix', 0.0, 1.0),  # Cutmix probability
+    )
+
+def pruning_callback(trial):
+    """Reports the validation mAP after every epoch, aborting the training once the pruner says so."""
+    def on_fit_epoch_end(trainer):
+        value = trainer.metrics.get(METRIC)
+        if value is None:
+            return
+        trial.report(value, step=trainer.epoch)
+        if trial.should_prune():
+            raise optuna.TrialPruned(f"Pruned at epoch {trainer.epoch} with {METRIC} {value:.4f}")
+    return on_fit_epoch_end
+
+def make_objective(base_model, data, device, max_epochs):
+    def objective(trial):
+        # Copy of the weights loaded once per worker instead of reading the checkpoint per trial
+        model = copy.deepcopy(base_model)
+        model.add_callback("on_fit_epoch_end", pruning_callback(trial))
+
+        # Train with suggested hyperparameters
+        results = model.train(
+            device=device,
+            data=data,
+            epochs=max_epochs,
+            patience=patience,
+            close_mosaic=0,
+            verbose=False,  # Reduce output clutter
+            save=False,
+            save_period=0,
+            plots=False,
+            project=save_dir,
+            name=f"tune_trial_{trial.number}",
+            exist_ok=True,
+            **suggest_params(trial),
+        )
+
+        # Return the metric to optimize
+        return results.results_dict[METRIC]
+    return objective
+
+def run_worker(worker_id, args, data):
+    """One tuning process: loads the shared study and runs its share of the trials on its device."""
+    device = args.devices[worker_id % len(args.devices)]
+    device = int(device) if device.isdigit() else device
+    study = optuna.load_study(study_name=args.study_name, storage=build_storage(args.storage),
+                              pruner=build_pruner(args.pruner, args.epochs))
+    study.optimize(make_objective(YOLO(args.model), data, device, args.epochs), n_trials=args.trials)
+
+def main():
+    args = parse_args()
+    data = subsampled_dataset(args.data, args.subsample, args.val_subsample, args.seed)
+
+    # Create study once, the workers load it from the shared storage
+    optuna.create_study(
+        direction='maximize',    # We want to maximize mAP50-95
+        study_name=args.study_name,
+        storage=build_storage(args.storage),
+        load_if_exists=True,  # continue existing study if found in dir
+    )
+
+    if args.workers == 1:
+        run_worker(0, args, data)
+    else:
+        # CUDA cannot be re-initialised in forked processes
+        context = mp.get_context("spawn")
+        workers = [context.Process(target=run_worker, args=(i, args, data)) for i in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    # Print best results
+    study = optuna.load_study(study_name=args.study_name, storage=build_storage(args.storage))
+    pruned = len(study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.PRUNED,)))
+    print(f'Finished trials: {len(study.trials)} ({pruned} pruned)')
+    print('Best trial:')
+    trial = study.best_trial
+    print(f'  Value: {trial.value}')
+    print('  Params: ')
+    for key, value in trial.params.items():
+        print(f'    {key}: {value}')
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,14 @@
-from lib.imports import *
-from lib.misc import *
+import os
+import sys
 
-for image_size in [256]: # might get stuck before starting 2nd batch, if this happens just restart this cell
-    train_model(pretrained_model='models/yolo11s-seg.pt', save_name=f"training_{image_size}_autotrain", imgsz=image_size, epochs=100, batch=512, amp=True, usecomet=False)
+# Add the Pipelines directory to sys.path to make the shared training runner importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from train_runner import main
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "configs", "yolo_street_detection.yaml")
+
+# Trains the street segmentation model, e.g.
+#   python main.py --set data=/path/to/street_dataset.yaml
+#   python main.py --set data=/path/to/street_dataset.yaml train.imgsz=512 --run_name training_512_autotrain
+if __name__ == "__main__":
+    main(["--config", CONFIG_PATH, *sys.argv[1:]])